@@ -14,6 +14,10 @@
 
 """Model classes that form the core of snapshots functionality."""
 
+import collections
+import datetime
+import time
+
 from sqlalchemy import desc
 from swiftclient.client import ClientException
 
@@ -34,6 +38,50 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
+class SwiftCheckCache(object):
+    """The backup files recently found in swift, so that the instances
+    restored from the same backup are not each checked against swift.
+
+    Entries are keyed by the location and checksum of the backup and
+    expire after swift_check_cache_ttl seconds; the least recently used
+    are evicted past swift_check_cache_size entries.
+    """
+
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+
+    def get(self, location, checksum, verify_checksum):
+        """Return whether the file was found, with its checksum verified
+        if verify_checksum is set, in the last swift_check_cache_ttl
+        seconds.
+        """
+        key = (location, checksum)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        checked, verified = entry
+        if time.time() - checked >= CONF.swift_check_cache_ttl:
+            return False
+        self.entries[key] = entry
+        return verified or not verify_checksum
+
+    def add(self, location, checksum, verified):
+        if CONF.swift_check_cache_ttl <= 0:
+            return
+        key = (location, checksum)
+        self.entries.pop(key, None)
+        self.entries[key] = (time.time(), verified)
+        while len(self.entries) > CONF.swift_check_cache_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, location):
+        for key in [key for key in self.entries if key[0] == location]:
+            del self.entries[key]
+
+
+SWIFT_CHECK_CACHE = SwiftCheckCache()
+
+
 class Backup(object):
 
     @classmethod
@@ -48,7 +96,8 @@ class Backup(object):
                 operation=operation, datastore=instance.datastore.name)
 
     @classmethod
-    def create(cls, context, instance, name, description=None, parent_id=None):
+    def create(cls, context, instance, name, description=None, parent_id=None,
+               throttle=None):
         """
         create db record for Backup
         :param cls:
@@ -56,6 +105,8 @@ class Backup(object):
         :param instance:
         :param name:
         :param description:
+        :param throttle: settings overriding how the guest throttles the
+                         backup
         :return:
         """
 
@@ -80,6 +131,9 @@ class Backup(object):
                 # Look up the parent info or fail early if not found or if
                 # the user does not have access to the parent.
                 _parent = cls.get_by_id(context, parent_id)
+                if _parent.state == BackupState.DELETE_PENDING:
+                    msg = _("Backup %s is being deleted.")
+                    raise exception.UnprocessableEntity(msg % parent_id)
                 parent = {
                     'location': _parent.location,
                     'checksum': _parent.checksum,
@@ -107,6 +161,7 @@ class Backup(object):
                            'parent': parent,
                            'datastore': ds.name,
                            'datastore_version': ds_version.name,
+                           'throttle': throttle,
                            }
             api.API(context).create_backup(backup_info, instance_id)
             return db_info
@@ -228,6 +283,18 @@ class Backup(object):
 
         return last_backup
 
+    @classmethod
+    def running_for_tenant(cls, tenant_id):
+        """
+        Returns the oldest running backup of the tenant
+        :param tenant_id: Id of the tenant
+        """
+        query = DBBackup.query()
+        query = query.filter(DBBackup.tenant_id == tenant_id,
+                             DBBackup.state.in_(BackupState.RUNNING_STATES))
+        query = query.filter_by(deleted=False)
+        return query.order_by(DBBackup.created).first()
+
     @classmethod
     def fail_for_instance(cls, instance_id):
         query = DBBackup.query()
@@ -238,6 +305,42 @@ class Backup(object):
             backup.state = BackupState.FAILED
             backup.save()
 
+    @classmethod
+    def fail_unstarted(cls, backup_id):
+        """Mark backup_id FAILED if it has not started, which it then never
+        will.
+        """
+        query = DBBackup.query()
+        query = query.filter(DBBackup.id == backup_id,
+                             DBBackup.state == BackupState.NEW)
+        query.update({'state': BackupState.FAILED,
+                      'updated': utils.utcnow()},
+                     synchronize_session=False)
+
+    @classmethod
+    def chain(cls, backup):
+        """
+        Returns backup followed by all the incremental backups based on
+        it, each after its parent. The backups of the tenant with a parent
+        are fetched in a single query and the chain is walked in memory.
+        :param backup: the backup the chain starts from
+        :return:
+        """
+        query = DBBackup.query()
+        query = query.filter(DBBackup.tenant_id == backup.tenant_id,
+                             DBBackup.parent_id.isnot(None))
+        query = query.filter_by(deleted=False)
+        children = collections.defaultdict(list)
+        for child in query.all():
+            children[child.parent_id].append(child)
+        chain = [backup]
+        parents = collections.deque(chain)
+        while parents:
+            descendants = children.pop(parents.popleft().id, [])
+            chain.extend(descendants)
+            parents.extend(descendants)
+        return chain
+
     @classmethod
     def delete(cls, context, backup_id):
         """
@@ -247,25 +350,66 @@ class Backup(object):
         :param backup_id: Backup uuid
         :return:
         """
-
-        # Recursively delete all children and grandchildren of this backup.
-        query = DBBackup.query()
-        query = query.filter_by(parent_id=backup_id, deleted=False)
-        for child in query.all():
-            cls.delete(context, child.id)
+        backup = cls.get_by_id(context, backup_id)
+        if backup.is_running:
+            msg = _("Backup %s cannot be deleted because it is running.")
+            raise exception.UnprocessableEntity(msg % backup_id)
+        if (backup.state == BackupState.DELETE_PENDING and
+                not cls._deletion_stalled(backup)):
+            msg = _("Backup %s is already being deleted.")
+            raise exception.UnprocessableEntity(msg % backup_id)
+        cls.verify_swift_auth_token(context)
+
+        # The incremental backups based on this one are deleted with it.
+        chain = cls.chain(backup)
+        for child in chain[1:]:
+            if child.is_running:
+                msg = _("Backup %(id)s cannot be deleted because its "
+                        "incremental backup %(child)s is running.")
+                raise exception.UnprocessableEntity(
+                    msg % {'id': backup_id, 'child': child.id})
+        ids = [member.id for member in chain]
+        # The quota of a stalled deletion was released when it started.
+        released = [member for member in chain
+                    if member.state != BackupState.DELETE_PENDING]
 
         def _delete_resources():
-            backup = cls.get_by_id(context, backup_id)
-            if backup.is_running:
-                msg = _("Backup %s cannot be deleted because it is running.")
-                raise exception.UnprocessableEntity(msg % backup_id)
-            cls.verify_swift_auth_token(context)
-            api.API(context).delete_backup(backup_id)
+            # The whole chain is marked at once, so that no backup of it
+            # is restored from or built upon while its files are deleted.
+            query = DBBackup.query()
+            query = query.filter(
+                DBBackup.id.in_(ids),
+                ~DBBackup.state.in_(BackupState.RUNNING_STATES))
+            query.update({'state': BackupState.DELETE_PENDING,
+                          'updated': utils.utcnow()},
+                         synchronize_session=False)
+            for member in chain:
+                SWIFT_CHECK_CACHE.invalidate(member.location)
+            try:
+                api.API(context).delete_backup(backup_id)
+            except Exception:
+                # Nothing deletes the chain, so it is left as it was.
+                for member in chain:
+                    query = DBBackup.query().filter(
+                        DBBackup.id == member.id,
+                        DBBackup.state == BackupState.DELETE_PENDING)
+                    query.update({'state': member.state,
+                                  'updated': member.updated},
+                                 synchronize_session=False)
+                raise
 
         return run_with_quotas(context.tenant,
-                               {'backups': -1},
+                               {'backups': -len(released)},
                                _delete_resources)
 
+    @classmethod
+    def _deletion_stalled(cls, backup):
+        """Whether the deletion of backup made no progress for
+        backup_delete_timeout seconds, so that it may be started again.
+        """
+        timeout = datetime.timedelta(seconds=CONF.backup_delete_timeout)
+        return backup.updated < utils.utcnow() - timeout
+
     @classmethod
     def verify_swift_auth_token(cls, context):
         try:
@@ -287,7 +431,7 @@ class DBBackup(DatabaseModelBase):
                     'size', 'tenant_id', 'state', 'instance_id',
                     'checksum', 'backup_timestamp', 'deleted', 'created',
                     'updated', 'deleted_at', 'parent_id',
-                    'datastore_version_id']
+                    'datastore_version_id', 'progress']
     preserve_on_delete = True
 
     @property
@@ -326,6 +470,10 @@ class DBBackup(DatabaseModelBase):
                 self.datastore_version_id)
 
     def check_swift_object_exist(self, context, verify_checksum=False):
+        if SWIFT_CHECK_CACHE.get(self.location, self.checksum,
+                                 verify_checksum):
+            LOG.debug("Backup %s was recently found in swift." % self.id)
+            return True
         try:
             parts = self.location.split('/')
             obj = parts[-1]
@@ -342,6 +490,8 @@ class DBBackup(DatabaseModelBase):
                 if self.checksum != swift_checksum:
                     raise exception.RestoreBackupIntegrityError(
                         backup_id=self.id)
+            SWIFT_CHECK_CACHE.add(self.location, self.checksum,
+                                  verify_checksum)
             return True
         except ClientException as e:
             if e.http_status == 404:
@@ -61,7 +61,9 @@ class BackupController(wsgi.Controller):
         name = data['name']
         desc = data.get('description')
         parent = data.get('parent_id')
-        backup = Backup.create(context, instance, name, desc, parent_id=parent)
+        throttle = data.get('throttle')
+        backup = Backup.create(context, instance, name, desc, parent_id=parent,
+                               throttle=throttle)
         return wsgi.Result(views.BackupView(backup).data(), 202)
 
     def delete(self, req, tenant_id, id):
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+
 
 class BackupView(object):
 
@@ -34,6 +36,8 @@ class BackupView(object):
                 "parent_id": self.backup.parent_id,
             }
         }
+        if self.backup.progress:
+            result['backup']['progress'] = json.loads(self.backup.progress)
         if self.backup.datastore_version_id:
             result['backup']['datastore'] = {
                 "type": self.backup.datastore.name,
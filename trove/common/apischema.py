@@ -453,6 +453,29 @@ dbschema = {
     }
 }
 
+backup_throttle = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "max_rate": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "ionice_class": {
+            "type": "string",
+            "enum": ["idle", "best-effort", "none"]
+        },
+        "nice": {
+            "type": "integer",
+            "minimum": 0,
+            "maximum": 19
+        },
+        "adaptive": {
+            "type": "boolean"
+        }
+    }
+}
+
 backup = {
     "create": {
         "name": "backup:create",
@@ -466,7 +489,8 @@ backup = {
                     "description": non_empty_string,
                     "instance": uuid,
                     "name": non_empty_string,
-                    "parent_id": uuid
+                    "parent_id": uuid,
+                    "throttle": backup_throttle
                 }
             }
         }
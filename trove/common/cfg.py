@@ -218,6 +218,35 @@ common_opts = [
                     'revert.'),
     cfg.IntOpt('cluster_delete_time_out', default=60 * 3,
                help='Maximum time (in seconds) to wait for a cluster delete.'),
+    cfg.IntOpt('server_watcher_interval', default=2,
+               help='Time (in seconds) between the Taskmanager polls of Nova '
+                    'for the state of the compute servers it is waiting on.'),
+    cfg.IntOpt('replica_create_pool_size', default=10,
+               help='Maximum number of replicas of a single create request '
+                    'that the Taskmanager provisions concurrently.'),
+    cfg.BoolOpt('replication_direct_stream', default=False,
+                help='Whether the source of a single new replica streams '
+                     'the replication snapshot to it directly, rather than '
+                     'through the backup storage. The snapshot is stored '
+                     'in the backup storage instead if the replica does not '
+                     'connect to the source within '
+                     'replication_stream_timeout.'),
+    cfg.IntOpt('replication_stream_port', default=0,
+               help='TCP port the replication source streams the snapshot '
+                    'on; an ephemeral port is used if 0. The port has to be '
+                    'reachable from the replicas.'),
+    cfg.IntOpt('replication_stream_timeout', default=60 * 30,
+               help='Maximum time (in seconds) the replication source waits '
+                    'for the replica to connect, and either side waits on '
+                    'the other once streaming.'),
+    cfg.IntOpt('replica_migrate_pool_size', default=10,
+               help='Maximum number of replicas that the Taskmanager moves '
+                    'to a new replica source concurrently during a promote '
+                    'or eject.'),
+    cfg.IntOpt('cluster_member_call_pool_size', default=10,
+               help='Maximum number of guest calls to the members of a '
+                    'cluster that the Taskmanager makes concurrently while '
+                    'building the cluster.'),
     cfg.ListOpt('root_grant', default=['ALL'],
                 help="Permissions to grant to the 'root' user."),
     cfg.BoolOpt('root_grant_option', default=True,
@@ -260,17 +289,70 @@ common_opts = [
                 help='Enable verification of Swift checksum before starting '
                 'restore. Makes sure the checksum of original backup matches '
                 'the checksum of the Swift backup file.'),
+    cfg.IntOpt('swift_check_cache_ttl', default=60,
+               help='Time (in seconds) a backup file found in Swift, with the '
+               'checksum it was verified against, is not checked again '
+               'before restoring an instance from it. 0 disables the '
+               'cache.'),
+    cfg.IntOpt('swift_check_cache_size', default=1000,
+               help='Maximum number of backup files whose checks are kept '
+               'in the Swift check cache.'),
     cfg.StrOpt('storage_strategy', default='SwiftStorage',
-               help="Default strategy to store backups."),
+               help="Default strategy to store backups. DedupSwiftStorage "
+               "(in trove.guestagent.strategies.storage.experimental."
+               "dedup_impl) compresses and encrypts each chunk of the "
+               "backups itself, with gzip and backup_aes_cbc_key, so that "
+               "the chunks deduplicate; backup_compression_strategy, "
+               "backup_compression_workers, backup_encrypt_in_agent and "
+               "backup_encryption_workers do not apply to it."),
     cfg.StrOpt('storage_namespace',
                default='trove.guestagent.strategies.storage.swift',
                help='Namespace to load the default storage strategy from.'),
+    cfg.StrOpt('backup_local_storage_path', default='/var/lib/trove/backups',
+               help='Directory, local or NFS mounted, the LocalStorage '
+               'strategy stores backups in.'),
+    cfg.IntOpt('backup_local_storage_buffer_size', default=4 * 1024 * 1024,
+               help='Size in bytes of the writes and reads of the '
+               'LocalStorage strategy, rounded up to whole pages.'),
+    cfg.StrOpt('backup_compression_namespace',
+               default='trove.guestagent.strategies.compression.impl',
+               help='Namespace to load backup compression strategies from.'),
     cfg.StrOpt('backup_swift_container', default='database_backups',
                help='Swift container to put backups in.'),
     cfg.BoolOpt('backup_use_gzip_compression', default=True,
-                help='Compress backups using gzip.'),
+                help='Compress backups, using the '
+                'backup_compression_strategy of the datastore (gzip by '
+                'default). Storage strategies that deduplicate compress '
+                'each chunk instead of the whole backup.'),
+    cfg.IntOpt('backup_compression_workers', default=0,
+               help='Number of threads the guest agent compresses backups '
+               'with, in independent blocks. 0 pipes backups through a '
+               'single compression process instead, for the codecs that '
+               'have one (gzip). Only used when backups are not piped '
+               'through openssl for encryption, which has to run after the '
+               'compression.'),
     cfg.BoolOpt('backup_use_openssl_encryption', default=True,
-                help='Encrypt backups using OpenSSL.'),
+                help='Encrypt backups using OpenSSL. Storage strategies that '
+                'deduplicate encrypt each chunk instead, with a key derived '
+                'from its content, which shows which chunks of the backups '
+                'are equal.'),
+    cfg.BoolOpt('backup_encrypt_in_agent', default=False,
+                help='Encrypt backups in the guest agent, in authenticated '
+                'chunks (AES-256-CTR and HMAC-SHA256), rather than with the '
+                'openssl command. Such backups are named with a .aenc '
+                'suffix; backups encrypted by openssl can still be '
+                'restored. Only used when backup_use_openssl_encryption is '
+                'set.'),
+    cfg.IntOpt('backup_encryption_workers', default=1,
+               help='Number of threads the guest agent encrypts backups '
+               'with when backup_encrypt_in_agent is set.'),
+    cfg.IntOpt('backup_dump_threads', default=4,
+               help='Number of threads that dump tables or collections in '
+               'parallel in the logical backups that support it (MyDumper '
+               'for MySQL, MongoDumpArchive for MongoDB), and that load '
+               'them in parallel when they are restored. Also the number '
+               'of keyspaces read at the same time by the Cassandra '
+               'NodetoolSnapshot backups.'),
     cfg.StrOpt('backup_aes_cbc_key', default='default_aes_cbc_key',
                help='Default OpenSSL aes_cbc key.'),
     cfg.BoolOpt('backup_use_snet', default=False,
@@ -284,6 +366,64 @@ common_opts = [
     cfg.IntOpt('backup_segment_max_size', default=2 * (1024 ** 3),
                help='Maximum size (in bytes) of each segment of the backup '
                'file.'),
+    cfg.IntOpt('backup_progress_interval', default=30,
+               help='Seconds between the progress reports the guest agent '
+               'sends while taking a backup. 0 only reports the progress '
+               'once the backup is done.'),
+    cfg.IntOpt('backup_max_rate', default=0,
+               help='Maximum rate, in KB per second, the guest agent reads '
+               'backups at. 0 does not limit it. Backup requests may set '
+               'their own.'),
+    cfg.StrOpt('backup_ionice_class', default=None,
+               choices=['idle', 'best-effort'],
+               help='I/O scheduling class the backup processes run in. idle '
+               'only gives them the disk when nothing else uses it, '
+               'best-effort gives them the lowest priority of the default '
+               'class. Backup requests may set their own.'),
+    cfg.IntOpt('backup_nice', default=0,
+               help='Niceness, from 0 to 19, the backup processes run '
+               'with. Backup requests may set their own.'),
+    cfg.BoolOpt('backup_adaptive_throttle', default=False,
+                help='Slow backups down while the latency of the datastore '
+                'is above backup_latency_threshold, for the datastores that '
+                'can measure it. Backup requests may set their own.'),
+    cfg.FloatOpt('backup_latency_threshold', default=0.1,
+                 help='Latency, in seconds, of the datastore above which '
+                 'adaptively throttled backups are slowed down.'),
+    cfg.IntOpt('backup_throttle_interval', default=5,
+               help='Seconds between the latency probes of adaptively '
+               'throttled backups.'),
+    cfg.IntOpt('backup_min_rate', default=1024,
+               help='Rate, in KB per second, adaptively throttled backups '
+               'are not slowed down below.'),
+    cfg.IntOpt('backup_upload_concurrency', default=1,
+               help='Number of backup segments uploaded to Swift in '
+               'parallel. With more than one, each segment is buffered in '
+               'memory before it is uploaded, so the guest needs up to '
+               'backup_upload_concurrency * backup_segment_max_size bytes '
+               'of free memory; lower backup_segment_max_size accordingly.'),
+    cfg.IntOpt('backup_download_concurrency', default=1,
+               help='Number of backup segments downloaded from Swift in '
+               'parallel during a restore. With more than one, each segment '
+               'is buffered in memory until it is its turn to be restored, '
+               'so the guest needs up to backup_download_concurrency * '
+               'backup_segment_max_size bytes of free memory.'),
+    cfg.IntOpt('backup_delete_concurrency', default=10,
+               help='Number of backup segments deleted from Swift in '
+               'parallel.'),
+    cfg.IntOpt('backup_delete_retries', default=3,
+               help='Number of times the deletions of backup files that '
+               'failed are retried before the deletion of the backup '
+               'fails.'),
+    cfg.IntOpt('backup_delete_timeout', default=1800,
+               help='Seconds without progress after which the deletion of '
+               'a backup is considered stalled and may be requested '
+               'again.'),
+    cfg.IntOpt('backup_chunk_collection_grace', default=3600,
+               help='Seconds the chunks of deduplicated backups that no '
+               'backup refers to are kept aside before they are deleted, '
+               'at least. Backups that were running meanwhile and refer to '
+               'them get them back.'),
     cfg.StrOpt('remote_dns_client',
                default='trove.common.remote.dns_client',
                help='Client to send DNS calls to.'),
@@ -437,6 +577,12 @@ mysql_opts = [
                help='Default strategy to perform backups.',
                deprecated_name='backup_strategy',
                deprecated_group='DEFAULT'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.StrOpt('replication_strategy', default='MysqlGTIDReplication',
                help='Default strategy for replication.'),
     cfg.StrOpt('replication_namespace',
@@ -494,6 +640,12 @@ percona_opts = [
                help='Default strategy to perform backups.',
                deprecated_name='backup_strategy',
                deprecated_group='DEFAULT'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.StrOpt('replication_strategy', default='MysqlGTIDReplication',
                help='Default strategy for replication.'),
     cfg.StrOpt('replication_namespace',
@@ -551,10 +703,16 @@ redis_opts = [
                 help='List of UDP ports and/or port ranges to open '
                      'in the security group (only applicable '
                      'if trove_security_groups_support is True).'),
-    cfg.StrOpt('backup_strategy', default=None,
+    cfg.StrOpt('backup_strategy', default='RedisBackup',
                help='Default strategy to perform backups.',
                deprecated_name='backup_strategy',
                deprecated_group='DEFAULT'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.DictOpt('backup_incremental_strategy', default={},
                 help='Incremental Backup Runner based on the default '
                 'strategy. For strategies that do not implement an '
@@ -570,11 +728,15 @@ redis_opts = [
                 help='Whether to provision a Cinder volume for datadir.'),
     cfg.StrOpt('device_path', default=None,
                help='Device path for volume if volume support is enabled.'),
-    cfg.StrOpt('backup_namespace', default=None,
+    cfg.StrOpt('backup_namespace',
+               default='trove.guestagent.strategies.backup.experimental.'
+                       'redis_impl',
                help='Namespace to load backup strategies from.',
                deprecated_name='backup_namespace',
                deprecated_group='DEFAULT'),
-    cfg.StrOpt('restore_namespace', default=None,
+    cfg.StrOpt('restore_namespace',
+               default='trove.guestagent.strategies.restore.experimental.'
+                       'redis_impl',
                help='Namespace to load restore strategies from.',
                deprecated_name='restore_namespace',
                deprecated_group='DEFAULT'),
@@ -593,10 +755,16 @@ cassandra_opts = [
                 help='List of UDP ports and/or port ranges to open '
                      'in the security group (only applicable '
                      'if trove_security_groups_support is True).'),
-    cfg.StrOpt('backup_strategy', default=None,
+    cfg.StrOpt('backup_strategy', default='NodetoolSnapshot',
                help='Default strategy to perform backups.',
                deprecated_name='backup_strategy',
                deprecated_group='DEFAULT'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.DictOpt('backup_incremental_strategy', default={},
                 help='Incremental Backup Runner based on the default '
                 'strategy. For strategies that do not implement an '
@@ -612,11 +780,15 @@ cassandra_opts = [
                 help='Whether to provision a Cinder volume for datadir.'),
     cfg.StrOpt('device_path', default='/dev/vdb',
                help='Device path for volume if volume support is enabled.'),
-    cfg.StrOpt('backup_namespace', default=None,
+    cfg.StrOpt('backup_namespace',
+               default='trove.guestagent.strategies.backup.experimental.'
+                       'cassandra_impl',
                help='Namespace to load backup strategies from.',
                deprecated_name='backup_namespace',
                deprecated_group='DEFAULT'),
-    cfg.StrOpt('restore_namespace', default=None,
+    cfg.StrOpt('restore_namespace',
+               default='trove.guestagent.strategies.restore.experimental.'
+                       'cassandra_impl',
                help='Namespace to load restore strategies from.',
                deprecated_name='restore_namespace',
                deprecated_group='DEFAULT'),
@@ -641,6 +813,12 @@ couchbase_opts = [
                help='Default strategy to perform backups.',
                deprecated_name='backup_strategy',
                deprecated_group='DEFAULT'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.DictOpt('backup_incremental_strategy', default={},
                 help='Incremental Backup Runner based on the default '
                 'strategy. For strategies that do not implement an '
@@ -692,6 +870,12 @@ mongodb_opts = [
                help='Default strategy to perform backups.',
                deprecated_name='backup_strategy',
                deprecated_group='DEFAULT'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.DictOpt('backup_incremental_strategy', default={},
                 help='Incremental Backup Runner based on the default '
                 'strategy. For strategies that do not implement an '
@@ -757,10 +941,22 @@ postgresql_opts = [
                      'if trove_security_groups_support is True).'),
     cfg.StrOpt('backup_strategy', default='PgDump',
                help='Default strategy to perform backups.'),
-    cfg.DictOpt('backup_incremental_strategy', default={},
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
+    cfg.DictOpt('backup_incremental_strategy',
+                default={'PgBaseBackup': 'PgBaseBackupIncremental'},
                 help='Incremental Backup Runner based on the default '
                 'strategy. For strategies that do not implement an '
                 'incremental, the runner will use the default full backup.'),
+    cfg.StrOpt('wal_archive_location',
+               default='/var/lib/postgresql/wal_archive',
+               help='Directory the WAL segments are archived to when the '
+               'backup strategy is PgBaseBackup. Incremental backups are '
+               'made of the segments archived since their parent.'),
     cfg.StrOpt('mount_point', default='/var/lib/postgresql',
                help="Filesystem path for mounting "
                "volumes if volume support is enabled."),
@@ -807,6 +1003,12 @@ couchdb_opts = [
                help='Device path for volume if volume support is enabled.'),
     cfg.StrOpt('backup_strategy', default=None,
                help='Default strategy to perform backups.'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.StrOpt('replication_strategy', default=None,
                help='Default strategy for replication.'),
     cfg.StrOpt('backup_namespace', default=None,
@@ -841,6 +1043,12 @@ vertica_opts = [
                      'if trove_security_groups_support is True).'),
     cfg.StrOpt('backup_strategy', default=None,
                help='Default strategy to perform backups.'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.DictOpt('backup_incremental_strategy', default={},
                 help='Incremental Backup Runner based on the default '
                 'strategy. For strategies that do not implement an '
@@ -903,6 +1111,12 @@ db2_opts = [
                help='Device path for volume if volume support is enabled.'),
     cfg.StrOpt('backup_strategy', default=None,
                help='Default strategy to perform backups.'),
+    cfg.StrOpt('backup_compression_strategy', default='Gzip',
+               help='Strategy to compress backups with, if '
+               'backup_use_gzip_compression is set.'),
+    cfg.IntOpt('backup_compression_level', default=None,
+               help='Compression level of the backup compression strategy. '
+               'The default of the codec is used if unset.'),
     cfg.StrOpt('replication_strategy', default=None,
                help='Default strategy for replication.'),
     cfg.BoolOpt('root_on_create', default=False,
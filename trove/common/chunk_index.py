@@ -0,0 +1,86 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Chunk indexes of deduplicated backups.
+
+A deduplicated backup is stored in the backup container as chunks named
+after the hash of their content, under CHUNK_PREFIX and shared by all the
+backups containing them, and an index object named after the backup that
+lists its chunks in order, named with EXTENSION appended.
+
+The storage compresses, and encrypts if configured to, each chunk on its
+own, so that equal chunks of different backups stay equal. Encrypted
+chunks are named after a keyed hash of their content instead.
+
+Chunks no index refers to are set aside under FOSSIL_PREFIX before they
+are deleted. The REFERENCES object records the chunks of every index.
+"""
+
+import json
+
+# Content type of the index objects, which tells them apart from swift
+# manifests.
+CONTENT_TYPE = 'application/x-trove-chunk-index'
+# Suffix of the names of the indexes, whose chunks the storage decodes.
+EXTENSION = '.dedup'
+CHUNK_PREFIX = 'chunks/'
+FOSSIL_PREFIX = 'fossils/'
+REFERENCES = 'chunks.references'
+VERSION = 1
+
+
+def dumps(chunks, encrypted=False):
+    """Serialize the index of a backup.
+
+    :param chunks: the chunks of the backup in order, as dicts with the
+                   'name' of the chunk object, the 'hash' (etag) of its
+                   content and the number of 'bytes' of backup it holds.
+    :param encrypted: whether the chunks are encrypted.
+    """
+    return json.dumps({'version': VERSION, 'encrypted': encrypted,
+                       'chunks': chunks})
+
+
+def loads(contents):
+    """Return the chunks listed by a serialized index."""
+    return json.loads(contents)['chunks']
+
+
+def is_encrypted(contents):
+    """Whether the chunks listed by a serialized index are encrypted."""
+    return json.loads(contents).get('encrypted', False)
+
+
+def fossil_name(chunk):
+    """Return the name a chunk is set aside under."""
+    return FOSSIL_PREFIX + chunk[len(CHUNK_PREFIX):]
+
+
+def chunk_name(fossil):
+    """Return the name of the chunk set aside as fossil."""
+    return CHUNK_PREFIX + fossil[len(FOSSIL_PREFIX):]
+
+
+def dumps_references(references):
+    """Serialize the record of the chunks of the indexes.
+
+    :param references: dicts with the 'hash' (etag) of each index and the
+                       names of the 'chunks' it refers to, by index name.
+    """
+    return json.dumps({'version': VERSION, 'indexes': references})
+
+
+def loads_references(contents):
+    """Return the chunks of the indexes by index name from a record."""
+    return json.loads(contents)['indexes']
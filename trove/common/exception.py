@@ -515,6 +515,10 @@ class ClusterDatastoreNotSupported(TroveError):
                 "%(datastore)s-%(datastore_version)s.")
 
 
+class ClusterMemberCallsFailed(TroveError):
+    message = _("%(call)s failed on cluster members: %(members)s.")
+
+
 class BackupTooLarge(TroveError):
     message = _("Backup is too large for given flavor or volume. "
                 "Backup size: %(backup_size)s GBs. "
@@ -136,9 +136,12 @@ class MongoDbClusterTasks(task_models.ClusterTasks):
 
             LOG.debug("calling add_config_servers on query_routers")
             try:
-                for query_router in query_routers:
-                    (self.get_guest(query_router)
-                     .add_config_servers(config_server_ips))
+                self._call_members(
+                    'add_config_servers',
+                    lambda query_router: (self.get_guest(query_router)
+                                          .add_config_servers(
+                                              config_server_ips)),
+                    query_routers)
             except Exception:
                 LOG.exception(_("error adding config servers"))
                 self.update_statuses_on_failure(cluster_id)
@@ -152,8 +155,10 @@ class MongoDbClusterTasks(task_models.ClusterTasks):
                                       members, cluster_id):
                 return
             # call to start checking status
-            for instance in instances:
-                self.get_guest(instance).cluster_complete()
+            self._call_members(
+                'cluster_complete',
+                lambda instance: self.get_guest(instance).cluster_complete(),
+                instances)
 
         cluster_usage_timeout = CONF.cluster_usage_timeout
         timeout = Timeout(cluster_usage_timeout)
@@ -203,8 +208,10 @@ class MongoDbClusterTasks(task_models.ClusterTasks):
                                       members, cluster_id, shard_id):
                 return
 
-            for member in members:
-                self.get_guest(member).cluster_complete()
+            self._call_members(
+                'cluster_complete',
+                lambda member: self.get_guest(member).cluster_complete(),
+                members)
 
         cluster_usage_timeout = CONF.cluster_usage_timeout
         timeout = Timeout(cluster_usage_timeout)
@@ -70,18 +70,32 @@ class VerticaClusterTasks(task_models.ClusterTasks):
             # combine them, finally push it back to all instances,
             # and member instances add them to authorized keys.
             LOG.debug("Configuring password-less SSH on cluster members.")
+            # The keys of every user are fetched from all members at once,
+            # then pushed back to all members at once.
+            def _get_public_keys(guest):
+                return [guest.get_public_keys(user)
+                        for user in authorized_users_without_password]
+
+            def _authorize_public_keys(guest):
+                for user, pub_key in zip(authorized_users_without_password,
+                                         pub_keys):
+                    guest.authorize_public_keys(user, pub_key)
+
             try:
-                for user in authorized_users_without_password:
-                    pub_key = [guest.get_public_keys(user) for guest in guests]
-                    for guest in guests:
-                        guest.authorize_public_keys(user, pub_key)
+                guest_keys = self._call_members('get_public_keys',
+                                                _get_public_keys, guests)
+                # One list of the keys of all members per user.
+                pub_keys = [list(keys) for keys in zip(*guest_keys)]
+                self._call_members('authorize_public_keys',
+                                   _authorize_public_keys, guests)
 
                 LOG.debug("Installing cluster with members: %s." % member_ips)
                 guests[0].install_cluster(member_ips)
 
                 LOG.debug("Finalizing cluster configuration.")
-                for guest in guests:
-                    guest.cluster_complete()
+                self._call_members('cluster_complete',
+                                   lambda guest: guest.cluster_complete(),
+                                   guests)
             except Exception:
                 LOG.exception(_("Error creating cluster."))
                 self.update_statuses_on_failure(cluster_id)
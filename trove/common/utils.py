@@ -14,6 +14,8 @@
 #    under the License.
 """I totally stole most of this from melange, thx guys!!!"""
 
+import collections
+import contextlib
 import datetime
 import inspect
 import os
@@ -174,6 +176,28 @@ class MethodInspector(object):
         return "%s %s" % (self._func.__name__, args_str)
 
 
+class PhaseTimer(object):
+    """Accumulates the wall clock time spent in the named phases of an
+    operation, in the order the phases were first entered.
+    """
+
+    def __init__(self):
+        self.timings = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start_time
+            self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+
 def poll_until(retriever, condition=lambda value: value,
                sleep_time=1, time_out=None):
     """Retrieves object until it passes condition, then returns it.
@@ -348,6 +348,12 @@ class API(object):
                           self.version_cap, snapshot_info=snapshot_info,
                           replica_source_config=replica_source_config)
 
+    def cancel_replication_snapshot(self, snapshot_id):
+        LOG.debug("Cancelling replication snapshot %(snapshot)s on instance "
+                  "%(id)s.", {'snapshot': snapshot_id, 'id': self.id})
+        self._cast("cancel_replication_snapshot", self.version_cap,
+                   snapshot_id=snapshot_id)
+
     def attach_replication_slave(self, snapshot, replica_config=None):
         LOG.debug("Configuring instance %s to replicate from %s.",
                   self.id, snapshot.get('master').get('id'))
@@ -14,19 +14,28 @@
 #    under the License.
 #
 
+import json
 import logging
 
+import eventlet
+from eventlet import event
+
 from trove.backup.state import BackupState
 from trove.common import cfg
 from trove.common import context as trove_context
 from trove.common.i18n import _
+from trove.common import utils
 from trove.conductor import api as conductor_api
+from trove.guestagent.common import progress
+from trove.guestagent.common import throttle
 from trove.guestagent.common import timeutils
 from trove.guestagent.dbaas import get_filesystem_volume_stats
 from trove.guestagent.strategies.backup.base import BackupError
 from trove.guestagent.strategies.backup.base import UnknownBackupType
 from trove.guestagent.strategies.backup import get_backup_strategy
+from trove.guestagent.strategies.compression import get_compression_strategy
 from trove.guestagent.strategies.restore import get_restore_strategy
+from trove.guestagent.strategies.storage.experimental import stream_impl
 from trove.guestagent.strategies.storage import get_storage_strategy
 
 LOG = logging.getLogger(__name__)
@@ -48,6 +57,10 @@ INCREMENTAL = CONFIG_MANAGER.backup_incremental_strategy.get(
 
 INCREMENTAL_RUNNER = get_backup_strategy(INCREMENTAL, BACKUP_NAMESPACE)
 
+COMPRESSION = get_compression_strategy(
+    CONFIG_MANAGER.backup_compression_strategy)
+COMPRESSION_LEVEL = CONFIG_MANAGER.backup_compression_level
+
 
 class BackupAgent(object):
     def _get_restore_runner(self, backup_type):
@@ -59,6 +72,33 @@ class BackupAgent(object):
                                     % (backup_type, RESTORE_NAMESPACE))
         return runner
 
+    def _get_compressor(self):
+        compressor = COMPRESSION(level=COMPRESSION_LEVEL)
+        if not compressor.is_enabled():
+            LOG.warning(_("The %s compression is not available, using gzip "
+                          "instead.") % compressor.__strategy_name__)
+            compressor = get_compression_strategy('Gzip')()
+        return compressor
+
+    def get_manifest(self, backup_id, storage, runner=RUNNER,
+                     extra_opts=EXTRA_OPTS):
+        """Return the name the backup backup_id is saved as in storage."""
+        return runner(filename=backup_id, extra_opts=extra_opts,
+                      compressor=self._get_compressor(),
+                      storage_extension=storage.manifest_extension).manifest
+
+    def _report_progress(self, conductor, backup_id, backup_progress,
+                         interval, finished):
+        """Send the progress of the backup to the conductor every interval
+        seconds, whether or not it has advanced, until finished is sent.
+        """
+        while not finished.wait(interval):
+            conductor.update_backup(CONF.guest_id,
+                                    sent=timeutils.float_utcnow(),
+                                    backup_id=backup_id,
+                                    progress=json.dumps(
+                                        backup_progress.snapshot()))
+
     def stream_backup_to_storage(self, backup_info, runner, storage,
                                  parent_metadata={}, extra_opts=EXTRA_OPTS):
         backup_id = backup_info['id']
@@ -80,9 +120,25 @@ class BackupAgent(object):
                                 **backup_state)
         LOG.debug("Updated state for %s to %s.", backup_id, backup_state)
 
+        compressor = self._get_compressor()
+        storage.progress = progress.BackupProgress()
+        # The backup request may throttle the backup its own way.
+        storage.throttle = throttle.Throttle.from_config(
+            backup_info.get('throttle'))
+        # Stops the threads started once the runner is up.
+        finished = event.Event()
         with runner(filename=backup_id, extra_opts=extra_opts,
+                    compressor=compressor, throttle=storage.throttle,
+                    storage_extension=storage.manifest_extension,
                     **parent_metadata) as bkup:
             try:
+                if CONF.backup_progress_interval > 0:
+                    eventlet.spawn_n(self._report_progress, conductor,
+                                     backup_id, storage.progress,
+                                     CONF.backup_progress_interval, finished)
+                if storage.throttle.adaptive:
+                    eventlet.spawn_n(storage.throttle.adapt,
+                                     bkup.probe_latency, finished)
                 LOG.debug("Starting backup %s.", backup_id)
                 success, note, checksum, location = storage.save(
                     bkup.manifest,
@@ -110,6 +166,8 @@ class BackupAgent(object):
                 meta['datastore'] = backup_info['datastore']
                 meta['datastore_version'] = backup_info[
                     'datastore_version']
+                if bkup.compression:
+                    meta['compression'] = bkup.compression
                 storage.save_metadata(location, meta)
 
                 backup_state.update({'state': BackupState.COMPLETED})
@@ -122,6 +180,9 @@ class BackupAgent(object):
                 backup_state.update({'state': BackupState.FAILED})
                 raise
             finally:
+                finished.send(True)
+                backup_state['progress'] = json.dumps(
+                    storage.progress.snapshot())
                 LOG.info(_("Completed backup %(backup_id)s.") % backup_state)
                 conductor.update_backup(CONF.guest_id,
                                         sent=timeutils.float_utcnow(),
@@ -156,6 +217,30 @@ class BackupAgent(object):
         self.stream_backup_to_storage(backup_info, runner, storage,
                                       parent_metadata, extra_opts)
 
+    def _open_stream(self, context, stream, storage):
+        """Connect to the guest streaming the backup, returning the
+        storage, location and checksum to restore the backup from.
+
+        A guest that cannot be connected to stores the backup at the
+        fallback location instead, once it gives up waiting for the
+        connection; the backup is restored from there when it is complete.
+        """
+        stream_storage = stream_impl.StreamStorage(context)
+        try:
+            location = stream_storage.connect(stream)
+            return stream_storage, location, None
+        except (IOError, stream_impl.StreamError):
+            LOG.exception(_("Unable to stream the backup from %(host)s:"
+                            "%(port)d, waiting for it to be stored at "
+                            "%(fallback)s instead.") % stream)
+        location = stream['fallback']
+        checksum = utils.poll_until(
+            lambda: storage.get_checksum(location),
+            sleep_time=10,
+            time_out=(CONF.replication_stream_timeout +
+                      CONF.restore_usage_timeout))
+        return storage, location, checksum
+
     def execute_restore(self, context, backup_info, restore_location):
 
         try:
@@ -167,8 +252,14 @@ class BackupAgent(object):
                 CONF.storage_strategy,
                 CONF.storage_namespace)(context)
 
-            runner = restore_runner(storage, location=backup_info['location'],
-                                    checksum=backup_info['checksum'],
+            location = backup_info['location']
+            checksum = backup_info['checksum']
+            if backup_info.get('stream'):
+                storage, location, checksum = self._open_stream(
+                    context, backup_info['stream'], storage)
+
+            runner = restore_runner(storage, location=location,
+                                    checksum=checksum,
                                     restore_location=restore_location)
             backup_info['restore_location'] = restore_location
             LOG.debug("Restoring instance from backup %(id)s to "
@@ -0,0 +1,72 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Content-defined chunking of backup streams.
+
+Chunk boundaries follow the content rather than fixed offsets, so data
+inserted or removed in one place of a stream only changes the chunks around
+it and the rest of the stream still splits into the same chunks as before.
+
+A boundary may follow any newline whose preceding WINDOW_SIZE bytes hash to
+a value with BOUNDARY_BITS low zero bits. Newlines end every row of a
+logical dump and occur once every 256 bytes on average in binary data, and
+finding them and hashing the small window is done by C code, which keeps
+the chunking fast. Chunks are kept between min_size and max_size bytes; data
+without newlines, like runs of empty pages, is cut at max_size.
+"""
+
+import zlib
+
+ANCHOR = '\n'
+WINDOW_SIZE = 48
+BOUNDARY_BITS = 13
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+def find_boundary(data, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE,
+                  boundary_bits=BOUNDARY_BITS):
+    """Return the length of the chunk data starts with."""
+    mask = (1 << boundary_bits) - 1
+    end = min(len(data), max_size)
+    position = data.find(ANCHOR, max(min_size, WINDOW_SIZE) - 1, end)
+    while position != -1:
+        boundary = position + 1
+        if not zlib.crc32(data[boundary - WINDOW_SIZE:boundary]) & mask:
+            return boundary
+        position = data.find(ANCHOR, boundary, end)
+    return end
+
+
+def chunks(stream, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE,
+           boundary_bits=BOUNDARY_BITS, read_size=READ_SIZE):
+    """Read a file-like stream to its end, yielding its chunks."""
+    data = ''
+    end_of_stream = False
+    while data or not end_of_stream:
+        pending = [data]
+        length = len(data)
+        while not end_of_stream and length < max_size:
+            chunk = stream.read(read_size)
+            if not chunk:
+                end_of_stream = True
+            pending.append(chunk)
+            length += len(chunk)
+        data = ''.join(pending)
+        if not data:
+            break
+        boundary = find_boundary(data, min_size, max_size, boundary_bits)
+        yield data[:boundary]
+        data = data[boundary:]
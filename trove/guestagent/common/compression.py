@@ -0,0 +1,73 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compression of backup streams inside the guest agent.
+
+The stream is cut into blocks that are compressed independently, on real
+threads (zlib releases the GIL), and written out in order as separate gzip
+members. A concatenation of gzip members is itself a valid gzip file, so
+the output can still be restored with ``gzip -d``, and streams compressed
+by ``gzip`` can be decompressed here.
+"""
+
+import zlib
+
+from eventlet import tpool
+
+from trove.guestagent.common import stream
+
+COMPRESSION_LEVEL = 6
+# zlib window bits that select the gzip header and trailer.
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def gzip_block(data, level=COMPRESSION_LEVEL):
+    """Compress data into a single, complete gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class GzipCompressor(stream.BlockTransformer):
+    """File-like reader that gzips another one with a pool of threads."""
+
+    def __init__(self, source, workers, level=COMPRESSION_LEVEL,
+                 block_size=stream.BLOCK_SIZE):
+        self.level = level
+        super(GzipCompressor, self).__init__(source, workers,
+                                             block_size=block_size)
+
+    def transform_block(self, block, index):
+        return gzip_block(block, self.level)
+
+
+def gunzip(chunks):
+    """Decompress an iterable of chunks of gzip data, made of any number of
+    gzip members, yielding the decompressed data.
+
+    The decompression runs on a real thread, overlapping with reading the
+    source and writing the output.
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    for chunk in chunks:
+        while chunk:
+            data = tpool.execute(decompressor.decompress, chunk)
+            if data:
+                yield data
+            # Whatever follows the end of a gzip member starts the next one.
+            chunk = decompressor.unused_data
+            if chunk:
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+    data = decompressor.flush()
+    if data:
+        yield data
@@ -0,0 +1,190 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Authenticated encryption of backup streams inside the guest agent.
+
+A stream starts with a magic string and a random salt, from which and the
+backup key an AES-256 key and an HMAC-SHA256 key are derived (HKDF). The
+data follows in frames of up to one block each::
+
+    flag (1 byte) | length (4 bytes) | AES-256-CTR ciphertext | HMAC (32)
+
+Each frame is encrypted with a counter starting at its index, and its HMAC
+covers the index as well, so frames can be encrypted independently of each
+other but cannot be reordered or dropped. The stream ends with an empty
+frame flagged as the last one, so truncation is detected too.
+
+Blocks can also be encrypted into streams of their own with a salt derived
+from their content, so that equal blocks encrypt alike and are stored once
+by a deduplicating storage.
+"""
+
+import hashlib
+import hmac
+import os
+import struct
+
+from Crypto.Cipher import AES
+from Crypto.Util import Counter
+from eventlet import tpool
+
+from trove.common.i18n import _
+from trove.guestagent.common import stream
+from trove.openstack.common.crypto import utils as crypto_utils
+
+# Suffix of the names of backups encrypted this way.
+MANIFEST_EXTENSION = '.aenc'
+MAGIC = 'TROVEAE1'
+SALT_SIZE = 16
+KEY_SIZE = 32
+KEY_INFO = 'trove backup stream'
+FRAME_HEADER = struct.Struct('>BI')
+TAG_SIZE = hashlib.sha256().digest_size
+LAST_FRAME = 1
+
+
+class DecryptionError(Exception):
+    """The backup stream is not intact or the key is wrong."""
+
+
+def derive_keys(password, salt):
+    """Return the encryption and the authentication key for a stream."""
+    hkdf = crypto_utils.HKDF()
+    key_material = hkdf.expand(hkdf.extract(password, salt), KEY_INFO,
+                               2 * KEY_SIZE)
+    return key_material[:KEY_SIZE], key_material[KEY_SIZE:]
+
+
+def _cipher(key, index):
+    counter = Counter.new(64, prefix=struct.pack('>Q', index))
+    return AES.new(key, AES.MODE_CTR, counter=counter)
+
+
+def _tag(mac_key, index, header, ciphertext):
+    mac = hmac.new(mac_key, struct.pack('>Q', index) + header,
+                   hashlib.sha256)
+    mac.update(ciphertext)
+    return mac.digest()
+
+
+def encrypt_frame(keys, index, data, flag=0):
+    key, mac_key = keys
+    ciphertext = _cipher(key, index).encrypt(data)
+    header = FRAME_HEADER.pack(flag, len(ciphertext))
+    return header + ciphertext + _tag(mac_key, index, header, ciphertext)
+
+
+class Encryptor(stream.BlockTransformer):
+    """File-like reader that encrypts another one."""
+
+    def __init__(self, source, password, workers=1,
+                 block_size=stream.BLOCK_SIZE):
+        self.salt = os.urandom(SALT_SIZE)
+        self.keys = derive_keys(password, self.salt)
+        super(Encryptor, self).__init__(source, workers,
+                                        block_size=block_size)
+
+    def header(self):
+        return MAGIC + self.salt
+
+    def transform_block(self, block, index):
+        return encrypt_frame(self.keys, index, block)
+
+    def trailer(self, block_count):
+        return encrypt_frame(self.keys, block_count, '', flag=LAST_FRAME)
+
+
+def block_id(data, password):
+    """Return an identifier of data that tells nothing about it to those
+    without the password.
+    """
+    return hmac.new(password, data, hashlib.sha256).hexdigest()
+
+
+def encrypt_block(data, password):
+    """Encrypt data into a stream of its own that only depends on the data
+    and the password, which shows whether blocks are equal and nothing
+    else about them.
+    """
+    salt = hmac.new(password, data, hashlib.sha256).digest()[:SALT_SIZE]
+    keys = derive_keys(password, salt)
+    return (MAGIC + salt + encrypt_frame(keys, 0, data) +
+            encrypt_frame(keys, 1, '', flag=LAST_FRAME))
+
+
+def decrypt_block(data, password):
+    """Decrypt a block encrypted by encrypt_block."""
+    return ''.join(decrypt([data], password))
+
+
+class _ChunkReader(object):
+    """Read exact amounts of data out of an iterable of chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+
+    def read(self, size):
+        parts = [self.buffer]
+        length = len(self.buffer)
+        while length < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            parts.append(chunk)
+            length += len(chunk)
+        data = ''.join(parts)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def _decrypt_frame(keys, index, header, ciphertext, tag):
+    key, mac_key = keys
+    if not hmac.compare_digest(_tag(mac_key, index, header, ciphertext),
+                               tag):
+        raise DecryptionError(_("Frame %d of the backup failed "
+                                "authentication.") % index)
+    return _cipher(key, index).decrypt(ciphertext)
+
+
+def decrypt(chunks, password):
+    """Decrypt an iterable of chunks of an encrypted stream, yielding the
+    data of each frame once it has been authenticated.
+    """
+    reader = _ChunkReader(chunks)
+    start = reader.read(len(MAGIC) + SALT_SIZE)
+    if start[:len(MAGIC)] != MAGIC or len(start) < len(MAGIC) + SALT_SIZE:
+        raise DecryptionError(_("The backup is not an encrypted stream."))
+    keys = derive_keys(password, start[len(MAGIC):])
+
+    index = 0
+    while True:
+        header = reader.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise DecryptionError(_("The backup is truncated."))
+        flag, length = FRAME_HEADER.unpack(header)
+        ciphertext = reader.read(length)
+        tag = reader.read(TAG_SIZE)
+        if len(ciphertext) < length or len(tag) < TAG_SIZE:
+            raise DecryptionError(_("The backup is truncated."))
+        data = tpool.execute(_decrypt_frame, keys, index, header,
+                             ciphertext, tag)
+        if data:
+            yield data
+        if flag == LAST_FRAME:
+            break
+        index += 1
+    if reader.read(1):
+        raise DecryptionError(_("Unexpected data after the end of the "
+                                "backup."))
@@ -0,0 +1,66 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+MEGABYTE = 1024.0 * 1024.0
+
+
+def _rate(length, elapsed):
+    """Return a throughput in MB/s, rounded for reporting."""
+    return round(length / MEGABYTE / elapsed, 2) if elapsed > 0 else 0.0
+
+
+class BackupProgress(object):
+    """Counters of the progress of a backup through its stages: the bytes
+    read from the backup process, and the bytes and segments saved by the
+    storage strategy.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.bytes_read = 0
+        self.bytes_saved = 0
+        self.segments = 0
+        self._last = (self.started, 0, 0)
+
+    def read(self, length):
+        self.bytes_read += length
+
+    def saved(self, length):
+        """Count a segment of length bytes saved by the storage."""
+        self.bytes_saved += length
+        self.segments += 1
+
+    def snapshot(self):
+        """Return the progress, with the average throughput of each stage
+        and its throughput since the previous snapshot, which tells a
+        stalled backup from a slow one.
+        """
+        now = time.time()
+        last_time, last_read, last_saved = self._last
+        self._last = (now, self.bytes_read, self.bytes_saved)
+        elapsed = now - self.started
+        return {
+            'bytes_read': self.bytes_read,
+            'bytes_saved': self.bytes_saved,
+            'segments': self.segments,
+            'elapsed': round(elapsed, 1),
+            'read_rate': _rate(self.bytes_read, elapsed),
+            'save_rate': _rate(self.bytes_saved, elapsed),
+            'current_read_rate': _rate(self.bytes_read - last_read,
+                                       now - last_time),
+            'current_save_rate': _rate(self.bytes_saved - last_saved,
+                                       now - last_time),
+        }
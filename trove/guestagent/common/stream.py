@@ -0,0 +1,86 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Stages that transform backup streams inside the guest agent."""
+
+import collections
+
+import eventlet
+from eventlet import tpool
+
+# Size of the blocks transformed independently of each other.
+BLOCK_SIZE = 1024 ** 2
+
+
+class BlockTransformer(object):
+    """File-like reader that transforms another one block by block.
+
+    Blocks are independent of each other, so up to workers of them are
+    transformed at the same time on real threads and written out in order.
+    The next blocks are only read from the source once the oldest one has
+    been consumed, so memory stays bounded by a few blocks per worker.
+
+    Subclasses implement transform_block and may add a header and trailer.
+    """
+
+    def __init__(self, stream, workers, block_size=BLOCK_SIZE):
+        self.stream = stream
+        self.workers = max(1, workers)
+        self.block_size = block_size
+        self.pending = collections.deque()
+        self.block_count = 0
+        self.end_of_stream = False
+        self.buffer = self.header()
+        self.offset = 0
+
+    def header(self):
+        """Data written before the first block."""
+        return ''
+
+    def trailer(self, block_count):
+        """Data written after the last block."""
+        return ''
+
+    def transform_block(self, block, index):
+        raise NotImplementedError()
+
+    def _fill(self):
+        while not self.end_of_stream and len(self.pending) < self.workers:
+            block = self.stream.read(self.block_size)
+            if not block:
+                self.end_of_stream = True
+                self.pending.append(eventlet.spawn(self.trailer,
+                                                   self.block_count))
+                break
+            self.pending.append(eventlet.spawn(tpool.execute,
+                                               self.transform_block,
+                                               block, self.block_count))
+            self.block_count += 1
+
+    def read(self, chunk_size):
+        while len(self.buffer) - self.offset < chunk_size:
+            self._fill()
+            if not self.pending:
+                break
+            self.buffer = (self.buffer[self.offset:] +
+                           self.pending.popleft().wait())
+            self.offset = 0
+        chunk = self.buffer[self.offset:self.offset + chunk_size]
+        self.offset += len(chunk)
+        return chunk
+
+    def close(self):
+        for block in self.pending:
+            block.kill()
+        self.pending.clear()
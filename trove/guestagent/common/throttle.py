@@ -0,0 +1,152 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Throttling of backups, so that they leave the datastore room to serve
+its clients.
+"""
+
+import pipes
+import time
+
+import eventlet
+from eventlet import tpool
+
+from trove.common import cfg
+from trove.common.i18n import _
+from trove.openstack.common import log as logging
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+KILOBYTE = 1024
+IONICE_CLASSES = {'idle': 3, 'best-effort': 2}
+# Factor the rate is raised by while the datastore keeps up.
+RATE_INCREASE = 1.5
+
+
+class Throttle(object):
+    """Settings of the throttling of a backup, and the token bucket that
+    limits the rate its stream is read at.
+
+    The bucket holds up to a second worth of the rate, so short bursts go
+    through unthrottled; reads that empty it sleep until it has refilled.
+    """
+
+    def __init__(self, max_rate=0, ionice_class=None, nice=0,
+                 adaptive=False):
+        # Rates are in bytes per second, 0 does not limit the stream.
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.ionice_class = ionice_class
+        self.nice = nice
+        self.adaptive = adaptive
+        self.tokens = max_rate
+        self.last = time.time()
+        self.consumed = 0
+
+    @classmethod
+    def from_config(cls, overrides=None):
+        """Return the throttle configured for backups, with the settings of
+        overrides, those of the backup request, taking precedence.
+        """
+        settings = {
+            'max_rate': CONF.backup_max_rate,
+            'ionice_class': CONF.backup_ionice_class,
+            'nice': CONF.backup_nice,
+            'adaptive': CONF.backup_adaptive_throttle,
+        }
+        settings.update((key, value)
+                        for key, value in (overrides or {}).items()
+                        if key in settings)
+        if settings['ionice_class'] not in IONICE_CLASSES:
+            settings['ionice_class'] = None
+        settings['max_rate'] = max(0, int(settings['max_rate'])) * KILOBYTE
+        settings['nice'] = min(19, max(0, int(settings['nice'])))
+        return cls(**settings)
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.tokens = min(self.tokens, rate)
+
+    def consume(self, length):
+        """Count length bytes read from the stream, sleeping as long as it
+        takes the bucket to make up for them.
+        """
+        self.consumed += length
+        if not self.rate:
+            return
+        now = time.time()
+        self.tokens = min(self.rate,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= length
+        if self.tokens < 0:
+            eventlet.sleep(-self.tokens / float(self.rate))
+
+    def command(self, command):
+        """Return the shell command run with the I/O scheduling class and
+        niceness of the throttle, which the processes it starts inherit.
+        """
+        prefix = []
+        if self.ionice_class:
+            prefix.append('ionice -c %d' % IONICE_CLASSES[self.ionice_class])
+            if self.ionice_class == 'best-effort':
+                prefix.append('-n 7')
+        if self.nice:
+            prefix.append('nice -n %d' % self.nice)
+        if not prefix:
+            return command
+        return '%s sh -c %s' % (' '.join(prefix), pipes.quote(command))
+
+    def adapt(self, probe, finished, interval=None, threshold=None,
+              min_rate=None):
+        """Adjust the rate to the latency of the datastore until finished
+        is sent.
+
+        probe returns the latency of a request to the datastore in seconds.
+        While it is above the threshold the rate is halved, down to
+        min_rate; once it is back under, the rate is raised again up to the
+        maximum rate, or until it no longer limits the stream.
+        """
+        interval = interval or CONF.backup_throttle_interval
+        threshold = threshold or CONF.backup_latency_threshold
+        min_rate = (min_rate or CONF.backup_min_rate) * KILOBYTE
+        consumed = self.consumed
+        while not finished.wait(interval):
+            throughput = (self.consumed - consumed) / float(interval)
+            consumed = self.consumed
+            try:
+                latency = tpool.execute(probe)
+            except Exception:
+                LOG.exception(_("Error probing the latency of the "
+                                "datastore."))
+                continue
+            if latency is None:
+                continue
+            if latency > threshold:
+                rate = throughput / 2 if not self.rate else self.rate / 2
+                rate = max(min_rate, int(rate))
+                LOG.info(_("Datastore latency of %(latency).3fs, slowing the "
+                           "backup down to %(rate)d bytes/s.") %
+                         {'latency': latency, 'rate': rate})
+                self.set_rate(rate)
+            elif self.rate and self.rate != self.max_rate:
+                rate = int(self.rate * RATE_INCREASE)
+                if self.max_rate:
+                    rate = min(rate, self.max_rate)
+                elif rate > 2 * throughput:
+                    # The stream is slower than the limit on its own.
+                    rate = 0
+                LOG.debug("Speeding the backup up to %d bytes/s." % rate)
+                self.set_rate(rate)
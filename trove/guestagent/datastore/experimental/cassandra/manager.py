@@ -19,6 +19,8 @@ import os
 from trove.common import cfg
 from trove.common import exception
 from trove.common.i18n import _
+from trove.common import instance as rd_instance
+from trove.guestagent import backup
 from trove.guestagent.datastore.experimental.cassandra import service
 from trove.guestagent import dbaas
 from trove.guestagent import volume
@@ -101,6 +103,9 @@ class Manager(periodic_task.PeriodicTasks):
             LOG.debug("Restarting database after changes.")
             self.app.start_db()
 
+        if backup_info:
+            self._perform_restore(backup_info, context, mount_point, self.app)
+
         self.appStatus.end_install_or_restart()
         LOG.info(_("Completed setup of Cassandra database instance."))
 
@@ -163,12 +168,18 @@ class Manager(periodic_task.PeriodicTasks):
             operation='is_root_enabled', datastore=MANAGER)
 
     def _perform_restore(self, backup_info, context, restore_location, app):
-        raise exception.DatastoreOperationNotSupported(
-            operation='_perform_restore', datastore=MANAGER)
+        LOG.info(_("Restoring database from backup %s.") % backup_info['id'])
+        try:
+            backup.restore(context, backup_info, restore_location)
+        except Exception:
+            LOG.exception(_("Error performing restore from backup %s.") %
+                          backup_info['id'])
+            app.status.set_status(rd_instance.ServiceStatuses.FAILED)
+            raise
+        LOG.info(_("Restored database successfully."))
 
     def create_backup(self, context, backup_info):
-        raise exception.DatastoreOperationNotSupported(
-            operation='create_backup', datastore=MANAGER)
+        backup.backup(context, backup_info)
 
     def mount_volume(self, context, device_path=None, mount_point=None):
         device = volume.VolumeDevice(device_path)
@@ -18,6 +18,8 @@ from trove.common import cfg
 CONF = cfg.CONF
 
 CASSANDRA_DATA_DIR = "/var/lib/cassandra/data"
+CASSANDRA_COMMITLOG_DIR = "/var/lib/cassandra/commitlog"
+CASSANDRA_SAVED_CACHES_DIR = "/var/lib/cassandra/saved_caches"
 CASSANDRA_CONF = "/etc/cassandra/cassandra.yaml"
 CASSANDRA_TEMP_CONF = "/tmp/cassandra.yaml"
 CASSANDRA_TEMP_DIR = "/tmp/cassandra"
@@ -33,4 +35,5 @@ CASSANDRA_STATUS = """echo "use system;" > /tmp/check; cqlsh -f /tmp/check"""
 
 CASSANDRA_KILL = "sudo killall java  || true"
 SERVICE_STOP_TIMEOUT = 60
+NODETOOL_TIMEOUT = 600
 INSTALL_TIMEOUT = 10000
@@ -19,6 +19,7 @@ from trove.common import cfg
 from trove.common.i18n import _
 from trove.common import utils
 from trove.guestagent.common import operating_system
+from trove.guestagent.common.operating_system import FileMode
 from trove.guestagent.datastore.experimental.postgresql import pgutil
 from trove.guestagent.datastore.experimental.postgresql.service.process import(
     PgSqlProcess)
@@ -31,6 +32,13 @@ CONF = cfg.CONF
 
 PGSQL_CONFIG = "/etc/postgresql/{version}/main/postgresql.conf"
 PGSQL_HBA_CONFIG = "/etc/postgresql/{version}/main/pg_hba.conf"
+PGSQL_DATA_DIR = "/var/lib/postgresql/{version}/main"
+# The backup strategy that needs the WAL archived.
+WAL_BACKUP_STRATEGY = 'PgBaseBackup'
+
+
+def wal_archiving_enabled():
+    return CONF.postgresql.backup_strategy == WAL_BACKUP_STRATEGY
 
 
 class PgSqlConfig(PgSqlProcess):
@@ -68,6 +76,8 @@ class PgSqlConfig(PgSqlProcess):
                 guest_id=CONF.guest_id,
             )
         )
+        if wal_archiving_enabled():
+            configuration += self._wal_archive_configuration()
         with open('/tmp/pgsql_config', 'w+') as config_file:
             config_file.write(configuration)
         operating_system.chown('/tmp/pgsql_config', 'postgres', None,
@@ -75,6 +85,23 @@ class PgSqlConfig(PgSqlProcess):
         operating_system.move('/tmp/pgsql_config', config_location, timeout=30,
                               as_root=True)
 
+    def _wal_archive_configuration(self):
+        """Return the settings that archive the WAL to the
+        wal_archive_location, creating the directory if need be.
+        """
+        archive_dir = CONF.postgresql.wal_archive_location
+        operating_system.create_directory(archive_dir, user='postgres',
+                                          group='postgres', as_root=True)
+        # The backup strategy lists the archive as the guest agent user.
+        operating_system.chmod(archive_dir, FileMode.ADD_READ_ALL(),
+                               recursive=False, as_root=True)
+        return ("\n"
+                "wal_level = 'hot_standby'\n"
+                "archive_mode = on\n"
+                "archive_command = 'test ! -f %(dir)s/%%f && "
+                "cp %%p %(dir)s/%%f'\n"
+                "max_wal_senders = 2\n" % {'dir': archive_dir})
+
     def set_db_to_listen(self, context):
         """Allow remote connections with encrypted passwords."""
         # Using cat to read file due to read permissions issues.
@@ -93,6 +120,10 @@ class PgSqlConfig(PgSqlProcess):
         with open('/tmp/pgsql_hba_config', 'w+') as config_file:
             config_file.write(out)
             config_file.write("host    all     all     0.0.0.0/0   md5\n")
+            if wal_archiving_enabled():
+                # pg_basebackup connects for replication.
+                config_file.write("local   replication     postgres"
+                                  "    peer\n")
 
         operating_system.chown('/tmp/pgsql_hba_config',
                                'postgres', None, recursive=False, as_root=True)
@@ -0,0 +1,114 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Minimal client of the Redis protocol.
+
+Commands go over a green socket, so waiting on the server does not block
+the guest agent the way shelling out to redis-cli for every command does.
+"""
+
+from eventlet.green import socket
+
+from trove.common.i18n import _
+
+CRLF = '\r\n'
+
+
+class RedisError(Exception):
+    """Redis replied with an error, or the reply could not be read."""
+
+
+class RedisClient(object):
+
+    def __init__(self, host='localhost', port=6379, password=None,
+                 timeout=30):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._socket = None
+        self._reader = None
+
+    def connect(self):
+        self._socket = socket.create_connection((self.host, self.port),
+                                                self.timeout)
+        self._reader = self._socket.makefile('rb')
+        if self.password:
+            self.execute('AUTH', self.password)
+
+    def close(self):
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+            self._socket = None
+            self._reader = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def execute(self, *args):
+        """Send a command and return its reply."""
+        if self._socket is None:
+            self.connect()
+        self._socket.sendall(self.pack_command(*args))
+        return self.read_reply()
+
+    @staticmethod
+    def pack_command(*args):
+        parts = ['*%d%s' % (len(args), CRLF)]
+        for arg in args:
+            arg = str(arg)
+            parts.append('$%d%s%s%s' % (len(arg), CRLF, arg, CRLF))
+        return ''.join(parts)
+
+    def _read_line(self):
+        line = self._reader.readline()
+        if not line.endswith(CRLF):
+            raise RedisError(_("Connection to Redis lost."))
+        return line[:-len(CRLF)]
+
+    def read_reply(self):
+        line = self._read_line()
+        kind, rest = line[:1], line[1:]
+        if kind == '+':
+            return rest
+        if kind == '-':
+            raise RedisError(rest)
+        if kind == ':':
+            return int(rest)
+        if kind == '$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + len(CRLF))
+            if len(data) < length + len(CRLF):
+                raise RedisError(_("Connection to Redis lost."))
+            return data[:length]
+        if kind == '*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self.read_reply() for i in range(length)]
+        raise RedisError(_("Unexpected reply from Redis: %s") % line)
+
+    def info(self, section=None):
+        """Return the fields of INFO as a dict."""
+        args = ('INFO', section) if section else ('INFO',)
+        return dict(line.split(':', 1)
+                    for line in self.execute(*args).splitlines()
+                    if line and not line.startswith('#') and ':' in line)
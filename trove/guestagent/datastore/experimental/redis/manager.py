@@ -22,6 +22,7 @@ from trove.guestagent.datastore.experimental.redis.service import (
     RedisApp)
 from trove.guestagent.datastore.experimental.redis.service import (
     RedisAppStatus)
+from trove.guestagent import backup
 from trove.guestagent import dbaas
 from trove.guestagent import volume
 from trove.openstack.common import log as logging
@@ -72,12 +73,17 @@ class Manager(periodic_task.PeriodicTasks):
 
     def _perform_restore(self, backup_info, context, restore_location, app):
         """
-        Perform a restore on this instance,
-        currently it is not implemented.
+        Perform a restore on this instance.
         """
-        LOG.debug("Perform restore called.")
-        raise exception.DatastoreOperationNotSupported(
-            operation='_perform_restore', datastore=MANAGER)
+        LOG.info(_("Restoring database from backup %s.") % backup_info['id'])
+        try:
+            backup.restore(context, backup_info, restore_location)
+        except Exception:
+            LOG.exception(_("Error performing restore from backup %s.") %
+                          backup_info['id'])
+            app.status.set_status(rd_instance.ServiceStatuses.FAILED)
+            raise
+        LOG.info(_("Restored database successfully."))
 
     def prepare(self, context, packages, databases, memory_mb, users,
                 device_path=None, mount_point=None, backup_info=None,
@@ -104,6 +110,9 @@ class Manager(periodic_task.PeriodicTasks):
             LOG.info(_('Writing redis configuration.'))
             app.write_config(config_contents)
             app.restart()
+            if backup_info:
+                self._perform_restore(backup_info, context,
+                                      mount_point, app)
             LOG.info(_('Redis instance has been setup and configured.'))
         except Exception:
             LOG.exception(_("Error setting up Redis instance."))
@@ -147,12 +156,14 @@ class Manager(periodic_task.PeriodicTasks):
 
     def create_backup(self, context, backup_info):
         """
-        This will eventually create a backup. Right now
-        it does nothing.
+        Backs up this redis instance. The call blocks until the
+        backup is complete or errors.
+
+        :param backup_info: a dictionary containing the db instance id of the
+                            backup task, location, type, and other data.
         """
-        LOG.debug("Create Backup called.")
-        raise exception.DatastoreOperationNotSupported(
-            operation='create_backup', datastore=MANAGER)
+        LOG.debug("Creating backup.")
+        backup.backup(context, backup_info)
 
     def mount_volume(self, context, device_path=None, mount_point=None):
         device = volume.VolumeDevice(device_path)
@@ -21,6 +21,7 @@ from trove.common.i18n import _
 from trove.common import instance as rd_instance
 from trove.common import utils as utils
 from trove.guestagent.common import operating_system
+from trove.guestagent.datastore.experimental.redis.client import RedisClient
 from trove.guestagent.datastore.experimental.redis import system
 from trove.guestagent.datastore import service
 from trove.guestagent import pkg
@@ -49,6 +50,24 @@ def _load_redis_options():
     return options
 
 
+def get_redis_client():
+    """
+    Returns a client of the local redis server, authenticated
+    with the password of the config file if there is one.
+    """
+    options = _load_redis_options()
+    return RedisClient(port=int(options.get('port', 6379)),
+                       password=options.get('requirepass') or None)
+
+
+def get_rdb_path(options):
+    """
+    Returns the path of the RDB file redis saves to and loads from.
+    """
+    return os.path.join(options.get('dir', '/var/lib/redis'),
+                        options.get('dbfilename', 'dump.rdb'))
+
+
 class RedisAppStatus(service.BaseDbStatus):
     """
     Handles all of the status updating for the redis guest agent.
@@ -248,9 +248,17 @@ class Manager(periodic_task.PeriodicTasks):
             'master': replication.get_master_ref(app, snapshot_info),
             'log_position': log_position
         }
+        if snapshot_info and snapshot_info.get('stream'):
+            # The replica streams the snapshot from this instance.
+            replication_snapshot['dataset']['stream'] = snapshot_info['stream']
 
         return replication_snapshot
 
+    def cancel_replication_snapshot(self, context, snapshot_id):
+        LOG.debug("Cancelling replication snapshot %s." % snapshot_id)
+        replication = REPLICATION_STRATEGY_CLASS(context)
+        replication.cancel_snapshot(snapshot_id)
+
     def enable_as_master(self, context, replica_source_config):
         LOG.debug("Calling enable_as_master.")
         app = MySqlApp(MySqlAppStatus.get())
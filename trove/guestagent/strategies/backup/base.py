@@ -18,6 +18,10 @@ import signal
 
 from eventlet.green import subprocess
 from trove.common import cfg, utils
+from trove.common.i18n import _
+from trove.guestagent.common import encryption
+from trove.guestagent.common import throttle
+from trove.guestagent.strategies.compression import get_compression_strategy
 from trove.guestagent.strategy import Strategy
 from trove.openstack.common import log as logging
 
@@ -44,11 +48,22 @@ class BackupRunner(Strategy):
     is_zipped = CONF.backup_use_gzip_compression
     is_encrypted = CONF.backup_use_openssl_encryption
     encrypt_key = CONF.backup_aes_cbc_key
+    encrypt_in_agent = CONF.backup_encrypt_in_agent
+    compression_workers = CONF.backup_compression_workers
+    encryption_workers = CONF.backup_encryption_workers
 
     def __init__(self, filename, **kwargs):
         self.base_filename = filename
         self.process = None
         self.pid = None
+        self.stream = None
+        # The storage may compress and encrypt the backup itself.
+        self.storage_extension = kwargs.pop('storage_extension', None) or ''
+        if self.storage_extension:
+            self.is_zipped = False
+            self.is_encrypted = False
+        self.compressor = self._get_compressor(kwargs.pop('compressor', None))
+        self.throttle = kwargs.pop('throttle', None) or throttle.Throttle()
         kwargs.update({'filename': filename})
         self.command = self.cmd % kwargs
         super(BackupRunner, self).__init__()
@@ -57,13 +72,47 @@ class BackupRunner(Strategy):
     def backup_type(self):
         return type(self).__name__
 
+    def _get_compressor(self, compressor):
+        gzip = get_compression_strategy('Gzip')
+        if compressor is None:
+            return gzip()
+        if compressor.zip_cmd is None and self.encrypt_cmd:
+            # openssl encrypts after the compression, so the compression
+            # has to run in the pipe as well.
+            LOG.warning(_("The %s compression only runs in the guest agent, "
+                          "using gzip to compress the backup piped through "
+                          "openssl instead.") % compressor.__strategy_name__)
+            return gzip()
+        return compressor
+
+    @property
+    def compression(self):
+        """Name of the compression strategy of the backup, if compressed."""
+        if self.is_zipped:
+            return self.compressor.__strategy_name__
+        return None
+
     def _run(self):
         LOG.debug("BackupRunner running cmd: %s", self.command)
-        self.process = subprocess.Popen(self.command, shell=True,
+        self.process = subprocess.Popen(self.throttle.command(self.command),
+                                        shell=True,
                                         stdout=subprocess.PIPE,
                                         stderr=subprocess.PIPE,
                                         preexec_fn=os.setsid)
         self.pid = self.process.pid
+        self.stream = self._agent_stages(self.process.stdout)
+
+    def _agent_stages(self, stream):
+        """Return the stream compressed and encrypted by the agent, as far
+        as the command does not do it.
+        """
+        if self.is_zipped and self.zip_in_agent:
+            stream = self.compressor.compress(
+                stream, max(1, self.compression_workers))
+        if self.is_encrypted and self.encrypt_in_agent:
+            stream = encryption.Encryptor(
+                stream, self.encrypt_key, self.encryption_workers)
+        return stream
 
     def __enter__(self):
         """Start up the process."""
@@ -99,6 +148,13 @@ class BackupRunner(Strategy):
         """Hook for subclasses to store metadata from the backup."""
         return {}
 
+    def probe_latency(self):
+        """Hook for subclasses to return the latency in seconds of a
+        request to the datastore, which adaptive throttling slows the backup
+        down on. Called in a native thread.
+        """
+        return None
+
     @property
     def filename(self):
         """Subclasses may overwrite this to declare a format (.tar)."""
@@ -106,33 +162,54 @@ class BackupRunner(Strategy):
 
     @property
     def manifest(self):
-        return "%s%s%s" % (self.filename,
-                           self.zip_manifest,
-                           self.encrypt_manifest)
+        return "%s%s%s%s" % (self.filename,
+                             self.zip_manifest,
+                             self.encrypt_manifest,
+                             self.storage_extension)
+
+    @property
+    def zip_in_agent(self):
+        """Whether the agent compresses the backup stream itself, which it
+        has to for the codecs without a command.
+        """
+        if self.encrypt_cmd:
+            return False
+        return (self.compression_workers > 0 or
+                self.compressor.zip_cmd is None)
 
     @property
     def zip_cmd(self):
-        return ' | gzip' if self.is_zipped else ''
+        if self.is_zipped and not self.zip_in_agent:
+            return ' | ' + self.compressor.zip_cmd
+        return ''
 
     @property
     def zip_manifest(self):
-        return '.gz' if self.is_zipped else ''
+        if self.is_zipped:
+            return self.compressor.manifest_extension
+        return ''
 
     @property
     def encrypt_cmd(self):
-        return (' | openssl enc -aes-256-cbc -salt -pass pass:%s' %
-                self.encrypt_key) if self.is_encrypted else ''
+        if self.is_encrypted and not self.encrypt_in_agent:
+            return (' | openssl enc -aes-256-cbc -salt -pass pass:%s' %
+                    self.encrypt_key)
+        return ''
 
     @property
     def encrypt_manifest(self):
-        return '.enc' if self.is_encrypted else ''
+        if not self.is_encrypted:
+            return ''
+        if self.encrypt_in_agent:
+            return encryption.MANIFEST_EXTENSION
+        return '.enc'
 
     def check_process(self):
         """Hook for subclasses to check process for errors."""
         return True
 
     def read(self, chunk_size):
-        return self.process.stdout.read(chunk_size)
+        return self.stream.read(chunk_size)
 
     def _run_pre_backup(self):
         pass
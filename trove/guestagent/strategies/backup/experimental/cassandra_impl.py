@@ -0,0 +1,234 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import os
+import signal
+
+import eventlet
+from eventlet.green import subprocess
+from eventlet import queue
+
+from trove.common import cfg
+from trove.common import exception
+from trove.common.i18n import _
+from trove.common import utils
+from trove.guestagent.datastore.experimental.cassandra import system
+from trove.guestagent.strategies.backup import base
+from trove.openstack.common import log as logging
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# How far each keyspace is read ahead of the backup stream.
+READ_AHEAD = 8 * 1024 ** 2
+# The identity of the node is not restored along with its data.
+NODE_TABLES = ('local', 'peers')
+
+
+def snapshot_tables(data_dir, tag):
+    """Return the keyspaces of the snapshot tag with the paths of the
+    snapshot directories of their tables, relative to data_dir.
+    """
+    keyspaces = collections.OrderedDict()
+    for keyspace in sorted(os.listdir(data_dir)):
+        for table in sorted(os.listdir(os.path.join(data_dir, keyspace))):
+            if keyspace == 'system' and table.split('-')[0] in NODE_TABLES:
+                continue
+            path = os.path.join(keyspace, table, 'snapshots', tag)
+            if os.path.isdir(os.path.join(data_dir, path)):
+                keyspaces.setdefault(keyspace, []).append(path)
+    return keyspaces
+
+
+class SnapshotReader(object):
+    """File-like reader of the outputs of commands, one after the other.
+
+    Up to workers commands run at the same time, each read ahead of the
+    stream by up to READ_AHEAD bytes.
+    """
+
+    def __init__(self, commands, workers):
+        self.commands = collections.deque(commands)
+        self.workers = max(1, workers)
+        self.readers = collections.deque()
+        self.processes = []
+        self.buffer = ''
+        self.closed = False
+        self._start_readers()
+
+    def _start_readers(self):
+        while self.commands and len(self.readers) < self.workers:
+            chunks = queue.LightQueue(READ_AHEAD // CHUNK_SIZE)
+            eventlet.spawn_n(self._read_command, self.commands.popleft(),
+                             chunks)
+            self.readers.append(chunks)
+
+    def _read_command(self, command, chunks):
+        try:
+            if self.closed:
+                chunks.put('')
+                return
+            LOG.debug("Reading: %s" % command)
+            process = subprocess.Popen(command, shell=True,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE)
+            self.processes.append(process)
+            for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), ''):
+                chunks.put(chunk)
+            utils.raise_if_process_errored(process, base.BackupError)
+            if process.wait():
+                raise base.BackupError(_("%(command)s exited with %(code)d.")
+                                       % {'command': command,
+                                          'code': process.returncode})
+            chunks.put('')
+        except Exception as e:
+            chunks.put(e)
+
+    def read(self, size):
+        while len(self.buffer) < size and self.readers:
+            chunk = self.readers[0].get()
+            if isinstance(chunk, Exception):
+                self.readers.popleft()
+                raise chunk
+            if not chunk:
+                self.readers.popleft()
+                self._start_readers()
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        """Stop the commands still running and wait for their readers."""
+        self.closed = True
+        self.commands.clear()
+        self.buffer = ''
+        for process in self.processes:
+            if process.poll() is None:
+                try:
+                    process.terminate()
+                except OSError:
+                    pass
+        while self.readers:
+            chunk = self.readers[0].get()
+            if not chunk or isinstance(chunk, Exception):
+                self.readers.popleft()
+
+
+class NodetoolSnapshot(base.BackupRunner):
+    """Implementation of Backup Strategy for Cassandra snapshots.
+
+    nodetool snapshot hardlinks the SSTables of every table, which costs
+    next to no I/O and leaves the node serving requests. The snapshot of
+    each keyspace is streamed as a tar archive, several keyspaces being
+    read at the same time, and the archives follow each other in the
+    backup. The snapshot is cleared once it is stored.
+    """
+    __strategy_name__ = 'nodetoolsnapshot'
+
+    def __init__(self, *args, **kwargs):
+        super(NodetoolSnapshot, self).__init__(*args, **kwargs)
+        self.keyspaces = {}
+        self.reader = None
+        self.feeder = None
+
+    @property
+    def cmd(self):
+        # The archives of the keyspaces are fed to the command.
+        return 'cat' + self.zip_cmd + self.encrypt_cmd
+
+    @property
+    def filename(self):
+        return '%s.tar' % self.base_filename
+
+    @property
+    def tag(self):
+        return self.base_filename
+
+    def _run_pre_backup(self):
+        LOG.info(_("Taking snapshot %s of Cassandra.") % self.tag)
+        try:
+            utils.execute_with_timeout('nodetool', 'snapshot', '-t',
+                                       self.tag,
+                                       timeout=system.NODETOOL_TIMEOUT)
+            self.keyspaces = snapshot_tables(system.CASSANDRA_DATA_DIR,
+                                             self.tag)
+        except Exception:
+            self._clear_snapshot()
+            raise
+
+    def _keyspace_command(self, paths):
+        return ('sudo tar -cf - -C %(data_dir)s'
+                ' --transform=s#/snapshots/%(tag)s##'
+                ' %(paths)s' % {'data_dir': system.CASSANDRA_DATA_DIR,
+                                'tag': self.tag,
+                                'paths': ' '.join(paths)})
+
+    def _run(self):
+        self.reader = SnapshotReader(
+            [self.throttle.command(self._keyspace_command(paths))
+             for paths in self.keyspaces.values()],
+            CONF.backup_dump_threads)
+        LOG.debug("BackupRunner running cmd: %s", self.command)
+        self.process = subprocess.Popen(self.throttle.command(self.command),
+                                        shell=True,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE,
+                                        preexec_fn=os.setsid)
+        self.pid = self.process.pid
+        self.feeder = eventlet.spawn(self._feed)
+        self.stream = self._agent_stages(self.process.stdout)
+
+    def _feed(self):
+        """Write the archives of the keyspaces to the command, returning
+        whether all of them were.
+        """
+        try:
+            for chunk in iter(lambda: self.reader.read(CHUNK_SIZE), ''):
+                self.process.stdin.write(chunk)
+            return True
+        except Exception:
+            LOG.exception(_("Error reading snapshot %s.") % self.tag)
+            self.reader.close()
+            return False
+        finally:
+            self.process.stdin.close()
+
+    def check_process(self):
+        return self.feeder.wait()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return super(NodetoolSnapshot, self).__exit__(
+                exc_type, exc_value, traceback)
+        finally:
+            if exc_type is not None and self.process is not None:
+                # Stops the feeder, which may be blocked on the command.
+                try:
+                    os.killpg(self.process.pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            if self.reader is not None:
+                self.reader.close()
+            self._clear_snapshot()
+
+    def _clear_snapshot(self):
+        try:
+            utils.execute_with_timeout('nodetool', 'clearsnapshot', '-t',
+                                       self.tag,
+                                       timeout=system.NODETOOL_TIMEOUT)
+        except exception.ProcessExecutionError:
+            LOG.exception(_("Error clearing snapshot %s.") % self.tag)
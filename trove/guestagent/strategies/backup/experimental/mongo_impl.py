@@ -15,6 +15,8 @@
 #    under the License.
 #
 
+import re
+
 from trove.common import cfg
 from trove.common import exception
 from trove.common.i18n import _
@@ -103,3 +105,41 @@ class MongoDump(base.BackupRunner):
 
         LOG.debug("Estimated size for databases: " + str(dbstats))
         return sum(dbstats.values())
+
+
+class MongoDumpArchive(base.BackupRunner):
+    """Implementation of Backup Strategy for MongoDump, streaming the dump
+    as a single archive.
+
+    Unlike MongoDump, nothing is staged on the data volume: mongodump
+    writes its archive straight into the backup pipe, dumping
+    backup_dump_threads collections in parallel. Needs mongodump 3.2 or
+    later.
+    """
+    __strategy_name__ = 'mongodumparchive'
+
+    @property
+    def cmd(self):
+        cmd = ('sudo mongodump'
+               ' --archive'
+               ' --numParallelCollections=%(threads)d'
+               ' %%(extra_opts)s'
+               ' 2>/tmp/mongodump.log' %
+               {'threads': max(1, CONF.backup_dump_threads)})
+        return cmd + self.zip_cmd + self.encrypt_cmd
+
+    def check_process(self):
+        """Check the output from mongodump for failures."""
+        LOG.debug('Checking mongodump process output.')
+        with open('/tmp/mongodump.log', 'r') as backup_log:
+            output = backup_log.read()
+            LOG.info(output)
+            if re.search('Failed:', output):
+                LOG.error(_("Mongodump did not complete successfully."))
+                return False
+
+        return True
+
+    @property
+    def filename(self):
+        return '%s.archive' % self.base_filename
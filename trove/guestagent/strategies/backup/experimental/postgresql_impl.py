@@ -13,11 +13,28 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import re
+
+from trove.common import cfg
+from trove.common import exception
+from trove.common.i18n import _
+from trove.common import utils
+from trove.guestagent.datastore.experimental.postgresql import pgutil
+from trove.guestagent.datastore.experimental.postgresql.service.config import(
+    PgSqlConfig)
 from trove.guestagent.strategies.backup import base
 from trove.openstack.common import log as logging
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+WAL_ARCHIVE_DIR = CONF.postgresql.wal_archive_location
+WAL_SEGMENT = re.compile('^[0-9A-F]{24}$')
+BACKUP_HISTORY_FILE = re.compile('^[0-9A-F]{24}\.[0-9A-F]{8}\.backup$')
+WAL_FILE = re.compile('\(file ([0-9A-F]{24})\)')
+HISTORY_TIMEOUT = 120
+
 
 class PgDump(base.BackupRunner):
     """Implementation of Backup Strategy for pg_dump."""
@@ -27,3 +44,150 @@ class PgDump(base.BackupRunner):
     def cmd(self):
         cmd = 'sudo -u postgres pg_dumpall '
         return cmd + self.zip_cmd + self.encrypt_cmd
+
+
+def archived_wal_segments(first, last):
+    """Return the names of the archived WAL segments from first to last,
+    in order.
+    """
+    return sorted(name for name in os.listdir(WAL_ARCHIVE_DIR)
+                  if WAL_SEGMENT.match(name) and first <= name <= last)
+
+
+class PgBaseBackup(base.BackupRunner):
+    """Implementation of Backup Strategy for pg_basebackup.
+
+    Streams a tar of the data directory, with the WAL needed to make it
+    consistent, straight from pg_basebackup. The server archives its WAL to
+    the wal_archive_location, which incremental backups are taken from.
+    Tablespaces outside of the data directory are not supported, as
+    pg_basebackup can only stream the data directory alone.
+    """
+    __strategy_name__ = 'pg_basebackup'
+
+    def __init__(self, *args, **kwargs):
+        super(PgBaseBackup, self).__init__(*args, **kwargs)
+        self.history = None
+
+    @property
+    def cmd(self):
+        cmd = ('sudo -u postgres pg_basebackup'
+               ' --pgdata=-'
+               ' --format=tar'
+               ' --xlog'
+               ' --checkpoint=fast'
+               ' --label=%(filename)s'
+               ' %(extra_opts)s'
+               ' 2>/tmp/pgbasebackup.log')
+        return cmd + self.zip_cmd + self.encrypt_cmd
+
+    @property
+    def filename(self):
+        return '%s.tar' % self.base_filename
+
+    def _find_backup_history(self):
+        """Return the name and contents of the history file PostgreSQL
+        archived for this backup, or None if it is not archived yet.
+        """
+        names = sorted((name for name in os.listdir(WAL_ARCHIVE_DIR)
+                        if BACKUP_HISTORY_FILE.match(name)), reverse=True)
+        for name in names:
+            # Archived files are only readable by postgres.
+            contents, err = utils.execute_with_timeout(
+                'sudo', 'cat', os.path.join(WAL_ARCHIVE_DIR, name),
+                timeout=30)
+            history = dict(line.split(': ', 1)
+                           for line in contents.splitlines() if ': ' in line)
+            if history.get('LABEL') == self.base_filename:
+                return name, history
+        return None
+
+    def backup_history(self):
+        """Wait for the backup history file to be archived, which happens
+        once the WAL of the backup is, and return its name and contents.
+        """
+        if self.history is None:
+            try:
+                self.history = utils.poll_until(self._find_backup_history,
+                                                sleep_time=2,
+                                                time_out=HISTORY_TIMEOUT)
+            except exception.PollTimeOut:
+                raise base.BackupError(_("The WAL of backup %s was not "
+                                         "archived.") % self.base_filename)
+        return self.history
+
+    def metadata(self):
+        name, history = self.backup_history()
+        meta = {
+            'label': history['LABEL'],
+            'start_wal_file': WAL_FILE.search(
+                history['START WAL LOCATION']).group(1),
+            'stop_wal_file': WAL_FILE.search(
+                history['STOP WAL LOCATION']).group(1),
+        }
+        LOG.info(_("Metadata for backup: %s.") % str(meta))
+        return meta
+
+    def _run_post_backup(self):
+        """Remove the archived WAL older than the backup, which incremental
+        backups based on it do not need.
+        """
+        name, history = self.backup_history()
+        pgutil.execute(
+            '/usr/lib/postgresql/%s/bin/pg_archivecleanup' %
+            PgSqlConfig()._get_psql_version(),
+            WAL_ARCHIVE_DIR, name, timeout=120)
+
+
+class PgBaseBackupIncremental(PgBaseBackup):
+    """Incremental backup made of the WAL archived since the parent backup.
+
+    Restored on top of the chain of its parents, the WAL is replayed up to
+    the point of this backup.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if not kwargs.get('stop_wal_file'):
+            raise AttributeError('stop_wal_file attribute missing, '
+                                 'bad parent?')
+        super(PgBaseBackupIncremental, self).__init__(*args, **kwargs)
+        self.parent_location = kwargs.get('parent_location')
+        self.parent_checksum = kwargs.get('parent_checksum')
+        self.parent_stop_wal_file = kwargs.get('stop_wal_file')
+
+    @property
+    def cmd(self):
+        # The WAL segments to archive are only known once the backup has
+        # started, _run_pre_backup sets the command.
+        return ''
+
+    def _run_pre_backup(self):
+        """Mark the backup in the WAL and switch to a new segment, then
+        stream the segments since the parent backup.
+        """
+        pgutil.psql("SELECT pg_start_backup('%s', true);" %
+                    self.base_filename, timeout=120)
+        # Waits for the WAL up to here to be archived.
+        pgutil.psql("SELECT pg_stop_backup();", timeout=120)
+        stop_wal_file = self.metadata()['stop_wal_file']
+        segments = archived_wal_segments(self.parent_stop_wal_file,
+                                         stop_wal_file)
+        if not segments or segments[0] != self.parent_stop_wal_file:
+            raise base.BackupError(_("The WAL since the parent backup is no "
+                                     "longer archived, a full backup is "
+                                     "needed."))
+        self.command = ('sudo tar -cf - -C %s %s' %
+                        (WAL_ARCHIVE_DIR, ' '.join(segments)) +
+                        self.zip_cmd + self.encrypt_cmd)
+
+    def metadata(self):
+        _meta = super(PgBaseBackupIncremental, self).metadata()
+        _meta.update({
+            'parent_location': self.parent_location,
+            'parent_checksum': self.parent_checksum,
+        })
+        return _meta
+
+    def _run_post_backup(self):
+        # The archive is only cleaned up by full backups.
+        pass
@@ -0,0 +1,78 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import eventlet
+
+from trove.common import exception
+from trove.common.i18n import _
+from trove.common import utils
+from trove.guestagent.datastore.experimental.redis.client import RedisError
+from trove.guestagent.datastore.experimental.redis import service
+from trove.guestagent.strategies.backup import base
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+SAVE_TIMEOUT = 1200
+
+
+class RedisBackup(base.BackupRunner):
+    """Implementation of Backup Strategy for Redis.
+
+    Redis forks to write a snapshot of the dataset to its RDB file with
+    BGSAVE, and keeps serving clients meanwhile. Once LASTSAVE shows the
+    snapshot is done, the RDB file is streamed to storage.
+    """
+    __strategy_name__ = 'redisbackup'
+
+    def __init__(self, *args, **kwargs):
+        self.rdb_path = service.get_rdb_path(service._load_redis_options())
+        super(RedisBackup, self).__init__(*args, **kwargs)
+
+    @property
+    def cmd(self):
+        cmd = 'sudo cat %s' % self.rdb_path
+        return cmd + self.zip_cmd + self.encrypt_cmd
+
+    @property
+    def filename(self):
+        return '%s.rdb' % self.base_filename
+
+    def _run_pre_backup(self):
+        with service.get_redis_client() as client:
+            last_save = client.execute('LASTSAVE')
+            # LASTSAVE counts seconds, a snapshot ending within the second
+            # of the previous one would not be told apart from it.
+            if last_save >= int(time.time()):
+                eventlet.sleep(1)
+            try:
+                client.execute('BGSAVE')
+            except RedisError as e:
+                # Waiting for a snapshot already being written is as good.
+                if 'in progress' not in str(e):
+                    raise base.BackupError(
+                        _("Redis could not start a snapshot: %s") % e)
+            LOG.debug("Waiting for Redis to write the snapshot.")
+            try:
+                utils.poll_until(lambda: client.execute('LASTSAVE'),
+                                 lambda save: save > last_save,
+                                 sleep_time=1, time_out=SAVE_TIMEOUT)
+            except exception.PollTimeOut:
+                raise base.BackupError(_("Redis did not write the snapshot "
+                                         "in time."))
+            status = client.info('persistence').get('rdb_last_bgsave_status')
+            if status != 'ok':
+                raise base.BackupError(_("Redis failed to write the "
+                                         "snapshot."))
@@ -16,16 +16,32 @@
 #
 
 import re
+import time
 
+from trove.common import cfg
+from trove.common.i18n import _
 from trove.guestagent.datastore.mysql.service import ADMIN_USER_NAME
 from trove.guestagent.datastore.mysql.service import get_auth_password
+from trove.guestagent.datastore.mysql.service import get_engine
+from trove.guestagent.datastore.mysql.service import LocalSqlClient
 from trove.guestagent.strategies.backup import base
 from trove.openstack.common import log as logging
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
-class MySQLDump(base.BackupRunner):
+class MySQLBackupMixin(object):
+    """Common utils for backing up MySQL databases."""
+
+    def probe_latency(self):
+        start = time.time()
+        with LocalSqlClient(get_engine(), use_flush=False) as client:
+            client.execute('SELECT 1')
+        return time.time() - start
+
+
+class MySQLDump(MySQLBackupMixin, base.BackupRunner):
     """Implementation of Backup Strategy for MySQLDump."""
     __strategy_name__ = 'mysqldump'
 
@@ -43,7 +59,46 @@ class MySQLDump(base.BackupRunner):
         return cmd + self.zip_cmd + self.encrypt_cmd
 
 
-class InnoBackupEx(base.BackupRunner):
+class MyDumper(MySQLBackupMixin, base.BackupRunner):
+    """Implementation of Backup Strategy for MyDumper.
+
+    Dumps the tables with backup_dump_threads threads in parallel, all from
+    the same consistent snapshot, into a stream of the dump files.
+    """
+    __strategy_name__ = 'mydumper'
+
+    @property
+    def cmd(self):
+        cmd = ('sudo mydumper'
+               ' --stream'
+               ' --threads=%(threads)d'
+               ' --outputdir=/tmp/mydumper'
+               ' %%(extra_opts)s'
+               ' --password=%(password)s -u %(user)s'
+               ' 2>/tmp/mydumper.log' %
+               {'threads': max(1, CONF.backup_dump_threads),
+                'password': get_auth_password(),
+                'user': ADMIN_USER_NAME})
+        return cmd + self.zip_cmd + self.encrypt_cmd
+
+    def check_process(self):
+        """Check the output from mydumper for errors."""
+        LOG.debug('Checking mydumper process output.')
+        with open('/tmp/mydumper.log', 'r') as backup_log:
+            output = backup_log.read()
+            LOG.info(output)
+            if re.search('CRITICAL|ERROR', output):
+                LOG.error(_("Mydumper did not complete successfully."))
+                return False
+
+        return True
+
+    @property
+    def filename(self):
+        return '%s.mydumper' % self.base_filename
+
+
+class InnoBackupEx(MySQLBackupMixin, base.BackupRunner):
     """Implementation of Backup Strategy for InnoBackupEx."""
     __strategy_name__ = 'innobackupex'
 
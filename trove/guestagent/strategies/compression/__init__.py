@@ -0,0 +1,44 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import inspect
+
+from trove.common import cfg
+from trove.guestagent.strategies.compression.base import Compression
+from trove.guestagent.strategy import Strategy
+from trove.openstack.common import importutils
+from trove.openstack.common import log as logging
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+def get_compression_strategy(compression_driver,
+                             ns=CONF.backup_compression_namespace):
+    LOG.debug("Getting compression strategy: %s." % compression_driver)
+    return Strategy.get_strategy(compression_driver, ns)
+
+
+def detect_compression_strategy(filename,
+                                ns=CONF.backup_compression_namespace):
+    """Return the compression strategy a backup was compressed with, as
+    told by the extension of its filename, or None.
+    """
+    module = importutils.import_module(ns)
+    for name, strategy in inspect.getmembers(module, inspect.isclass):
+        if (issubclass(strategy, Compression) and
+                strategy.manifest_extension and
+                filename.endswith(strategy.manifest_extension)):
+            return strategy
+    return None
@@ -0,0 +1,52 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+
+from trove.guestagent.strategy import Strategy
+
+
+class Compression(Strategy):
+    """Base class for Compression Strategy implementations."""
+    __strategy_type__ = 'compression'
+    __strategy_ns__ = 'trove.guestagent.strategies.compression'
+
+    # Suffix added to the names of the backups compressed this way.
+    manifest_extension = None
+
+    def __init__(self, level=None):
+        self.level = level
+        super(Compression, self).__init__()
+
+    @property
+    def zip_cmd(self):
+        """Shell command compressing its input, or None if the codec can
+        only run in the agent.
+        """
+        return None
+
+    @property
+    def unzip_cmd(self):
+        """Shell command decompressing its input, or None if the codec can
+        only run in the agent.
+        """
+        return None
+
+    @abc.abstractmethod
+    def compress(self, stream, workers):
+        """Return a file-like reader of the compressed stream."""
+
+    @abc.abstractmethod
+    def decompress(self, chunks):
+        """Return an iterable of the decompressed chunks."""
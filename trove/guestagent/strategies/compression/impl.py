@@ -0,0 +1,87 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from eventlet import tpool
+
+from trove.guestagent.common import compression
+from trove.guestagent.common import stream
+from trove.guestagent.strategies.compression import base
+from trove.openstack.common import importutils
+
+lz4_frame = importutils.try_import('lz4.frame')
+
+
+class Gzip(base.Compression):
+    """Gzip, compatible with the gzip command either way."""
+    __strategy_name__ = 'gzip'
+    manifest_extension = '.gz'
+
+    @property
+    def zip_cmd(self):
+        if self.level is None:
+            return 'gzip'
+        return 'gzip -%d' % self.level
+
+    @property
+    def unzip_cmd(self):
+        return 'gzip -d -c'
+
+    def compress(self, source, workers):
+        level = (compression.COMPRESSION_LEVEL if self.level is None
+                 else self.level)
+        return compression.GzipCompressor(source, workers, level=level)
+
+    def decompress(self, chunks):
+        return compression.gunzip(chunks)
+
+
+class Lz4Compressor(stream.BlockTransformer):
+    """File-like reader that compresses another one into LZ4 frames."""
+
+    def __init__(self, source, workers, level=0,
+                 block_size=stream.BLOCK_SIZE):
+        self.level = level
+        super(Lz4Compressor, self).__init__(source, workers,
+                                            block_size=block_size)
+
+    def transform_block(self, block, index):
+        return lz4_frame.compress(block, compression_level=self.level)
+
+
+class Lz4(base.Compression):
+    """LZ4 frames, several times faster than gzip at a lower ratio.
+
+    Needs the lz4 python package on the guest, and only runs in the agent.
+    """
+    __strategy_name__ = 'lz4'
+    manifest_extension = '.lz4'
+
+    def is_enabled(self):
+        return lz4_frame is not None
+
+    def compress(self, source, workers):
+        return Lz4Compressor(source, workers, self.level or 0)
+
+    def decompress(self, chunks):
+        # Each block was compressed into a frame of its own.
+        decompressor = lz4_frame.LZ4FrameDecompressor()
+        for chunk in chunks:
+            while chunk:
+                data = tpool.execute(decompressor.decompress, chunk)
+                if data:
+                    yield data
+                chunk = None
+                if decompressor.eof:
+                    chunk = decompressor.unused_data
+                    decompressor = lz4_frame.LZ4FrameDecompressor()
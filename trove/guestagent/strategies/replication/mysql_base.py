@@ -17,6 +17,7 @@
 import abc
 import uuid
 
+import eventlet
 from oslo_utils import netutils
 
 from trove.common import cfg
@@ -26,6 +27,8 @@ from trove.guestagent.datastore.mysql.service import MySqlAdmin
 from trove.guestagent.db import models
 from trove.guestagent.strategies import backup
 from trove.guestagent.strategies.replication import base
+from trove.guestagent.strategies.storage.experimental import stream_impl
+from trove.guestagent.strategies.storage import get_storage_strategy
 from trove.openstack.common.gettextutils import _
 from trove.openstack.common import log as logging
 
@@ -40,6 +43,9 @@ REPL_BACKUP_RUNNER = backup.get_backup_strategy(
 REPL_BACKUP_INCREMENTAL_RUNNER = backup.get_backup_strategy(
     REPL_BACKUP_INCREMENTAL_STRATEGY, REPL_BACKUP_NAMESPACE)
 REPL_EXTRA_OPTS = CONF.backup_runner_options.get(REPL_BACKUP_STRATEGY, '')
+# The threads and servers of the snapshots waiting for their replica, by
+# snapshot id.
+SNAPSHOT_STREAMS = {}
 
 LOG = logging.getLogger(__name__)
 
@@ -89,10 +95,17 @@ class MysqlReplicationBase(base.Replication):
         LOG.debug("Acquiring backup for replica number %d." % replica_number)
         # Only create a backup if it's the first replica
         if replica_number == 1:
-            AGENT.execute_backup(
-                context, snapshot_info, runner=REPL_BACKUP_RUNNER,
-                extra_opts=REPL_EXTRA_OPTS,
-                incremental_runner=REPL_BACKUP_INCREMENTAL_RUNNER)
+            stream = None
+            if snapshot_info.get('direct_stream'):
+                stream = self._serve_snapshot(context, snapshot_info)
+            if stream:
+                # Handed to the replica along with the snapshot.
+                snapshot_info['stream'] = stream
+            else:
+                AGENT.execute_backup(
+                    context, snapshot_info, runner=REPL_BACKUP_RUNNER,
+                    extra_opts=REPL_EXTRA_OPTS,
+                    incremental_runner=REPL_BACKUP_INCREMENTAL_RUNNER)
         else:
             LOG.debug("Using existing backup created for previous replica.")
         LOG.debug("Replication snapshot %s used for replica number %d."
@@ -108,6 +121,77 @@ class MysqlReplicationBase(base.Replication):
         }
         return snapshot_id, log_position
 
+    def _serve_snapshot(self, context, snapshot_info):
+        """Serve the snapshot to the replica, returning the address the
+        replica streams it from, or None if it cannot be served.
+
+        The snapshot is taken once the replica connects. If it does not
+        within replication_stream_timeout, the snapshot is stored like any
+        other instead, at the fallback location the replica waits on.
+        """
+        try:
+            storage = get_storage_strategy(
+                CONF.storage_strategy, CONF.storage_namespace)(context)
+            fallback = storage.location(AGENT.get_manifest(
+                snapshot_info['id'], storage, REPL_BACKUP_RUNNER,
+                REPL_EXTRA_OPTS))
+            server = stream_impl.StreamServer(
+                netutils.get_my_ipv4(), CONF.replication_stream_port)
+        except Exception:
+            LOG.exception(_("Unable to stream the replication snapshot, "
+                            "storing it instead."))
+            return None
+        SNAPSHOT_STREAMS[snapshot_info['id']] = (eventlet.spawn(
+            self._stream_snapshot, context, server, snapshot_info), server)
+        stream = server.address
+        stream.update({
+            'type': REPL_BACKUP_RUNNER.__name__,
+            'fallback': fallback,
+        })
+        return stream
+
+    def _stream_snapshot(self, context, server, snapshot_info):
+        snapshot_id = snapshot_info['id']
+        try:
+            connection = server.accept(CONF.replication_stream_timeout)
+        finally:
+            SNAPSHOT_STREAMS.pop(snapshot_id, None)
+            server.close()
+        if connection is None:
+            LOG.warning(_("The replica did not connect to stream snapshot "
+                          "%s, storing it instead.") % snapshot_id)
+            try:
+                AGENT.execute_backup(
+                    context, snapshot_info, runner=REPL_BACKUP_RUNNER,
+                    extra_opts=REPL_EXTRA_OPTS,
+                    incremental_runner=REPL_BACKUP_INCREMENTAL_RUNNER)
+            except Exception:
+                LOG.exception(_("Error storing snapshot %s.") % snapshot_id)
+            return
+        storage = stream_impl.StreamStorage(context, connection)
+        try:
+            AGENT.stream_backup_to_storage(snapshot_info, REPL_BACKUP_RUNNER,
+                                           storage,
+                                           extra_opts=REPL_EXTRA_OPTS)
+            storage.finish()
+        except Exception:
+            LOG.exception(_("Error streaming snapshot %s.") % snapshot_id)
+            storage.close()
+
+    def cancel_snapshot(self, snapshot_id):
+        """Stop waiting to stream snapshot snapshot_id to its replica,
+        which failed to build, without storing the snapshot instead.
+        """
+        stream = SNAPSHOT_STREAMS.pop(snapshot_id, None)
+        if stream is None:
+            LOG.debug("Snapshot %s is not waiting for its replica."
+                      % snapshot_id)
+            return
+        thread, server = stream
+        thread.kill()
+        server.close()
+        LOG.info(_("Cancelled streaming snapshot %s.") % snapshot_id)
+
     def enable_as_master(self, service, master_config):
         if not service.exists_replication_source_overrides():
             service.write_replication_source_overrides(master_config)
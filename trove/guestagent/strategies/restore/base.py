@@ -13,10 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 #
+import os
+import signal
+
 from eventlet.green import subprocess
 
 from trove.common import cfg
+from trove.common import chunk_index
 from trove.common import utils
+from trove.guestagent.common import encryption
+from trove.guestagent.strategies import compression
 from trove.guestagent.strategy import Strategy
 from trove.openstack.common import log as logging
 
@@ -26,6 +32,7 @@ CHUNK_SIZE = CONF.backup_chunk_size
 BACKUP_USE_GZIP = CONF.backup_use_gzip_compression
 BACKUP_USE_OPENSSL = CONF.backup_use_openssl_encryption
 BACKUP_DECRYPT_KEY = CONF.backup_aes_cbc_key
+BACKUP_COMPRESSION_WORKERS = CONF.backup_compression_workers
 
 
 class RestoreError(Exception):
@@ -49,6 +56,7 @@ class RestoreRunner(Strategy):
     is_zipped = BACKUP_USE_GZIP
     is_encrypted = BACKUP_USE_OPENSSL
     decrypt_key = BACKUP_DECRYPT_KEY
+    compression_workers = BACKUP_COMPRESSION_WORKERS
 
     def __init__(self, storage, **kwargs):
         self.storage = storage
@@ -78,29 +86,110 @@ class RestoreRunner(Strategy):
     def _run_restore(self):
         return self._unpack(self.location, self.checksum, self.restore_cmd)
 
-    def _unpack(self, location, checksum, command):
+    def _load(self, location, checksum):
+        """Return the stream of the backup at location, decrypted and
+        decompressed as far as the restore command does not do it.
+        """
         stream = self.storage.load(location, checksum)
+        if self._is_encrypted_in_agent(location):
+            stream = encryption.decrypt(stream, self.decrypt_key)
+        if self._unzip_in_agent(location):
+            stream = self._compressor(location).decompress(stream)
+        return stream
+
+    def _unpack(self, location, checksum, command):
+        stream = self._load(location, checksum)
         process = subprocess.Popen(command, shell=True,
                                    stdin=subprocess.PIPE,
-                                   stderr=subprocess.PIPE)
+                                   stderr=subprocess.PIPE,
+                                   preexec_fn=os.setsid)
         content_length = 0
-        for chunk in stream:
-            process.stdin.write(chunk)
-            content_length += len(chunk)
-        process.stdin.close()
+        try:
+            for chunk in stream:
+                process.stdin.write(chunk)
+                content_length += len(chunk)
+            process.stdin.close()
+        except BaseException:
+            # Including a GreenletExit when the unpack is cancelled, which
+            # must not leave the command behind.
+            self._kill(process)
+            raise
         utils.raise_if_process_errored(process, RestoreError)
         LOG.debug("Restored %s bytes from stream." % content_length)
 
         return content_length
 
-    @property
-    def decrypt_cmd(self):
-        if self.is_encrypted:
+    def _kill(self, process):
+        """Stop a restore command with all its children and reap it."""
+        try:
+            process.stdin.close()
+        except IOError:
+            pass
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            # Already stopped
+            pass
+        process.wait()
+
+    def _is_encrypted_in_agent(self, location):
+        """Whether the backup at location was encrypted by the agent, which
+        its name tells regardless of the current configuration.
+        """
+        return location.endswith(encryption.MANIFEST_EXTENSION)
+
+    def _is_decoded_by_storage(self, location):
+        """Whether the storage decrypts and decompresses the backup at
+        location itself, which its name tells.
+        """
+        return location.endswith(chunk_index.EXTENSION)
+
+    def _decrypt_cmd(self, location):
+        if (self.is_encrypted and not self._is_encrypted_in_agent(location)
+                and not self._is_decoded_by_storage(location)):
             return ('openssl enc -d -aes-256-cbc -salt -pass pass:%s | '
                     % self.decrypt_key)
         else:
             return ''
 
+    def _compressor(self, location):
+        """Return the compression strategy of the backup at location, which
+        its name tells, or None if it is not compressed.
+        """
+        if self._is_decoded_by_storage(location):
+            return None
+        name = location
+        for extension in (encryption.MANIFEST_EXTENSION, '.enc'):
+            if name.endswith(extension):
+                name = name[:-len(extension)]
+        strategy = compression.detect_compression_strategy(name)
+        if strategy is None:
+            if not self.is_zipped:
+                return None
+            # Backups without a known extension were gzipped.
+            strategy = compression.get_compression_strategy('Gzip')
+        return strategy()
+
+    def _unzip_in_agent(self, location):
+        """Whether the agent decompresses the backup stream itself, which it
+        can unless openssl has to decrypt the stream first, and has to for
+        the codecs without a command.
+        """
+        compressor = self._compressor(location)
+        if compressor is None or self._decrypt_cmd(location):
+            return False
+        return self.compression_workers > 0 or compressor.unzip_cmd is None
+
+    def _unzip_cmd(self, location):
+        compressor = self._compressor(location)
+        if compressor is not None and not self._unzip_in_agent(location):
+            return compressor.unzip_cmd + ' | '
+        return ''
+
+    @property
+    def decrypt_cmd(self):
+        return self._decrypt_cmd(self.location)
+
     @property
     def unzip_cmd(self):
-        return 'gzip -d -c | ' if self.is_zipped else ''
+        return self._unzip_cmd(self.location)
@@ -0,0 +1,67 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from trove.common.i18n import _
+from trove.guestagent.common import operating_system
+from trove.guestagent.datastore.experimental.cassandra import service
+from trove.guestagent.datastore.experimental.cassandra import system
+from trove.guestagent.strategies.backup.experimental.cassandra_impl import (
+    NODE_TABLES)
+from trove.guestagent.strategies.restore import base
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class NodetoolSnapshot(base.RestoreRunner):
+    """Implementation of Restore Strategy for Cassandra snapshots.
+
+    The SSTables are extracted in place of the tables of the node while
+    Cassandra is stopped. The tables that hold the identity of the node
+    are kept, the schema is restored along with the data. The commit log
+    is dropped, as replaying it would write the old data back.
+    """
+    __strategy_name__ = 'nodetoolsnapshot'
+    # The backup is made of one tar archive per keyspace.
+    base_restore_cmd = 'sudo tar -xif - -C %s' % system.CASSANDRA_DATA_DIR
+
+    def __init__(self, *args, **kwargs):
+        self.app = service.CassandraApp(service.CassandraAppStatus())
+        super(NodetoolSnapshot, self).__init__(*args, **kwargs)
+
+    def pre_restore(self):
+        self.app.stop_db()
+        LOG.info(_("Removing the tables of Cassandra before the restore."))
+        data_dir = system.CASSANDRA_DATA_DIR
+        for keyspace in os.listdir(data_dir):
+            if keyspace != 'system':
+                operating_system.remove(os.path.join(data_dir, keyspace),
+                                        force=True, as_root=True)
+                continue
+            for table in os.listdir(os.path.join(data_dir, keyspace)):
+                if table.split('-')[0] not in NODE_TABLES:
+                    operating_system.remove(
+                        os.path.join(data_dir, keyspace, table),
+                        force=True, as_root=True)
+        # Cassandra creates them again when it starts.
+        for path in (system.CASSANDRA_COMMITLOG_DIR,
+                     system.CASSANDRA_SAVED_CACHES_DIR):
+            operating_system.remove(path, force=True, as_root=True)
+
+    def post_restore(self):
+        operating_system.chown(system.CASSANDRA_DATA_DIR, 'cassandra',
+                               'cassandra', as_root=True)
+        self.app.start_db()
@@ -49,3 +49,20 @@ class MongoDump(base.RestoreRunner):
                                    timeout=LARGE_TIMEOUT)
 
         operating_system.remove(MONGO_DUMP_DIR, force=True, as_root=True)
+
+
+class MongoDumpArchive(base.RestoreRunner):
+    """Restore a MongoDumpArchive backup by streaming its archive straight
+    into mongorestore, which restores backup_dump_threads collections in
+    parallel.
+    """
+    __strategy_name__ = 'mongodumparchive'
+
+    @property
+    def base_restore_cmd(self):
+        # mongorestore only writes failures to stderr when quiet, which
+        # fail the restore.
+        return ('sudo mongorestore'
+                ' --archive'
+                ' --numParallelCollections=%d'
+                ' --quiet' % max(1, CONF.backup_dump_threads))
@@ -13,16 +13,29 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import re
+import stat
 
 from eventlet.green import subprocess
 
+from trove.common import cfg
 from trove.common import exception
+from trove.common.i18n import _
+from trove.guestagent.common import operating_system
+from trove.guestagent.common.operating_system import FileMode
+from trove.guestagent.datastore.experimental.postgresql.service.config import(
+    PGSQL_DATA_DIR)
+from trove.guestagent.datastore.experimental.postgresql.service.config import(
+    PgSqlConfig)
 from trove.guestagent.strategies.restore import base
 from trove.openstack.common import log as logging
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+WAL_ARCHIVE_DIR = CONF.postgresql.wal_archive_location
+
 
 class PgDump(base.RestoreRunner):
     """Implementation of Restore Strategy for pg_dump."""
@@ -50,7 +63,7 @@ class PgDump(base.RestoreRunner):
         # Message 'ERROR:  role "postgres" already exists'
         # is expected and does not pose any problems to the restore operation.
 
-        stream = self.storage.load(self.location, self.checksum)
+        stream = self._load(self.location, self.checksum)
         process = subprocess.Popen(self.restore_cmd, shell=True,
                                    stdin=subprocess.PIPE,
                                    stderr=subprocess.PIPE)
@@ -80,3 +93,100 @@ class PgDump(base.RestoreRunner):
                         raise exception(message)
         except OSError:
             pass
+
+
+class PgBaseBackup(base.RestoreRunner):
+    """Implementation of Restore Strategy for pg_basebackup.
+
+    The backup is extracted into an empty data directory, and PostgreSQL
+    replays the WAL in it when it starts.
+    """
+    __strategy_name__ = 'pg_basebackup'
+
+    def __init__(self, *args, **kwargs):
+        self.app = PgSqlConfig()
+        self.data_dir = PGSQL_DATA_DIR.format(
+            version=self.app._get_psql_version())
+        super(PgBaseBackup, self).__init__(*args, **kwargs)
+
+    @property
+    def base_restore_cmd(self):
+        return 'sudo -u postgres tar -xf - -C %s' % self.data_dir
+
+    def _recreate_directory(self, path):
+        operating_system.remove(path, force=True, as_root=True)
+        operating_system.create_directory(path, user='postgres',
+                                          group='postgres', as_root=True)
+
+    def pre_restore(self):
+        self.app.stop_db(None)
+        LOG.info(_("Cleaning out the data directory %(data_dir)s and the "
+                   "WAL archive %(archive)s.") %
+                 {'data_dir': self.data_dir, 'archive': WAL_ARCHIVE_DIR})
+        self._recreate_directory(self.data_dir)
+        self._recreate_directory(WAL_ARCHIVE_DIR)
+
+    def _write_recovery_conf(self):
+        """Have PostgreSQL fetch the WAL it does not find in the data
+        directory from the archive, where the incremental backups are
+        restored.
+        """
+        with open('/tmp/recovery.conf', 'w+') as recovery_file:
+            recovery_file.write("restore_command = 'cp %s/%%f \"%%p\"'\n" %
+                                WAL_ARCHIVE_DIR)
+        operating_system.chown('/tmp/recovery.conf', 'postgres', None,
+                               recursive=False, as_root=True)
+        operating_system.move('/tmp/recovery.conf',
+                              os.path.join(self.data_dir, 'recovery.conf'),
+                              timeout=30, as_root=True)
+
+    def post_restore(self):
+        # PostgreSQL refuses to start on a data directory others can read.
+        operating_system.chmod(self.data_dir, FileMode(reset=[stat.S_IRWXU]),
+                               recursive=False, as_root=True)
+        self._write_recovery_conf()
+        self.app.start_db(None)
+
+
+class PgBaseBackupIncremental(PgBaseBackup):
+    """Restore the chain of backups of an incremental one: the full backup
+    into the data directory, and the WAL of each incremental into the
+    archive, all of which PostgreSQL replays when it starts.
+    """
+    __strategy_name__ = 'pg_basebackupincremental'
+
+    def _backup_chain(self, location, checksum):
+        """Walk the metadata of the backups up to the full one and return
+        the chain as (location, checksum) pairs, from the full backup to
+        the one being restored.
+        """
+        chain = []
+        while True:
+            chain.append((location, checksum))
+            metadata = self.storage.load_metadata(location, checksum)
+            if 'parent_location' not in metadata:
+                break
+            location = metadata['parent_location']
+            checksum = metadata['parent_checksum']
+        chain.reverse()
+        return chain
+
+    def _chain_restore_cmd(self, location, restore_dir):
+        # The backups of a chain may not all be encrypted the same way.
+        return (self._decrypt_cmd(location) + self._unzip_cmd(location) +
+                'sudo -u postgres tar -xf - -C %s' % restore_dir)
+
+    def _run_restore(self):
+        chain = self._backup_chain(self.location, self.checksum)
+        location, checksum = chain[0]
+        content_length = self._unpack(
+            location, checksum, self._chain_restore_cmd(location,
+                                                        self.data_dir))
+        for location, checksum in chain[1:]:
+            LOG.info(_("Restoring incremental: %(location)s"
+                       " checksum: %(checksum)s.") %
+                     {'location': location, 'checksum': checksum})
+            content_length += self._unpack(
+                location, checksum, self._chain_restore_cmd(
+                    location, WAL_ARCHIVE_DIR))
+        return content_length
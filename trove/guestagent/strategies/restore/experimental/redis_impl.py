@@ -0,0 +1,102 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+from trove.common import exception
+from trove.common.i18n import _
+from trove.common import utils
+from trove.guestagent.common import operating_system
+from trove.guestagent.datastore.experimental.redis import service
+from trove.guestagent.datastore.experimental.redis import system
+from trove.guestagent.strategies.restore import base
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+REWRITE_TIMEOUT = 1200
+
+
+class RedisBackup(base.RestoreRunner):
+    """Implementation of Restore Strategy for Redis.
+
+    The RDB file is put in place while Redis is stopped, and loaded when
+    it starts again. Redis loads its append only file rather than the RDB
+    file when it has one, so with appendonly set Redis is first started
+    without it and made to rewrite the append only file from the restored
+    data.
+    """
+    __strategy_name__ = 'redisbackup'
+
+    def __init__(self, *args, **kwargs):
+        self.app = service.RedisApp(service.RedisAppStatus.get())
+        self.options = service._load_redis_options()
+        self.rdb_path = service.get_rdb_path(self.options)
+        self.aof_path = os.path.join(
+            os.path.dirname(self.rdb_path),
+            self.options.get('appendfilename', 'appendonly.aof'))
+        self.append_only = self.options.get('appendonly') == 'yes'
+        super(RedisBackup, self).__init__(*args, **kwargs)
+
+    @property
+    def base_restore_cmd(self):
+        return 'sudo tee %s >/dev/null' % self.rdb_path
+
+    def pre_restore(self):
+        self.app.stop_db()
+        for path in (self.rdb_path, self.aof_path):
+            utils.execute_with_timeout('rm', '-f', path, run_as_root=True,
+                                       root_helper='sudo')
+
+    def post_restore(self):
+        operating_system.chown(self.rdb_path, 'redis', 'redis',
+                               as_root=True)
+        if not self.append_only:
+            self.app.start_redis()
+            return
+
+        with open(system.REDIS_CONFIG, 'r') as fd:
+            config_contents = fd.read()
+        self.app.write_config(config_contents.replace('appendonly yes',
+                                                      'appendonly no'))
+        try:
+            self.app.start_redis()
+            self._rewrite_append_only_file()
+            self.app.stop_db()
+        finally:
+            self.app.write_config(config_contents)
+        self.app.start_redis()
+
+    def _rewrite_append_only_file(self):
+        LOG.info(_("Rewriting the append only file from the restored "
+                   "data."))
+        with service.get_redis_client() as client:
+            def _done(info):
+                return (info.get('loading') == '0' and
+                        info.get('aof_rewrite_scheduled', '0') == '0' and
+                        info.get('aof_rewrite_in_progress') == '0')
+
+            try:
+                utils.poll_until(lambda: client.info('persistence'),
+                                 _done, sleep_time=1,
+                                 time_out=REWRITE_TIMEOUT)
+                client.execute('BGREWRITEAOF')
+                info = utils.poll_until(lambda: client.info('persistence'),
+                                        _done, sleep_time=1,
+                                        time_out=REWRITE_TIMEOUT)
+            except exception.PollTimeOut:
+                raise base.RestoreError(_("Redis did not rewrite the append "
+                                          "only file in time."))
+        if info.get('aof_last_bgrewrite_status') != 'ok':
+            raise base.RestoreError(_("Redis failed to rewrite the append "
+                                      "only file."))
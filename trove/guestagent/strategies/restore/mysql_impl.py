@@ -19,8 +19,10 @@ import os
 import re
 import tempfile
 
+import eventlet
 import pexpect
 
+from trove.common import cfg
 from trove.common import exception
 from trove.common.i18n import _
 from trove.common import utils
@@ -30,6 +32,7 @@ import trove.guestagent.datastore.mysql.service as dbaas
 from trove.guestagent.strategies.restore import base
 from trove.openstack.common import log as logging
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -188,6 +191,26 @@ class MySQLDump(base.RestoreRunner, MySQLRestoreMixin):
     base_restore_cmd = 'sudo mysql'
 
 
+class MyDumper(base.RestoreRunner, MySQLRestoreMixin):
+    """Implementation of Restore Strategy for MyDumper.
+
+    Loads the tables with backup_dump_threads threads in parallel, and
+    builds the secondary indexes of InnoDB tables once their rows are
+    loaded rather than row by row.
+    """
+    __strategy_name__ = 'mydumper'
+
+    @property
+    def base_restore_cmd(self):
+        # Only errors are written to stderr, which fail the restore.
+        return ('sudo myloader'
+                ' --stream'
+                ' --threads=%d'
+                ' --overwrite-tables'
+                ' --innodb-optimize-keys'
+                ' --verbose=1' % max(1, CONF.backup_dump_threads))
+
+
 class InnoBackupEx(base.RestoreRunner, MySQLRestoreMixin):
     """Implementation of Restore Strategy for InnoBackupEx."""
     __strategy_name__ = 'innobackupex'
@@ -246,11 +269,13 @@ class InnoBackupExIncremental(InnoBackupEx):
         self.restore_location = kwargs.get('restore_location')
         self.content_length = 0
 
-    def _incremental_restore_cmd(self, incremental_dir):
+    def _incremental_restore_cmd(self, incremental_dir, location=None):
         """Return a command for a restore with a incremental location."""
+        # The backups of a chain may not all be encrypted the same way.
+        location = location or self.location
         args = {'restore_location': incremental_dir}
-        return (self.decrypt_cmd +
-                self.unzip_cmd +
+        return (self._decrypt_cmd(location) +
+                self._unzip_cmd(location) +
                 (self.base_restore_cmd % args))
 
     def _incremental_prepare_cmd(self, incremental_dir):
@@ -272,42 +297,82 @@ class InnoBackupExIncremental(InnoBackupEx):
         utils.execute(prepare_cmd, shell=True)
         LOG.info(_("Innobackupex prepare finished successfully."))
 
-    def _incremental_restore(self, location, checksum):
-        """Recursively apply backups from all parents.
+    def _backup_chain(self, location, checksum):
+        """Walk the metadata of the backups up to the full one and return
+        the chain as (location, checksum, incremental_dir) tuples, from the
+        full backup to the one being restored.
 
-        If we are the parent then we restore to the restore_location and
-        we apply the logs to the restore_location only.
-
-        Otherwise if we are an incremental we restore to a subfolder to
-        prevent stomping on the full restore data. Then we run apply log
-        with the '--incremental-dir' flag
+        The full backup is restored to the restore_location itself, every
+        incremental to a subfolder named after its checksum, which is
+        sufficiently unique (/var/lib/mysql/<checksum>), to prevent stomping
+        on the full restore data.
         """
-        metadata = self.storage.load_metadata(location, checksum)
-        incremental_dir = None
-        if 'parent_location' in metadata:
-            LOG.info(_("Restoring parent: %(parent_location)s"
-                       " checksum: %(parent_checksum)s.") % metadata)
-            parent_location = metadata['parent_location']
-            parent_checksum = metadata['parent_checksum']
-            # Restore parents recursively so backup are applied sequentially
-            self._incremental_restore(parent_location, parent_checksum)
-            # for *this* backup set the incremental_dir
-            # just use the checksum for the incremental path as it is
-            # sufficiently unique /var/lib/mysql/<checksum>
-            incremental_dir = os.path.join(self.restore_location, checksum)
+        chain = []
+        while True:
+            metadata = self.storage.load_metadata(location, checksum)
+            if 'parent_location' not in metadata:
+                chain.append((location, checksum, None))
+                break
+            chain.append((location, checksum,
+                          os.path.join(self.restore_location, checksum)))
+            location = metadata['parent_location']
+            checksum = metadata['parent_checksum']
+        chain.reverse()
+        return chain
+
+    def _incremental_unpack(self, location, checksum, incremental_dir):
+        if incremental_dir:
+            LOG.info(_("Restoring incremental: %(location)s"
+                       " checksum: %(checksum)s.") %
+                     {'location': location, 'checksum': checksum})
             operating_system.create_directory(incremental_dir, as_root=True)
-            command = self._incremental_restore_cmd(incremental_dir)
+            command = self._incremental_restore_cmd(incremental_dir,
+                                                    location)
         else:
+            LOG.info(_("Restoring parent: %(location)s"
+                       " checksum: %(checksum)s.") %
+                     {'location': location, 'checksum': checksum})
             # The parent (full backup) use the same command from InnobackupEx
             # super class and do not set an incremental_dir.
-            command = self.restore_cmd
+            command = self._incremental_restore_cmd(self.restore_location,
+                                                    location)
+        return self._unpack(location, checksum, command)
 
-        self.content_length += self._unpack(location, checksum, command)
-        self._incremental_prepare(incremental_dir)
+    def _incremental_restore(self, location, checksum):
+        """Apply the backups of the chain sequentially, from the full one.
 
-        # Delete unpacked incremental backup metadata
-        if incremental_dir:
-            operating_system.remove(incremental_dir, force=True, as_root=True)
+        If we are the parent then we restore to the restore_location and
+        we apply the logs to the restore_location only.
+
+        Otherwise if we are an incremental we restore to a subfolder and run
+        apply log with the '--incremental-dir' flag. The next incremental is
+        downloaded and unpacked while a backup is prepared, so at most two of
+        them are on disk at any time.
+        """
+        chain = self._backup_chain(location, checksum)
+        self.content_length += self._incremental_unpack(*chain[0])
+        for index, (location, checksum, incremental_dir) in enumerate(chain):
+            prefetch = None
+            if index + 1 < len(chain):
+                prefetch = eventlet.spawn(self._incremental_unpack,
+                                          *chain[index + 1])
+            try:
+                self._incremental_prepare(incremental_dir)
+            except Exception:
+                if prefetch is not None:
+                    # Stop unpacking the next backup and remove what it
+                    # unpacked so far.
+                    prefetch.kill()
+                    operating_system.remove(chain[index + 1][2], force=True,
+                                            as_root=True)
+                raise
+
+            # Delete unpacked incremental backup metadata
+            if incremental_dir:
+                operating_system.remove(incremental_dir, force=True,
+                                        as_root=True)
+            if prefetch is not None:
+                self.content_length += prefetch.wait()
 
     def _run_restore(self):
         """Run incremental restore.
@@ -15,6 +15,9 @@
 #
 
 import abc
+
+from trove.guestagent.common import progress
+from trove.guestagent.common import throttle
 from trove.guestagent.strategy import Strategy
 
 
@@ -23,8 +26,16 @@ class Storage(Strategy):
     __strategy_type__ = 'storage'
     __strategy_ns__ = 'trove.guestagent.strategies.storage'
 
+    # Suffix of the names of the backups the strategy compresses and
+    # encrypts itself, which the backup runner then leaves to it.
+    manifest_extension = None
+
     def __init__(self, context):
         self.context = context
+        # Counts the progress of saves, replaced by the backup agent.
+        self.progress = progress.BackupProgress()
+        # Does not limit saves, replaced by the backup agent.
+        self.throttle = throttle.Throttle()
         super(Storage, self).__init__()
 
     @abc.abstractmethod
@@ -42,3 +53,13 @@ class Storage(Strategy):
     @abc.abstractmethod
     def save_metadata(self, location, metadata={}):
         """Save metadata for a persisted object."""
+
+    @abc.abstractmethod
+    def location(self, filename):
+        """Return the location a backup saved as filename is stored at."""
+
+    @abc.abstractmethod
+    def get_checksum(self, location):
+        """Return the checksum of the backup at location, or None if it
+        is not stored yet.
+        """
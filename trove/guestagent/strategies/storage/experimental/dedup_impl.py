@@ -0,0 +1,194 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import functools
+import hashlib
+import sys
+
+from eventlet import greenpool
+from eventlet import tpool
+import six
+
+from trove.common import cfg
+from trove.common import chunk_index
+from trove.common.i18n import _
+from trove.common.remote import create_swift_client
+from trove.guestagent.common import chunking
+from trove.guestagent.common import compression
+from trove.guestagent.common import encryption
+from trove.guestagent.strategies.storage import swift
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+BACKUP_CONTAINER = CONF.backup_swift_container
+# Chunks are gzipped on their own, fast, since the stream they come from
+# cannot be compressed as a whole without defeating the deduplication.
+CHUNK_COMPRESSION_LEVEL = 1
+
+
+def _pack_chunk(chunk, key=None):
+    """Return the object name, content and etag of a chunk, encrypted with
+    key if given.
+    """
+    body = compression.gzip_block(chunk, CHUNK_COMPRESSION_LEVEL)
+    if key:
+        digest = encryption.block_id(chunk, key)
+        body = encryption.encrypt_block(body, key)
+    else:
+        digest = hashlib.sha256(chunk).hexdigest()
+    name = chunk_index.CHUNK_PREFIX + digest
+    return name, body, hashlib.md5(body).hexdigest()
+
+
+class DedupSwiftStorage(swift.SwiftStorage):
+    """Implementation of Storage Strategy for Swift that stores every chunk
+    of data only once.
+
+    The backup stream is cut into content-defined chunks, each stored under
+    the hash of its content, and the backup itself is an index of its
+    chunks. Chunks already in the container are not uploaded again, so
+    full backups mostly made of unchanged data upload little.
+
+    A backup compressed or encrypted as a whole would not have any chunk
+    in common with another, so the backup runner leaves that to the
+    storage: each chunk is compressed, and encrypted with a key derived
+    from its content if backup_use_openssl_encryption is set.
+    """
+    __strategy_name__ = 'swiftdedup'
+    manifest_extension = chunk_index.EXTENSION
+
+    def save(self, filename, stream):
+        """Persist the chunks of the stream missing from swift, then the
+        index of the backup to the location <BACKUP_CONTAINER>/<filename>.
+        """
+        if not filename.endswith(chunk_index.EXTENSION):
+            LOG.warning(_("Backup %s was not left to the storage to "
+                          "compress and encrypt, its chunks may not be "
+                          "deduplicated.") % filename)
+        self.connection.put_container(BACKUP_CONTAINER)
+        location = self.location(filename)
+
+        headers, stored = self.connection.get_container(
+            BACKUP_CONTAINER, prefix=chunk_index.CHUNK_PREFIX,
+            full_listing=True)
+        stored = dict((obj['name'], obj['hash']) for obj in stored)
+
+        key = (CONF.backup_aes_cbc_key
+               if CONF.backup_use_openssl_encryption else None)
+        chunks = self._save_chunks(stream, stored, key)
+        if chunks is None:
+            return False, "Error saving data to Swift!", None, location
+
+        contents = chunk_index.dumps(chunks, encrypted=bool(key))
+        checksum = hashlib.md5(contents).hexdigest()
+        etag = self.connection.put_object(
+            BACKUP_CONTAINER, filename, contents,
+            content_type=chunk_index.CONTENT_TYPE)
+        if not self._verify_segment(filename, etag, checksum):
+            return False, "Error saving data to Swift!", None, location
+
+        return (True, "Successfully saved data to Swift!", checksum,
+                location)
+
+    def _save_chunks(self, stream, stored, key):
+        """Upload the chunks of the stream that are not stored yet, up to
+        backup_upload_concurrency at the same time, encrypted with key if
+        given.
+
+        Returns the index of the chunks in order, or None if swift did not
+        store a chunk intact.
+        """
+        pool = greenpool.GreenPool(max(1, CONF.backup_upload_concurrency))
+        # A swift client connection cannot be shared by concurrent requests.
+        connections = [self.connection]
+        failures = []
+
+        def _upload(name, body, checksum, length):
+            try:
+                connection = (connections.pop() if connections
+                              else create_swift_client(self.context))
+                etag = connection.put_object(BACKUP_CONTAINER, name, body,
+                                             content_length=len(body))
+                connections.append(connection)
+                if self._verify_segment(name, etag, checksum):
+                    self.progress.saved(length)
+                else:
+                    failures.append(None)
+            except Exception:
+                LOG.exception(_("Error uploading chunk %s to swift.") % name)
+                failures.append(sys.exc_info())
+
+        chunks = []
+        uploads = 0
+        for chunk in chunking.chunks(stream):
+            if failures:
+                break
+            self.progress.read(len(chunk))
+            self.throttle.consume(len(chunk))
+            name, body, checksum = tpool.execute(_pack_chunk, chunk, key)
+            if name in stored:
+                self.progress.saved(len(chunk))
+            else:
+                stored[name] = checksum
+                uploads += 1
+                # Waits for a free upload when the pool is full, which
+                # bounds the chunks held in memory.
+                pool.spawn_n(_upload, name, body, checksum, len(chunk))
+            chunks.append({'name': name, 'hash': stored[name],
+                           'bytes': len(chunk)})
+        pool.waitall()
+
+        for failure in failures:
+            if failure is not None:
+                six.reraise(*failure)
+        if failures:
+            return None
+        LOG.info(_("Uploaded %(uploads)d new chunks out of %(chunks)d.") %
+                 {'uploads': uploads, 'chunks': len(chunks)})
+        return chunks
+
+    def load(self, location, backup_checksum):
+        """Restore a backup from its chunks, or like SwiftStorage if it was
+        not stored deduplicated.
+        """
+        storage_url, container, filename = self._explodeLocation(location)
+        headers = self.connection.head_object(container, filename)
+        if headers.get('content-type') != chunk_index.CONTENT_TYPE:
+            return super(DedupSwiftStorage, self).load(location,
+                                                       backup_checksum)
+
+        headers, contents = self.connection.get_object(container, filename)
+        if CONF.verify_swift_checksum_on_restore:
+            self._verify_checksum(headers.get('etag', ''), backup_checksum)
+        chunks = chunk_index.loads(contents)
+        decode = None
+        if chunk_index.is_encrypted(contents):
+            decode = functools.partial(encryption.decrypt_block,
+                                       password=CONF.backup_aes_cbc_key)
+        return compression.gunzip(self._load_segments_concurrently(
+            container, chunks, max(1, CONF.backup_download_concurrency),
+            decode=decode))
+
+    def save_metadata(self, location, metadata={}):
+        """Save metadata to the index object."""
+        storage_url, container, filename = self._explodeLocation(location)
+        # The content type tells the index apart from a swift manifest.
+        headers = {'Content-Type': chunk_index.CONTENT_TYPE}
+        for key, value in metadata.iteritems():
+            headers[self._set_attr(key)] = value
+
+        LOG.info(_("Writing metadata: %s"), str(headers))
+        self.connection.post_object(container, filename, headers=headers)
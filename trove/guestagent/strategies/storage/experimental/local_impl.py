@@ -0,0 +1,244 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Storage of backups in a local or NFS mounted directory.
+
+The directory is laid out like the swift backup container: the backup
+stream is cut into the same segments, next to a manifest file named after
+the backup. The manifest lists the segments with their checksums and holds
+the metadata of the backup, and the checksum of the backup is the checksum
+of the concatenated segment checksums, like the etag of a swift manifest.
+"""
+
+import errno
+import hashlib
+import json
+import mmap
+import os
+
+import eventlet
+from eventlet import tpool
+
+from trove.common import cfg
+from trove.common.i18n import _
+from trove.guestagent.strategies.storage import base
+from trove.guestagent.strategies.storage.swift import StreamReader
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+MAX_FILE_SIZE = CONF.backup_segment_max_size
+BACKUP_CONTAINER = CONF.backup_swift_container
+
+
+class LocalStorageIntegrityError(Exception):
+    """The stored backup does not match its checksum."""
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_block(segment_map, offset, size, checksum):
+    data = segment_map[offset:offset + size]
+    checksum.update(data)
+    return data
+
+
+class LocalStorage(base.Storage):
+    """Implementation of Storage Strategy for a local directory."""
+    __strategy_name__ = 'local'
+
+    def __init__(self, *args, **kwargs):
+        super(LocalStorage, self).__init__(*args, **kwargs)
+        self.root = CONF.backup_local_storage_path
+        self.max_file_size = MAX_FILE_SIZE
+        # Round the buffers up to whole pages, so that all but the last
+        # write of a segment are page aligned.
+        self.buffer_size = -(-CONF.backup_local_storage_buffer_size //
+                             mmap.PAGESIZE) * mmap.PAGESIZE
+
+    def _container_path(self):
+        path = os.path.join(self.root, BACKUP_CONTAINER)
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        return path
+
+    def save(self, filename, stream):
+        """Persist information from the stream to the backup directory.
+
+        The file is saved to the location <root>/<BACKUP_CONTAINER>/<filename>.
+        Segments are written in large buffers and each is synced to disk
+        while the next one is written; the manifest is only written once
+        all the segments are on disk.
+        """
+        container_path = self._container_path()
+        stream_reader = StreamReader(stream, filename, self.max_file_size,
+                                     progress=self.progress,
+                                     throttle=self.throttle)
+        location = self.location(filename)
+
+        segments = []
+        syncs = []
+        try:
+            while not stream_reader.end_of_file:
+                segment = stream_reader.segment
+                path = os.path.join(container_path, segment)
+                self._write_segment(path, stream_reader)
+                segments.append({
+                    'name': segment,
+                    'hash': stream_reader.segment_checksum.hexdigest(),
+                    'bytes': stream_reader.segment_length,
+                })
+                self.progress.saved(stream_reader.segment_length)
+                syncs.append(eventlet.spawn(tpool.execute, _fsync, path))
+        finally:
+            for sync in syncs:
+                sync.wait()
+
+        manifest = {
+            'prefix': stream_reader.prefix,
+            'segments': segments,
+            'etag': self._listing_checksum(segments),
+            'metadata': {},
+        }
+        self._write_manifest(location, manifest)
+        return (True, "Successfully saved data to local storage!",
+                manifest['etag'], location)
+
+    def _write_segment(self, path, stream_reader):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o640)
+        try:
+            pending = []
+            length = 0
+            chunk = stream_reader.read()
+            while chunk:
+                pending.append(chunk)
+                length += len(chunk)
+                if length >= self.buffer_size:
+                    data = ''.join(pending)
+                    aligned = length - length % self.buffer_size
+                    tpool.execute(_write_all, fd,
+                                  memoryview(data)[:aligned])
+                    pending = [data[aligned:]]
+                    length -= aligned
+                chunk = stream_reader.read()
+            if length:
+                tpool.execute(_write_all, fd, ''.join(pending))
+        finally:
+            os.close(fd)
+
+    def _listing_checksum(self, segments):
+        checksum = hashlib.md5()
+        for segment in segments:
+            checksum.update(segment['hash'])
+        return checksum.hexdigest()
+
+    def _write_manifest(self, location, manifest):
+        """Replace the manifest atomically, so that a partial one is never
+        read back.
+        """
+        temp_location = location + '.tmp'
+        with open(temp_location, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.rename(temp_location, location)
+        _fsync(os.path.dirname(location))
+
+    def _read_manifest(self, location, backup_checksum):
+        with open(location) as manifest_file:
+            manifest = json.load(manifest_file)
+        if self._listing_checksum(manifest['segments']) != manifest['etag']:
+            raise LocalStorageIntegrityError(
+                _("The manifest of %s is corrupt.") % location)
+        if CONF.verify_swift_checksum_on_restore:
+            self._verify_checksum(manifest['etag'], backup_checksum)
+        return manifest
+
+    def _verify_checksum(self, etag, checksum):
+        if etag != checksum:
+            msg = (_("Original checksum: %(original)s does not match"
+                     " the current checksum: %(current)s") %
+                   {'original': etag, 'current': checksum})
+            LOG.error(msg)
+            raise LocalStorageIntegrityError(msg)
+        return True
+
+    def load(self, location, backup_checksum):
+        """Return an iterable of the chunks of a stored backup."""
+        manifest = self._read_manifest(location, backup_checksum)
+        return self._read_segments(os.path.dirname(location),
+                                   manifest['segments'])
+
+    def _read_segments(self, container_path, segments):
+        """Yield the data of the segments in order, read through memory
+        maps, checking each segment against its checksum.
+        """
+        for segment in segments:
+            if not segment['bytes']:
+                continue
+            checksum = hashlib.md5()
+            with open(os.path.join(container_path,
+                                   segment['name']), 'rb') as segment_file:
+                segment_map = mmap.mmap(segment_file.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+            try:
+                for offset in range(0, len(segment_map), self.buffer_size):
+                    # Page faults block, keep them off the event loop.
+                    yield tpool.execute(_read_block, segment_map, offset,
+                                        self.buffer_size, checksum)
+            finally:
+                segment_map.close()
+            self._verify_checksum(segment['hash'], checksum.hexdigest())
+
+    def location(self, filename):
+        return os.path.join(self._container_path(), filename)
+
+    def get_checksum(self, location):
+        try:
+            with open(location) as manifest_file:
+                return json.load(manifest_file)['etag']
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+
+    def load_metadata(self, location, backup_checksum):
+        """Load the metadata from the manifest."""
+        return dict(self._read_manifest(location, backup_checksum)[
+            'metadata'])
+
+    def save_metadata(self, location, metadata={}):
+        """Save metadata to the manifest."""
+        with open(location) as manifest_file:
+            manifest = json.load(manifest_file)
+        manifest['metadata'].update(metadata)
+        LOG.info(_("Writing metadata: %s"), str(manifest['metadata']))
+        self._write_manifest(location, manifest)
@@ -0,0 +1,212 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Streaming of a backup from one guest straight to another.
+
+The source listens on a TCP port and the guest restoring the backup
+connects to it, authenticating with a token it was handed along with the
+address of the source. The backup follows the name it is saved as, in
+length prefixed frames; an empty frame and the checksum of the whole
+stream close it, so that a stream cut short is never taken for a complete
+one.
+"""
+
+import hashlib
+import hmac
+import struct
+import time
+
+import eventlet
+from eventlet.green import socket
+
+from trove.common import cfg
+from trove.common.i18n import _
+from trove.common import utils
+from trove.guestagent.strategies.storage import base
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+CHUNK_SIZE = CONF.backup_chunk_size
+# Time (in seconds) a peer has to connect and to authenticate.
+CONNECT_TIMEOUT = 60
+TOKEN_LENGTH = 32
+MAX_LINE = 1024
+FRAME_HEADER = struct.Struct('!I')
+
+
+class StreamError(Exception):
+    """The backup stream could not be opened or was cut short."""
+
+
+class StreamIntegrityError(StreamError):
+    """The backup stream does not match its checksum."""
+
+
+class StreamServer(object):
+    """Listens for the guest a backup is streamed to."""
+
+    def __init__(self, host, port=0):
+        self.host = host
+        self.token = utils.generate_random_password(TOKEN_LENGTH)
+        self.socket = eventlet.listen((host, port))
+        self.port = self.socket.getsockname()[1]
+
+    @property
+    def address(self):
+        """The address and token to connect to the server with."""
+        return {'host': self.host, 'port': self.port, 'token': self.token}
+
+    def accept(self, timeout):
+        """Return the connection of the first peer to authenticate within
+        timeout seconds, or None if none did.
+        """
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            self.socket.settimeout(remaining)
+            try:
+                connection, peer = self.socket.accept()
+            except socket.timeout:
+                return None
+            if self._authenticate(connection):
+                LOG.info(_("Streaming backup to %s.") % peer[0])
+                connection.settimeout(CONF.replication_stream_timeout)
+                return connection
+            LOG.warning(_("Rejected %s, which did not authenticate.")
+                        % peer[0])
+            connection.close()
+
+    def _authenticate(self, connection):
+        connection.settimeout(CONNECT_TIMEOUT)
+        try:
+            token = connection.makefile('rb').readline(MAX_LINE)
+        except socket.error:
+            return False
+        return hmac.compare_digest(token.rstrip('\n'), self.token)
+
+    def close(self):
+        self.socket.close()
+
+
+class StreamStorage(base.Storage):
+    """Implementation of Storage Strategy for a stream to another guest.
+
+    The storage is bound to a single connection, to save one backup to
+    the peer it was accepted from or to load one from the server it
+    connected to.
+    """
+    __strategy_name__ = 'stream'
+
+    def __init__(self, context, connection=None):
+        super(StreamStorage, self).__init__(context)
+        self.connection = connection
+        self.reader = None
+        self.checksum = hashlib.md5()
+
+    def connect(self, address):
+        """Connect to the server at address, returning the name of the
+        backup it streams.
+        """
+        connection = socket.create_connection(
+            (address['host'], address['port']), CONNECT_TIMEOUT)
+        try:
+            connection.sendall(address['token'] + '\n')
+            # The server starts the backup before it names it.
+            connection.settimeout(CONF.replication_stream_timeout)
+            reader = connection.makefile('rb')
+            filename = reader.readline(MAX_LINE).rstrip('\n')
+            if not filename:
+                raise StreamError(_("%(host)s:%(port)d refused the backup "
+                                    "stream.") % address)
+        except Exception:
+            connection.close()
+            raise
+        self.connection = connection
+        self.reader = reader
+        return filename
+
+    def save(self, filename, stream):
+        """Send the stream to the peer, in frames of up to CHUNK_SIZE.
+
+        The stream is only complete once finish is called, which the
+        caller does once it knows the backup succeeded.
+        """
+        self.connection.sendall(filename + '\n')
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+            self.progress.read(len(chunk))
+            self.throttle.consume(len(chunk))
+            self.checksum.update(chunk)
+            self.connection.sendall(FRAME_HEADER.pack(len(chunk)))
+            self.connection.sendall(chunk)
+            self.progress.saved(len(chunk))
+        return (True, "Successfully streamed data to %s!" %
+                self.connection.getpeername()[0],
+                self.checksum.hexdigest(), self.location(filename))
+
+    def finish(self):
+        """Close the stream, which the peer then knows is complete."""
+        self.connection.sendall(FRAME_HEADER.pack(0) +
+                                self.checksum.hexdigest())
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _read(self, length):
+        data = self.reader.read(length)
+        if len(data) != length:
+            raise StreamError(_("The backup stream was cut short."))
+        return data
+
+    def load(self, location, backup_checksum):
+        """Return an iterable of the chunks of the stream, which raises
+        StreamError if it is cut short or corrupt.
+        """
+        return self._read_frames()
+
+    def _read_frames(self):
+        checksum = hashlib.md5()
+        try:
+            length, = FRAME_HEADER.unpack(self._read(FRAME_HEADER.size))
+            while length:
+                chunk = self._read(length)
+                checksum.update(chunk)
+                yield chunk
+                length, = FRAME_HEADER.unpack(self._read(FRAME_HEADER.size))
+            expected = self._read(len(checksum.hexdigest()))
+        finally:
+            self.close()
+        if expected != checksum.hexdigest():
+            raise StreamIntegrityError(
+                _("The backup stream checksum %(expected)s does not match "
+                  "the checksum of the data: %(actual)s.") %
+                {'expected': expected, 'actual': checksum.hexdigest()})
+
+    def location(self, filename):
+        """Nothing is stored, so a streamed backup has no location."""
+        return None
+
+    def get_checksum(self, location):
+        raise StreamError(_("A backup stream is not stored, its checksum "
+                            "is only known once it is read."))
+
+    def load_metadata(self, location, backup_checksum):
+        return {}
+
+    def save_metadata(self, location, metadata={}):
+        pass
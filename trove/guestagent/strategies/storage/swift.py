@@ -14,7 +14,16 @@
 #    under the License.
 #
 
+import collections
 import hashlib
+import io
+import itertools
+import sys
+
+from eventlet import greenpool
+from eventlet import semaphore
+import six
+from swiftclient.client import ClientException
 
 from trove.common import cfg
 from trove.common.i18n import _
@@ -41,8 +50,11 @@ class SwiftDownloadIntegrityError(Exception):
 class StreamReader(object):
     """Wrap the stream from the backup process and chunk it into segements."""
 
-    def __init__(self, stream, filename, max_file_size=MAX_FILE_SIZE):
+    def __init__(self, stream, filename, max_file_size=MAX_FILE_SIZE,
+                 progress=None, throttle=None):
         self.stream = stream
+        self.progress = progress
+        self.throttle = throttle
         self.filename = filename
         self.container = BACKUP_CONTAINER
         self.max_file_size = max_file_size
@@ -85,6 +97,10 @@ class StreamReader(object):
 
         self.segment_checksum.update(chunk)
         self.segment_length += len(chunk)
+        if self.progress is not None:
+            self.progress.read(len(chunk))
+        if self.throttle is not None:
+            self.throttle.consume(len(chunk))
         return chunk
 
 
@@ -107,32 +123,27 @@ class SwiftStorage(base.Storage):
         # Create the container if it doesn't already exist
         self.connection.put_container(BACKUP_CONTAINER)
 
-        # Swift Checksum is the checksum of the concatenated segment checksums
-        swift_checksum = hashlib.md5()
-
         # Wrap the output of the backup process to segment it for swift
-        stream_reader = StreamReader(stream, filename)
+        stream_reader = StreamReader(stream, filename,
+                                     progress=self.progress,
+                                     throttle=self.throttle)
 
-        url = self.connection.url
         # Full location where the backup manifest is stored
-        location = "%s/%s/%s" % (url, BACKUP_CONTAINER, filename)
+        location = self.location(filename)
 
         # Read from the stream and write to the container in swift
-        while not stream_reader.end_of_file:
-            etag = self.connection.put_object(BACKUP_CONTAINER,
-                                              stream_reader.segment,
-                                              stream_reader)
-
-            segment_checksum = stream_reader.segment_checksum.hexdigest()
-
-            # Check each segment MD5 hash against swift etag
-            # Raise an error and mark backup as failed
-            if etag != segment_checksum:
-                LOG.error(_("Error saving data segment to swift. "
-                          "ETAG: %(tag)s Segment MD5: %(checksum)s."),
-                          {'tag': etag, 'checksum': segment_checksum})
-                return False, "Error saving data to Swift!", None, location
+        concurrency = CONF.backup_upload_concurrency
+        if concurrency > 1:
+            segment_checksums = self._save_segments_concurrently(
+                stream_reader, concurrency)
+        else:
+            segment_checksums = self._save_segments(stream_reader)
+        if segment_checksums is None:
+            return False, "Error saving data to Swift!", None, location
 
+        # Swift Checksum is the checksum of the concatenated segment checksums
+        swift_checksum = hashlib.md5()
+        for segment_checksum in segment_checksums:
             swift_checksum.update(segment_checksum)
 
         # Create the manifest file
@@ -167,6 +178,122 @@ class SwiftStorage(base.Storage):
         return (True, "Successfully saved data to Swift!",
                 final_swift_checksum, location)
 
+    def _verify_segment(self, segment, etag, segment_checksum):
+        # Check each segment MD5 hash against swift etag
+        if etag != segment_checksum:
+            LOG.error(_("Error saving data segment %(segment)s to swift. "
+                        "ETAG: %(tag)s Segment MD5: %(checksum)s."),
+                      {'segment': segment, 'tag': etag,
+                       'checksum': segment_checksum})
+            return False
+        return True
+
+    def _save_segments(self, stream_reader):
+        """Stream the segments to swift one after another.
+
+        Returns the segment checksums in order, or None if swift did not
+        store a segment intact.
+        """
+        segment_checksums = []
+        while not stream_reader.end_of_file:
+            segment = stream_reader.segment
+            etag = self.connection.put_object(BACKUP_CONTAINER, segment,
+                                              stream_reader)
+
+            segment_checksum = stream_reader.segment_checksum.hexdigest()
+            if not self._verify_segment(segment, etag, segment_checksum):
+                return None
+            segment_checksums.append(segment_checksum)
+            self.progress.saved(stream_reader.segment_length)
+        return segment_checksums
+
+    def _read_segment(self, stream_reader):
+        """Buffer the next segment of the stream in memory."""
+        segment = stream_reader.segment
+        contents = io.BytesIO()
+        chunk = stream_reader.read()
+        while chunk:
+            contents.write(chunk)
+            chunk = stream_reader.read()
+        length = contents.tell()
+        contents.seek(0)
+        return (segment, contents, length,
+                stream_reader.segment_checksum.hexdigest())
+
+    def _save_segments_concurrently(self, stream_reader, concurrency):
+        """Upload up to concurrency segments to swift at the same time.
+
+        The backup stream is read into at most concurrency segment buffers,
+        each of which is freed as soon as its upload has finished. Reading
+        stops at the first failed upload; the segments in flight are still
+        allowed to finish before the failure is reported. Upload errors are
+        re-raised, like in the sequential path.
+
+        Returns the segment checksums in order, or None if swift did not
+        store a segment intact.
+        """
+        buffers = semaphore.Semaphore(concurrency)
+        pool = greenpool.GreenPool(concurrency)
+        # Each upload needs its own connection, a swift client connection
+        # cannot be shared by concurrent requests.
+        connections = [self.connection]
+        failures = []
+
+        def _upload(segment, contents, length, segment_checksum):
+            try:
+                connection = (connections.pop() if connections
+                              else create_swift_client(self.context))
+                etag = connection.put_object(BACKUP_CONTAINER, segment,
+                                             contents, content_length=length)
+                connections.append(connection)
+                if self._verify_segment(segment, etag, segment_checksum):
+                    self.progress.saved(length)
+                else:
+                    failures.append(None)
+            except Exception:
+                LOG.exception(_("Error uploading data segment %s to swift.")
+                              % segment)
+                failures.append(sys.exc_info())
+            finally:
+                contents.close()
+                buffers.release()
+
+        segment_checksums = []
+        while not stream_reader.end_of_file and not failures:
+            buffers.acquire()
+            if failures:
+                buffers.release()
+                break
+            segment, contents, length, segment_checksum = (
+                self._read_segment(stream_reader))
+            segment_checksums.append(segment_checksum)
+            pool.spawn_n(_upload, segment, contents, length,
+                         segment_checksum)
+        pool.waitall()
+
+        for failure in failures:
+            if failure is not None:
+                six.reraise(*failure)
+        if failures:
+            return None
+        return segment_checksums
+
+    def location(self, filename):
+        return "%s/%s/%s" % (self.connection.url, BACKUP_CONTAINER, filename)
+
+    def get_checksum(self, location):
+        """Return the etag of the manifest at location, which is only
+        written once the whole backup is stored.
+        """
+        storage_url, container, filename = self._explodeLocation(location)
+        try:
+            headers = self.connection.head_object(container, filename)
+        except ClientException as e:
+            if e.http_status == 404:
+                return None
+            raise
+        return headers.get('etag', '').strip('"')
+
     def _explodeLocation(self, location):
         storage_url = "/".join(location.split('/')[:-2])
         container = location.split('/')[-2]
@@ -187,6 +314,19 @@ class SwiftStorage(base.Storage):
         """Restore a backup from the input stream to the restore_location."""
         storage_url, container, filename = self._explodeLocation(location)
 
+        concurrency = CONF.backup_download_concurrency
+        if concurrency > 1:
+            headers = self.connection.head_object(container, filename)
+            manifest = headers.get('x-object-manifest')
+            if manifest:
+                if CONF.verify_swift_checksum_on_restore:
+                    self._verify_checksum(headers.get('etag', ''),
+                                          backup_checksum)
+                segment_container, segments = self._list_segments(
+                    manifest, headers.get('etag', ''))
+                return self._load_segments_concurrently(
+                    segment_container, segments, concurrency)
+
         headers, info = self.connection.get_object(container, filename,
                                                    resp_chunk_size=CHUNK_SIZE)
 
@@ -195,6 +335,65 @@ class SwiftStorage(base.Storage):
 
         return info
 
+    def _list_segments(self, manifest, etag):
+        """List the segments of a manifest, in the order swift joins them.
+
+        The manifest etag is the checksum of the concatenated segment
+        checksums, which makes sure the listing covers the whole backup.
+        """
+        container, prefix = manifest.split('/', 1)
+        headers, segments = self.connection.get_container(
+            container, prefix=prefix, full_listing=True)
+        segments = sorted(segments, key=lambda segment: segment['name'])
+        listing_checksum = hashlib.md5()
+        for segment in segments:
+            listing_checksum.update(segment['hash'])
+        self._verify_checksum(etag, listing_checksum.hexdigest())
+        return container, segments
+
+    def _load_segments_concurrently(self, container, segments, concurrency,
+                                    decode=None):
+        """Download up to concurrency segments at the same time, yielding
+        their data in order.
+
+        Segments that arrive early wait in memory until all the segments
+        before them have been yielded. Each segment is checked against its
+        etag before any of its data is yielded, and passed through decode
+        first if given.
+        """
+        # A swift client connection cannot be shared by concurrent requests.
+        connections = [self.connection]
+
+        def _download(segment):
+            connection = (connections.pop() if connections
+                          else create_swift_client(self.context))
+            headers, body = connection.get_object(container, segment['name'])
+            connections.append(connection)
+            self._verify_checksum(segment['hash'],
+                                  hashlib.md5(body).hexdigest())
+            if decode is not None:
+                body = decode(body)
+            return body
+
+        pool = greenpool.GreenPool(concurrency)
+        segments = iter(segments)
+        pending = collections.deque(
+            pool.spawn(_download, segment)
+            for segment in itertools.islice(segments, concurrency))
+        try:
+            while pending:
+                body = pending.popleft().wait()
+                for offset in range(0, len(body), CHUNK_SIZE):
+                    yield body[offset:offset + CHUNK_SIZE]
+                del body
+                segment = next(segments, None)
+                if segment is not None:
+                    pending.append(pool.spawn(_download, segment))
+        finally:
+            # The restore stopped early, there is no use for the rest.
+            for download in pending:
+                download.kill()
+
     def _get_attr(self, original):
         """Get a friendly name from an object header key."""
         key = original.replace('-', '_')
@@ -1199,7 +1199,7 @@ class DBInstance(dbmodels.DatabaseModelBase):
                     'task_id', 'task_description', 'task_start_time',
                     'volume_id', 'deleted', 'tenant_id',
                     'datastore_version_id', 'configuration_id', 'slave_of_id',
-                    'cluster_id', 'shard_id', 'type']
+                    'cluster_id', 'shard_id', 'type', 'task_timings']
 
     def __init__(self, task_status, **kwargs):
         """
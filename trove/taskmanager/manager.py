@@ -13,10 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
 from sets import Set
+import sys
 
+from eventlet import greenpool
 import oslo_messaging as messaging
 from oslo_utils import importutils
+import six
 
 from trove.backup.models import Backup
 import trove.common.cfg as cfg
@@ -27,10 +31,12 @@ from trove.common.exception import TroveError
 from trove.common.i18n import _
 import trove.common.rpc.version as rpc_version
 from trove.common.strategies.cluster import strategy
+from trove.common import utils
 import trove.extensions.mgmt.instances.models as mgmtmodels
 from trove.instance.tasks import InstanceTasks
 from trove.openstack.common import log as logging
 from trove.openstack.common import periodic_task
+from trove import rpc
 from trove.taskmanager import models
 from trove.taskmanager.models import FreshInstanceTasks, BuiltInstanceTasks
 
@@ -80,49 +86,127 @@ class Manager(periodic_task.PeriodicTasks):
             setattr(instance.db_info, 'task_status', status)
             instance.db_info.save()
 
+    def _report_phase_timings(self, context, operation, instance, timer):
+        """Logs the time spent in each phase of a failover operation, keeps
+        it on the instance record and sends it out as a notification.
+        """
+        LOG.info(_("%(operation)s %(id)s took %(total).3fs: %(phases)s") %
+                 {'operation': operation, 'id': instance.id,
+                  'total': timer.total,
+                  'phases': ', '.join('%s=%.3fs' % timing
+                                      for timing in timer.timings.items())})
+        payload = {
+            'instance_id': instance.id,
+            'tenant_id': context.tenant,
+            'operation': operation,
+            'total': timer.total,
+            # The phases, in the order they ran.
+            'phases': timer.timings,
+        }
+        try:
+            # Kept until the next failover of the instance.
+            instance.db_info.task_timings = json.dumps(
+                dict((key, payload[key])
+                     for key in ('operation', 'total', 'phases')))
+            instance.db_info.save()
+        except Exception:
+            LOG.exception(_("Failed to save the %s timings.") % operation)
+        try:
+            notifier = rpc.get_notifier(service="taskmanager",
+                                        publisher_id=CONF.host)
+            notifier.info(context, 'trove.instance.%s.timings' % operation,
+                          payload)
+        except Exception:
+            LOG.exception(_("Failed to send the %s timings notification.")
+                          % operation)
+
+    def _migrate_replicas(self, operation, replica_models, old_master,
+                          new_master, latest_txn_id=None):
+        """Moves the replicas of old_master over to new_master.
+
+        The replicas are moved concurrently. Returns the ids of the replicas
+        that could not be moved; any error other than a TroveError is raised
+        once all of the replicas have been dealt with.
+        """
+        def _migrate_replica(replica):
+            try:
+                if latest_txn_id is not None:
+                    replica.wait_for_txn(latest_txn_id)
+                if replica.id != new_master.id:
+                    replica.detach_replica(old_master, for_failover=True)
+                    replica.attach_replica(new_master)
+            except exception.TroveError:
+                msg = _("%(operation)s: Unable to migrate "
+                        "replica %(slave)s from old replica source "
+                        "%(old_master)s to new source %(new_master)s.")
+                msg_values = {
+                    "operation": operation,
+                    "slave": replica.id,
+                    "old_master": old_master.id,
+                    "new_master": new_master.id
+                }
+                LOG.exception(msg % msg_values)
+                return replica.id
+
+        pile = greenpool.GreenPile(
+            greenpool.GreenPool(CONF.replica_migrate_pool_size))
+        for replica in replica_models:
+            pile.spawn(_migrate_replica, replica)
+
+        exception_replicas = []
+        error = None
+        for replica in replica_models:
+            try:
+                replica_id = pile.next()
+            except Exception:
+                if error is None:
+                    error = sys.exc_info()
+                continue
+            if replica_id:
+                exception_replicas.append(replica_id)
+        if error:
+            six.reraise(*error)
+        return exception_replicas
+
     def promote_to_replica_source(self, context, instance_id):
 
         def _promote_to_replica_source(old_master, master_candidate,
                                        replica_models):
             # First, we transition from the old master to new as quickly as
             # possible to minimize the scope of unrecoverable error
-            old_master.make_read_only(True)
-            master_ips = old_master.detach_public_ips()
-            slave_ips = master_candidate.detach_public_ips()
-            latest_txn_id = old_master.get_latest_txn_id()
-            master_candidate.wait_for_txn(latest_txn_id)
-            master_candidate.detach_replica(old_master, for_failover=True)
-            master_candidate.enable_as_master()
-            old_master.attach_replica(master_candidate)
-            master_candidate.attach_public_ips(master_ips)
-            master_candidate.make_read_only(False)
-            old_master.attach_public_ips(slave_ips)
+            with timer.phase('make_read_only'):
+                old_master.make_read_only(True)
+            with timer.phase('detach_public_ips'):
+                master_ips = old_master.detach_public_ips()
+                slave_ips = master_candidate.detach_public_ips()
+            with timer.phase('wait_for_txn'):
+                latest_txn_id = old_master.get_latest_txn_id()
+                master_candidate.wait_for_txn(latest_txn_id)
+            with timer.phase('detach_replica'):
+                master_candidate.detach_replica(old_master, for_failover=True)
+            with timer.phase('enable_as_master'):
+                master_candidate.enable_as_master()
+            with timer.phase('attach_replica'):
+                old_master.attach_replica(master_candidate)
+            with timer.phase('attach_public_ips'):
+                master_candidate.attach_public_ips(master_ips)
+            with timer.phase('make_read_only'):
+                master_candidate.make_read_only(False)
+            with timer.phase('attach_public_ips'):
+                old_master.attach_public_ips(slave_ips)
 
             # At this point, should something go wrong, there
             # should be a working master with some number of working slaves,
             # and possibly some number of "orphaned" slaves
 
-            exception_replicas = []
-            for replica in replica_models:
-                try:
-                    replica.wait_for_txn(latest_txn_id)
-                    if replica.id != master_candidate.id:
-                        replica.detach_replica(old_master, for_failover=True)
-                        replica.attach_replica(master_candidate)
-                except exception.TroveError:
-                    msg = _("promote-to-replica-source: Unable to migrate "
-                            "replica %(slave)s from old replica source "
-                            "%(old_master)s to new source %(new_master)s.")
-                    msg_values = {
-                        "slave": replica.id,
-                        "old_master": old_master.id,
-                        "new_master": master_candidate.id
-                    }
-                    LOG.exception(msg % msg_values)
-                    exception_replicas.append(replica.id)
+            with timer.phase('migrate_replicas'):
+                exception_replicas = self._migrate_replicas(
+                    "promote-to-replica-source", replica_models, old_master,
+                    master_candidate, latest_txn_id=latest_txn_id)
 
             try:
-                old_master.demote_replication_master()
+                with timer.phase('demote_replication_master'):
+                    old_master.demote_replication_master()
             except Exception:
                 LOG.exception(_("Exception demoting old replica source"))
                 exception_replicas.append(old_master)
@@ -151,6 +235,7 @@ class Manager(periodic_task.PeriodicTasks):
                 replica = BuiltInstanceTasks.load(context, replica_dbinfo.id)
             replicas.append(replica)
 
+        timer = utils.PhaseTimer()
         try:
             _promote_to_replica_source(old_master, master_candidate, replicas)
         except ReplicationSlaveAttachError:
@@ -159,6 +244,9 @@ class Manager(periodic_task.PeriodicTasks):
             self._set_task_status([old_master] + replicas,
                                   InstanceTasks.PROMOTION_ERROR)
             raise
+        finally:
+            self._report_phase_timings(context, 'promote_to_replica_source',
+                                       master_candidate, timer)
 
     # pulled out to facilitate testing
     def _get_replica_txns(self, replica_models):
@@ -176,34 +264,28 @@ class Manager(periodic_task.PeriodicTasks):
 
         def _eject_replica_source(old_master, replica_models):
 
-            master_candidate = self._most_current_replica(old_master,
-                                                          replica_models)
-
-            master_ips = old_master.detach_public_ips()
-            slave_ips = master_candidate.detach_public_ips()
-            master_candidate.detach_replica(old_master, for_failover=True)
-            master_candidate.enable_as_master()
-            master_candidate.attach_public_ips(master_ips)
-            master_candidate.make_read_only(False)
-            old_master.attach_public_ips(slave_ips)
-
-            exception_replicas = []
-            for replica in replica_models:
-                try:
-                    if replica.id != master_candidate.id:
-                        replica.detach_replica(old_master, for_failover=True)
-                        replica.attach_replica(master_candidate)
-                except exception.TroveError:
-                    msg = _("eject-replica-source: Unable to migrate "
-                            "replica %(slave)s from old replica source "
-                            "%(old_master)s to new source %(new_master)s.")
-                    msg_values = {
-                        "slave": replica.id,
-                        "old_master": old_master.id,
-                        "new_master": master_candidate.id
-                    }
-                    LOG.exception(msg % msg_values)
-                    exception_replicas.append(replica.id)
+            with timer.phase('most_current_replica'):
+                master_candidate = self._most_current_replica(old_master,
+                                                              replica_models)
+
+            with timer.phase('detach_public_ips'):
+                master_ips = old_master.detach_public_ips()
+                slave_ips = master_candidate.detach_public_ips()
+            with timer.phase('detach_replica'):
+                master_candidate.detach_replica(old_master, for_failover=True)
+            with timer.phase('enable_as_master'):
+                master_candidate.enable_as_master()
+            with timer.phase('attach_public_ips'):
+                master_candidate.attach_public_ips(master_ips)
+            with timer.phase('make_read_only'):
+                master_candidate.make_read_only(False)
+            with timer.phase('attach_public_ips'):
+                old_master.attach_public_ips(slave_ips)
+
+            with timer.phase('migrate_replicas'):
+                exception_replicas = self._migrate_replicas(
+                    "eject-replica-source", replica_models, old_master,
+                    master_candidate)
 
             self._set_task_status([old_master] + replica_models,
                                   InstanceTasks.NONE)
@@ -221,6 +303,7 @@ class Manager(periodic_task.PeriodicTasks):
         master = BuiltInstanceTasks.load(context, instance_id)
         replicas = [BuiltInstanceTasks.load(context, dbinfo.id)
                     for dbinfo in master.slaves]
+        timer = utils.PhaseTimer()
         try:
             _eject_replica_source(master, replicas)
         except ReplicationSlaveAttachError:
@@ -229,6 +312,9 @@ class Manager(periodic_task.PeriodicTasks):
             self._set_task_status([master] + replicas,
                                   InstanceTasks.EJECTION_ERROR)
             raise
+        finally:
+            self._report_phase_timings(context, 'eject_replica_source',
+                                       master, timer)
 
     def migrate(self, context, instance_id, host):
         instance_tasks = models.BuiltInstanceTasks.load(context, instance_id)
@@ -263,44 +349,117 @@ class Manager(periodic_task.PeriodicTasks):
         else:
             ids = [instance_id]
             root_passwords = [root_password]
-        replica_number = 0
         replica_backup_id = backup_id
         replica_backup_created = False
+        replica_backup_streamed = False
         replicas = []
+        failed_replicas = []
+
+        def _create_replica(instance_tasks, replica_index, snapshot):
+            LOG.debug("Creating replica %d of %d."
+                      % (replica_index + 1, len(ids)))
+            instance_tasks.create_instance(
+                flavor, image_id, databases, users, datastore_manager,
+                packages, volume_size, replica_backup_id,
+                availability_zone, root_passwords[replica_index],
+                nics, overrides, None, snapshot)
+            return instance_tasks
+
+        def _create_other_replica(replica_index):
+            try:
+                instance_tasks = FreshInstanceTasks.load(
+                    context, ids[replica_index])
+                snapshot = instance_tasks.get_replication_master_snapshot(
+                    context, slave_of_id, flavor, replica_backup_id,
+                    replica_number=replica_index + 1)
+                return _create_replica(instance_tasks, replica_index,
+                                       snapshot)
+            except Exception:
+                LOG.exception(_(
+                    "Could not create replica %(num)d of %(count)d.")
+                    % {'num': replica_index + 1, 'count': len(ids)})
+                failed_replicas.append(ids[replica_index])
 
         try:
-            for replica_index in range(0, len(ids)):
-                try:
-                    replica_number += 1
-                    LOG.debug("Creating replica %d of %d."
-                              % (replica_number, len(ids)))
-                    instance_tasks = FreshInstanceTasks.load(
-                        context, ids[replica_index])
-                    snapshot = instance_tasks.get_replication_master_snapshot(
-                        context, slave_of_id, flavor, replica_backup_id,
-                        replica_number=replica_number)
-                    replica_backup_id = snapshot['dataset']['snapshot_id']
-                    replica_backup_created = True
-                    instance_tasks.create_instance(
-                        flavor, image_id, databases, users, datastore_manager,
-                        packages, volume_size, replica_backup_id,
-                        availability_zone, root_passwords[replica_index],
-                        nics, overrides, None, snapshot)
-                    replicas.append(instance_tasks)
-                except Exception:
-                    # if it's the first replica, then we shouldn't continue
-                    LOG.exception(_(
-                        "Could not create replica %(num)d of %(count)d.")
-                        % {'num': replica_number, 'count': len(instance_id)})
-                    if replica_number == 1:
-                        raise
+            # The first replica takes the snapshot that all the others are
+            # restored from, so it is created before any of them are started.
+            try:
+                instance_tasks = FreshInstanceTasks.load(context, ids[0])
+                # Other replicas are restored from the stored snapshot.
+                direct_stream = (CONF.replication_direct_stream and
+                                 len(ids) == 1)
+                snapshot = instance_tasks.get_replication_master_snapshot(
+                    context, slave_of_id, flavor, replica_backup_id,
+                    replica_number=1, direct_stream=direct_stream)
+                replica_backup_id = snapshot['dataset']['snapshot_id']
+                replica_backup_created = True
+                replica_backup_streamed = bool(
+                    snapshot['dataset'].get('stream'))
+                replicas.append(_create_replica(instance_tasks, 0, snapshot))
+            except Exception:
+                # if it's the first replica, then we shouldn't continue
+                LOG.exception(_(
+                    "Could not create replica %(num)d of %(count)d.")
+                    % {'num': 1, 'count': len(ids)})
+                if replica_backup_streamed:
+                    self._cancel_replication_stream(
+                        context, slave_of_id, replica_backup_id)
+                raise
+
+            pool = greenpool.GreenPool(CONF.replica_create_pool_size)
+            replicas.extend(replica for replica in
+                            pool.imap(_create_other_replica,
+                                      range(1, len(ids)))
+                            if replica)
+            if failed_replicas:
+                LOG.error(_("Could not create replicas %(failed)s of "
+                            "replica source %(source)s.")
+                          % {'failed': failed_replicas, 'source': slave_of_id})
 
             for replica in replicas:
-                replica.wait_for_instance(CONF.restore_usage_timeout, flavor)
+                pool.spawn_n(replica.wait_for_instance,
+                             CONF.restore_usage_timeout, flavor)
+            pool.waitall()
 
         finally:
             if replica_backup_created:
-                Backup.delete(context, replica_backup_id)
+                # An error deleting the snapshot must not hide the one
+                # creating the replicas.
+                try:
+                    if replica_backup_streamed:
+                        self._wait_for_replication_stream(
+                            context, replica_backup_id)
+                    Backup.delete(context, replica_backup_id)
+                except Exception:
+                    LOG.exception(_("Could not delete replication snapshot "
+                                    "%s.") % replica_backup_id)
+
+    def _cancel_replication_stream(self, context, slave_of_id, backup_id):
+        """Stop the replica source from waiting to stream snapshot backup_id
+        to a replica that failed to build, and from storing the snapshot
+        once it gives up on the replica.
+        """
+        try:
+            master = BuiltInstanceTasks.load(context, slave_of_id)
+            master.cancel_replication_snapshot(backup_id)
+            # Unless the replica connected, the snapshot never starts.
+            Backup.fail_unstarted(backup_id)
+        except Exception:
+            LOG.exception(_("Could not cancel streaming replication "
+                            "snapshot %s.") % backup_id)
+
+    def _wait_for_replication_stream(self, context, backup_id):
+        """Wait for the replica source to finish streaming snapshot
+        backup_id, which cannot be deleted while it runs.
+        """
+        try:
+            utils.poll_until(
+                lambda: Backup.get_by_id(context, backup_id),
+                lambda backup: not backup.is_running,
+                sleep_time=2, time_out=CONF.replication_stream_timeout)
+        except exception.PollTimeOut:
+            LOG.warning(_("Replication snapshot %s is still running.")
+                        % backup_id)
 
     def create_instance(self, context, instance_id, name, flavor,
                         image_id, databases, users, datastore_manager,
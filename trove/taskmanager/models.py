@@ -12,14 +12,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import json
 import os.path
 import re
 import traceback
 
 from cinderclient import exceptions as cinder_exceptions
+from eventlet import greenpool
 from eventlet import greenthread
 from heatclient import exc as heat_exceptions
-from novaclient import exceptions as nova_exceptions
 from oslo_utils import timeutils
 from swiftclient.client import ClientException
 
@@ -31,6 +33,7 @@ from trove.cluster.models import Cluster
 from trove.cluster.models import DBCluster
 from trove.cluster import tasks
 from trove.common import cfg
+from trove.common import chunk_index
 from trove.common import exception
 from trove.common.exception import BackupCreationError
 from trove.common.exception import GuestError
@@ -67,6 +70,7 @@ from trove.instance.tasks import InstanceTasks
 from trove.openstack.common import log as logging
 from trove.quota.quota import run_with_quotas
 from trove import rpc
+from trove.taskmanager import server_watcher
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
@@ -214,6 +218,37 @@ class ClusterTasks(Cluster):
                                           instance.db_info.id,
                                           instance.datastore_version.manager)
 
+    @classmethod
+    def _call_members(cls, call, func, members):
+        """Runs func(member) for every member concurrently, with at most
+        cluster_member_call_pool_size calls in flight, and returns the
+        results in the order of members.
+
+        The calls are independent of each other, so one failing does not
+        stop the others. Every failure is logged and, once all the calls
+        have finished, ClusterMemberCallsFailed is raised for the lot.
+        """
+        def _call_member(member):
+            try:
+                return func(member), None
+            except Exception:
+                LOG.exception(_("%(call)s failed on cluster member "
+                                "%(member)s.") %
+                              {'call': call, 'member': member.id})
+                return None, member.id
+
+        pool = greenpool.GreenPool(CONF.cluster_member_call_pool_size)
+        results = []
+        failed_ids = []
+        for result, failed_id in pool.imap(_call_member, members):
+            results.append(result)
+            if failed_id:
+                failed_ids.append(failed_id)
+        if failed_ids:
+            raise exception.ClusterMemberCallsFailed(call=call,
+                                                     members=failed_ids)
+        return results
+
     def _all_instances_ready(self, instance_ids, cluster_id,
                              shard_id=None):
 
@@ -416,6 +451,11 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
                                'type': backup.backup_type,
                                'checksum': backup.checksum,
                                }
+                stream = snapshot and snapshot['dataset'].get('stream')
+                if stream:
+                    # The snapshot is streamed from the replica source.
+                    backup_info.update({'type': stream['type'],
+                                        'stream': stream})
         self._guest_prepare(flavor['ram'], volume_info,
                             packages, databases, users, backup_info,
                             config.config_contents, root_password,
@@ -455,10 +495,14 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
             self._log_and_raise(e, msg, err)
 
     def get_replication_master_snapshot(self, context, slave_of_id, flavor,
-                                        backup_id=None, replica_number=1):
+                                        backup_id=None, replica_number=1,
+                                        direct_stream=False):
+        if direct_stream:
+            # The source streams a full snapshot straight to the replica.
+            backup_id = None
         # if we aren't passed in a backup id, look it up to possibly do
         # an incremental backup, thus saving time
-        if not backup_id:
+        elif not backup_id:
             backup = Backup.get_last_completed(
                 context, slave_of_id, include_incremental=True)
             if backup:
@@ -507,6 +551,7 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
                 'id': replica_backup_id,
                 'datastore': master.datastore.name,
                 'datastore_version': master.datastore_version.name,
+                'direct_stream': direct_stream,
             })
             snapshot = master.get_replication_snapshot(
                 snapshot_info, flavor=master.flavor_id)
@@ -904,10 +949,6 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
                       {'gt': greenthread.getcurrent(), 'id': self.id})
             dns_client = create_dns_client(self.context)
 
-            def get_server():
-                c_id = self.db_info.compute_instance_id
-                return self.nova_client.servers.get(c_id)
-
             def ip_is_available(server):
                 LOG.debug("Polling for ip addresses: $%s " % server.addresses)
                 if server.addresses != {}:
@@ -923,10 +964,10 @@ class FreshInstanceTasks(FreshInstance, NotifyMixin, ConfigurationMixin):
                               {'instance': self.id, 'status': server.status})
                     raise TroveError(status=server.status)
 
-            utils.poll_until(get_server, ip_is_available,
-                             sleep_time=1, time_out=DNS_TIME_OUT)
-            server = self.nova_client.servers.get(
-                self.db_info.compute_instance_id)
+            server = server_watcher.get_watcher().wait_for_status(
+                self.context, self.nova_client,
+                self.db_info.compute_instance_id, ip_is_available,
+                time_out=DNS_TIME_OUT)
             self.db_info.addresses = server.addresses
             LOG.debug(_("Creating dns entry..."))
             ip = self.dns_ip_address
@@ -1030,22 +1071,19 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin, ConfigurationMixin):
             LOG.exception(_("Error during dns entry of instance %(id)s: "
                             "%(ex)s") % {'id': self.db_info.id, 'ex': ex})
 
-        # Poll until the server is gone.
-        def server_is_finished():
-            try:
-                server = self.nova_client.servers.get(server_id)
-                if not self.server_status_matches(['SHUTDOWN', 'ACTIVE'],
-                                                  server=server):
-                    LOG.error(_("Server %(server_id)s entered ERROR status "
-                                "when deleting instance %(instance_id)s!") %
-                              {'server_id': server.id, 'instance_id': self.id})
-                return False
-            except nova_exceptions.NotFound:
-                return True
+        # Wait until the server is gone.
+        def check_server_status(server):
+            if not self.server_status_matches(['SHUTDOWN', 'ACTIVE'],
+                                              server=server):
+                LOG.error(_("Server %(server_id)s entered ERROR status "
+                            "when deleting instance %(instance_id)s!") %
+                          {'server_id': server.id, 'instance_id': self.id})
 
         try:
-            utils.poll_until(server_is_finished, sleep_time=2,
-                             time_out=CONF.server_delete_time_out)
+            server_watcher.get_watcher().wait_for_delete(
+                self.context, self.nova_client, server_id,
+                on_update=check_server_status,
+                time_out=CONF.server_delete_time_out)
         except PollTimeOut:
             LOG.exception(_("Failed to delete instance %(instance_id)s: "
                             "Timeout deleting compute server %(server_id)s") %
@@ -1120,6 +1158,10 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin, ConfigurationMixin):
         return run_with_quotas(self.context.tenant, {'backups': 1},
                                _get_replication_snapshot)
 
+    def cancel_replication_snapshot(self, snapshot_id):
+        LOG.debug("Calling cancel_replication_snapshot on %s." % self.id)
+        self.guest.cancel_replication_snapshot(snapshot_id)
+
     def detach_replica(self, master, for_failover=False):
         LOG.debug("Calling detach_replica on %s" % self.id)
         try:
@@ -1234,17 +1276,15 @@ class BuiltInstanceTasks(BuiltInstance, NotifyMixin, ConfigurationMixin):
 
             LOG.info(_("Rebooting instance %s.") % self.id)
             self.server.reboot()
-            # Poll nova until instance is active
+            # Wait for nova to report the instance as active
             reboot_time_out = CONF.reboot_time_out
 
-            def update_server_info():
-                self.refresh_compute_server_info()
-                return self.server_status_matches(['ACTIVE'])
+            def server_is_active(server):
+                return self.server_status_matches(['ACTIVE'], server=server)
 
-            utils.poll_until(
-                update_server_info,
-                sleep_time=2,
-                time_out=reboot_time_out)
+            self.server = server_watcher.get_watcher().wait_for_status(
+                self.context, self.nova_client, self.server.id,
+                server_is_active, time_out=reboot_time_out)
 
             # Set the status to PAUSED. The guest agent will reset the status
             # when the reboot completes and MySQL is running.
@@ -1383,54 +1423,322 @@ class BackupTasks(object):
         return container, prefix
 
     @classmethod
-    def delete_files_from_swift(cls, context, filename):
+    def delete_unreferenced_chunks(cls, context, client, container):
+        """Delete the chunks of deduplicated backups no index refers to.
+
+        A backup being built may reuse chunks it has seen in the container
+        without having written its index yet, so the chunks are collected
+        in two steps. Unreferenced chunks are first set aside as fossils,
+        which backups started afterwards do not see and upload again if
+        they need them. A fossil is deleted by a later collection, once
+        backup_chunk_collection_grace has passed and the backups that were
+        running when it was set aside have finished. Chunks set aside that
+        the index of one of them refers to are put back.
+        """
+        # Looked up before the indexes are read, so that the index of a
+        # backup finishing in between is read.
+        running = Backup.running_for_tenant(context.tenant)
+        expiry = timeutils.utcnow()
+        if running:
+            expiry = min(expiry, running.created)
+        expiry -= datetime.timedelta(
+            seconds=CONF.backup_chunk_collection_grace)
+
+        headers, objects = client.get_container(container, full_listing=True)
+        chunks = set()
+        fossils = []
+        expired = []
+        indexes = {}
+        for obj in objects:
+            name = obj['name']
+            if name.startswith(chunk_index.CHUNK_PREFIX):
+                chunks.add(name)
+            elif name.startswith(chunk_index.FOSSIL_PREFIX):
+                fossils.append(name)
+                set_aside = timeutils.normalize_time(
+                    timeutils.parse_isotime(obj['last_modified']))
+                if set_aside < expiry:
+                    expired.append(name)
+            elif obj.get('content_type') == chunk_index.CONTENT_TYPE:
+                indexes[name] = obj.get('hash')
+        referenced = cls._referenced_chunks(client, container, indexes)
+
+        revived = [(fossil, chunk_index.chunk_name(fossil))
+                   for fossil in sorted(fossils)]
+        revived = [(fossil, chunk) for fossil, chunk in revived
+                   if chunk in referenced and chunk not in chunks]
+        if revived:
+            LOG.warning(_("Putting back %d backup chunks set aside while "
+                          "backups were using them.") % len(revived))
+            cls._copy_objects(context, container, revived)
+        cls._delete_objects(context, container, sorted(expired))
+
+        unreferenced = sorted(chunks - referenced)
+        cls._copy_objects(context, container,
+                          [(chunk, chunk_index.fossil_name(chunk))
+                           for chunk in unreferenced])
+        cls._delete_objects(context, container, unreferenced)
+
+    @classmethod
+    def _referenced_chunks(cls, client, container, indexes):
+        """Return the names of the chunks the indexes refer to.
+
+        The chunks of every index are recorded in the container, so that
+        only the indexes written since the last collection are read.
+
+        :param indexes: the etags of the indexes by name.
+        """
+        try:
+            headers, contents = client.get_object(container,
+                                                  chunk_index.REFERENCES)
+            recorded = chunk_index.loads_references(contents)
+        except ClientException as e:
+            if e.http_status != 404:
+                raise
+            recorded = {}
+
+        references = {}
+        for name, etag in indexes.items():
+            if recorded.get(name, {}).get('hash') == etag:
+                references[name] = recorded[name]
+                continue
+            headers, contents = client.get_object(container, name)
+            chunks = set(chunk['name']
+                         for chunk in chunk_index.loads(contents))
+            references[name] = {'hash': etag, 'chunks': sorted(chunks)}
+        if references != recorded:
+            client.put_object(container, chunk_index.REFERENCES,
+                              chunk_index.dumps_references(references),
+                              content_type='application/json')
+        return set(chunk for reference in references.values()
+                   for chunk in reference['chunks'])
+
+    @classmethod
+    def _copy_objects(cls, context, container, copies):
+        """Copy objects within the container on the swift side,
+        backup_delete_concurrency at a time.
+
+        :param copies: (source, destination) pairs of object names.
+        The last error is raised if an object was not copied.
+        """
+        # A swift client connection cannot be shared by concurrent
+        # requests, each copy borrows one.
+        clients = []
+        failures = []
+
+        def _copy(source, destination):
+            client = (clients.pop() if clients
+                      else remote.create_swift_client(context))
+            try:
+                LOG.debug("Copying file: %(cont)s/%(src)s to %(dest)s" %
+                          {'cont': container, 'src': source,
+                           'dest': destination})
+                client.put_object(container, destination, None,
+                                  headers={'X-Copy-From': '/%s/%s' %
+                                           (container, source)})
+            except Exception as e:
+                failures.append(e)
+            finally:
+                clients.append(client)
+
+        pool = greenpool.GreenPool(CONF.backup_delete_concurrency)
+        for source, destination in copies:
+            pool.spawn_n(_copy, source, destination)
+        pool.waitall()
+        if failures:
+            LOG.error(_("Unable to copy %(count)d files in %(cont)s.") %
+                      {'count': len(failures), 'cont': container})
+            raise failures[-1]
+
+    @classmethod
+    def _list_objects(cls, client, container, prefix):
+        """Yield the names of the objects with prefix, one listing page
+        after the other.
+        """
+        marker = None
+        while True:
+            headers, objects = client.get_container(container, prefix=prefix,
+                                                    marker=marker)
+            if not objects:
+                return
+            for obj in objects:
+                if obj.get('name'):
+                    yield obj['name']
+            marker = objects[-1]['name']
+
+    @classmethod
+    def _delete_objects(cls, context, container, names):
+        """Delete the objects names, backup_delete_concurrency at a time.
+
+        The deletions that failed are retried up to backup_delete_retries
+        times, backing off in between; objects already gone count as
+        deleted. The last error is raised if objects are left.
+        """
+        # A swift client connection cannot be shared by concurrent
+        # requests, each deletion borrows one.
+        clients = []
+        failures = []
+
+        def _delete(name):
+            client = (clients.pop() if clients
+                      else remote.create_swift_client(context))
+            try:
+                LOG.debug("Deleting file: %(cont)s/%(name)s" %
+                          {'cont': container, 'name': name})
+                client.delete_object(container, name)
+            except ClientException as e:
+                if e.http_status != 404:
+                    failures.append((name, e))
+            except Exception as e:
+                failures.append((name, e))
+            finally:
+                clients.append(client)
+
+        pool = greenpool.GreenPool(CONF.backup_delete_concurrency)
+        for attempt in range(CONF.backup_delete_retries + 1):
+            if attempt:
+                LOG.warning(_("Retrying the deletion of %(count)d files from "
+                              "%(cont)s.") % {'count': len(failures),
+                                              'cont': container})
+                greenthread.sleep(2 ** (attempt - 1))
+                names = [name for name, error in failures]
+                del failures[:]
+            for name in names:
+                pool.spawn_n(_delete, name)
+            pool.waitall()
+            if not failures:
+                return
+        name, error = failures[-1]
+        LOG.error(_("Unable to delete %(count)d files from %(cont)s, the "
+                    "last being %(name)s.") % {'count': len(failures),
+                                               'cont': container,
+                                               'name': name})
+        raise error
+
+    @classmethod
+    def delete_files_from_swift(cls, context, filename, collect_chunks=True):
+        """Delete the files of the backup saved as filename, returning
+        whether it was deduplicated.
+
+        The chunks of a deduplicated backup no other backup refers to are
+        only deleted along with it if collect_chunks is set.
+        """
         container = CONF.backup_swift_container
         client = remote.create_swift_client(context)
         obj = client.head_object(container, filename)
+        if obj.get('content-type') == chunk_index.CONTENT_TYPE:
+            # A deduplicated backup; its chunks may be shared with others.
+            cls._delete_objects(context, container, [filename])
+            if collect_chunks:
+                cls.delete_unreferenced_chunks(context, client, container)
+            return True
         manifest = obj.get('x-object-manifest', '')
         cont, prefix = cls._parse_manifest(manifest)
         if all([cont, prefix]):
             # This is a manifest file, first delete all segments.
             LOG.debug("Deleting files with prefix: %(cont)s/%(prefix)s" %
                       {'cont': cont, 'prefix': prefix})
-            # list files from container/prefix specified by manifest
-            headers, segments = client.get_container(cont, prefix=prefix)
-            LOG.debug(headers)
-            for segment in segments:
-                name = segment.get('name')
-                if name:
-                    LOG.debug("Deleting file: %(cont)s/%(name)s" %
-                              {'cont': cont, 'name': name})
-                    client.delete_object(cont, name)
-        # Delete the manifest file
-        LOG.debug("Deleting file: %(cont)s/%(filename)s" %
-                  {'cont': cont, 'filename': filename})
-        client.delete_object(container, filename)
+            # The segments are deleted as the listing is paged through.
+            cls._delete_objects(context, cont,
+                                cls._list_objects(client, cont, prefix))
+        # Delete the manifest file, once no segment is left behind.
+        cls._delete_objects(context, container, [filename])
+        return False
 
     @classmethod
-    def delete_backup(cls, context, backup_id):
-        """Delete backup from swift."""
-        LOG.info(_("Deleting backup %s.") % backup_id)
-        backup = bkup_models.Backup.get_by_id(context, backup_id)
+    def _delete_backup_files(cls, context, backup):
+        """Delete the files of backup from swift, returning whether it was
+        deduplicated.
+        """
         try:
             filename = backup.filename
-            if filename:
-                BackupTasks.delete_files_from_swift(context, filename)
         except ValueError:
-            backup.delete()
+            return False
+        if not filename:
+            return False
+        try:
+            return cls.delete_files_from_swift(context, filename,
+                                               collect_chunks=False)
         except ClientException as e:
             if e.http_status == 404:
                 # Backup already deleted in swift
-                backup.delete()
-            else:
-                LOG.exception(_("Error occurred when deleting from swift. "
-                                "Details: %s") % e)
+                return False
+            raise
+
+    @classmethod
+    def delete_backup(cls, context, backup_id):
+        """Delete backup and the incremental backups based on it from swift.
+
+        The files of the backups of the chain are deleted concurrently,
+        the progress being reported on the backup; it is only deleted
+        once all of them are. The backups whose files could not be
+        deleted are left DELETE_FAILED, along with the backup.
+        """
+        LOG.info(_("Deleting backup %s.") % backup_id)
+        backup = bkup_models.Backup.get_by_id(context, backup_id)
+        try:
+            cls._delete_chain(context, backup)
+        except Exception:
+            # Left DELETE_PENDING, its deletion could not be requested
+            # again.
+            if backup.state == bkup_models.BackupState.DELETE_PENDING:
                 backup.state = bkup_models.BackupState.DELETE_FAILED
                 backup.save()
-                raise TroveError("Failed to delete swift object for backup %s."
-                                 % backup_id)
-        else:
-            backup.delete()
+            raise
+
+    @classmethod
+    def _delete_chain(cls, context, backup):
+        backup_id = backup.id
+        # Only the incremental backups marked along with the backup are
+        # deleted, not those started since.
+        chain = [member for member in bkup_models.Backup.chain(backup)
+                 if member is backup or
+                 member.state == bkup_models.BackupState.DELETE_PENDING]
+        progress = {'deleted': 0, 'total': len(chain)}
+        failed = []
+        deduplicated = []
+
+        def _delete(member):
+            # Even partly deleted, its files are no longer to be trusted.
+            bkup_models.SWIFT_CHECK_CACHE.invalidate(member.location)
+            try:
+                if cls._delete_backup_files(context, member):
+                    deduplicated.append(member.id)
+            except Exception:
+                LOG.exception(_("Error occurred when deleting backup %s "
+                                "from swift.") % member.id)
+                failed.append(member)
+                return
+            if member is not backup:
+                member.delete()
+            progress['deleted'] += 1
+            backup.progress = json.dumps(progress)
+            backup.save()
+
+        pool = greenpool.GreenPool(CONF.backup_delete_concurrency)
+        for member in reversed(chain):
+            pool.spawn_n(_delete, member)
+        pool.waitall()
+
+        if deduplicated:
+            try:
+                cls.delete_unreferenced_chunks(
+                    context, remote.create_swift_client(context),
+                    CONF.backup_swift_container)
+            except Exception:
+                # The chunks are collected by a later deletion.
+                LOG.exception(_("Error deleting the unreferenced chunks of "
+                                "backup %s.") % backup_id)
+        if failed:
+            if backup not in failed:
+                failed.append(backup)
+            for member in failed:
+                member.state = bkup_models.BackupState.DELETE_FAILED
+                member.save()
+            raise TroveError("Failed to delete swift objects for %(count)d "
+                             "backups of backup %(id)s."
+                             % {'count': len(failed), 'id': backup_id})
+        backup.delete()
         LOG.info(_("Deleted backup %s successfully.") % backup_id)
 
 
@@ -1805,27 +2113,26 @@ class ResizeActionBase(object):
         LOG.debug("End resize method _perform_nova_action instance: %s" %
                   self.instance.id)
 
+    def _wait_for_server_status(self, condition, time_out):
+        self.instance.server = server_watcher.get_watcher().wait_for_status(
+            self.instance.context, self.instance.nova_client,
+            self.instance.server.id, condition, time_out=time_out)
+
     def _wait_for_nova_action(self):
         # Wait for the flavor to change.
-        def update_server_info():
-            self.instance.refresh_compute_server_info()
-            return not self.instance.server_status_matches(['RESIZE'])
+        def resize_is_finished(server):
+            return not self.instance.server_status_matches(['RESIZE'],
+                                                           server=server)
 
-        utils.poll_until(
-            update_server_info,
-            sleep_time=2,
-            time_out=RESIZE_TIME_OUT)
+        self._wait_for_server_status(resize_is_finished, RESIZE_TIME_OUT)
 
     def _wait_for_revert_nova_action(self):
         # Wait for the server to return to ACTIVE after revert.
-        def update_server_info():
-            self.instance.refresh_compute_server_info()
-            return self.instance.server_status_matches(['ACTIVE'])
+        def server_is_active(server):
+            return self.instance.server_status_matches(['ACTIVE'],
+                                                       server=server)
 
-        utils.poll_until(
-            update_server_info,
-            sleep_time=2,
-            time_out=REVERT_TIME_OUT)
+        self._wait_for_server_status(server_is_active, REVERT_TIME_OUT)
 
 
 class ResizeAction(ResizeActionBase):
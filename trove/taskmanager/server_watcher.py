@@ -0,0 +1,213 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Shared watcher for Nova server state changes.
+
+Rather than having every taskmanager operation poll ``servers.get`` for its
+own server, operations register the server they are waiting on with a single
+watcher. The watcher polls Nova once per interval for each tenant with a
+``servers.list`` restricted by ``changes-since`` and dispatches the new server
+state to every operation waiting on one of the returned servers.
+"""
+
+import datetime
+import sys
+
+import eventlet
+from eventlet import event
+from eventlet import timeout as eventlet_timeout
+from novaclient import exceptions as nova_exceptions
+from oslo_utils import timeutils
+
+from trove.common import cfg
+from trove.common import exception
+from trove.common.i18n import _
+from trove.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+
+# Nova includes deleted servers in a changes-since listing, with this status.
+DELETED_STATUS = 'DELETED'
+# Seconds subtracted from the changes-since marker to allow for clock drift
+# between the taskmanager and the Nova API.
+CHANGES_SINCE_SKEW = 30
+
+_WATCHER = None
+
+
+class _Waiter(object):
+    """A single operation waiting on a server."""
+
+    def __init__(self, server_id, condition, until_deleted=False):
+        self.server_id = server_id
+        self.condition = condition
+        self.until_deleted = until_deleted
+        self.event = event.Event()
+
+    def notify(self, server):
+        """Checks the new state of the server, waking up the operation once
+        its condition is satisfied (or raises).
+
+        :param server: the Nova server, or None if it no longer exists.
+        """
+        if self.event.ready():
+            return
+        try:
+            if server is None:
+                if self.until_deleted:
+                    self.event.send(None)
+                else:
+                    raise nova_exceptions.NotFound(
+                        404, "Server %s not found." % self.server_id)
+            elif self.condition(server) and not self.until_deleted:
+                self.event.send(server)
+        except Exception:
+            self.event.send_exception(*sys.exc_info())
+
+
+class _TenantWatch(object):
+    """Servers watched on behalf of a single tenant."""
+
+    def __init__(self, nova_client):
+        self.nova_client = nova_client
+        self.waiters = {}
+        self.unseeded = set()
+        self.changes_since = None
+
+
+class ServerStateWatcher(object):
+    """Batches the Nova polling of all servers the taskmanager is waiting on.
+
+    A single greenthread is started on demand while there are waiters and
+    exits once the last of them has been dispatched.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or CONF.server_watcher_interval
+        self._tenants = {}
+        self._thread = None
+
+    def wait_for_status(self, context, nova_client, server_id, condition,
+                        time_out=None):
+        """Waits until condition(server) is true and returns the server.
+
+        Raises NotFound if the server disappears and PollTimeOut once
+        time_out seconds have passed.
+        """
+        waiter = _Waiter(server_id, condition)
+        return self._wait(context, nova_client, waiter, time_out)
+
+    def wait_for_delete(self, context, nova_client, server_id,
+                        on_update=None, time_out=None):
+        """Waits until the server is gone.
+
+        on_update(server) is called with every state seen before that.
+        """
+        waiter = _Waiter(server_id, on_update or (lambda server: False),
+                         until_deleted=True)
+        self._wait(context, nova_client, waiter, time_out)
+
+    def _wait(self, context, nova_client, waiter, time_out):
+        self._add_waiter(context.tenant, nova_client, waiter)
+        timer = eventlet_timeout.Timeout(time_out)
+        try:
+            return waiter.event.wait()
+        except eventlet_timeout.Timeout as t:
+            if t is not timer:
+                raise
+            raise exception.PollTimeOut
+        finally:
+            timer.cancel()
+            self._remove_waiter(context.tenant, waiter)
+
+    def _add_waiter(self, tenant, nova_client, waiter):
+        watch = self._tenants.get(tenant)
+        if watch is None:
+            watch = self._tenants[tenant] = _TenantWatch(nova_client)
+        # Keep the most recently issued client, its token is the freshest.
+        watch.nova_client = nova_client
+        watch.waiters.setdefault(waiter.server_id, []).append(waiter)
+        watch.unseeded.add(waiter.server_id)
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def _remove_waiter(self, tenant, waiter):
+        watch = self._tenants.get(tenant)
+        if watch is None:
+            return
+        waiters = watch.waiters.get(waiter.server_id, [])
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            watch.waiters.pop(waiter.server_id, None)
+            watch.unseeded.discard(waiter.server_id)
+        if not watch.waiters:
+            del self._tenants[tenant]
+
+    def _run(self):
+        try:
+            while self._tenants:
+                for watch in self._tenants.values():
+                    self._poll(watch)
+                if self._tenants:
+                    eventlet.sleep(self.interval)
+        finally:
+            self._thread = None
+
+    def _poll(self, watch):
+        poll_started = timeutils.utcnow()
+        servers = {}
+        if watch.changes_since is not None:
+            since = watch.changes_since - datetime.timedelta(
+                seconds=CHANGES_SINCE_SKEW)
+            try:
+                changed = watch.nova_client.servers.list(
+                    search_opts={'changes-since': timeutils.isotime(since)})
+            except Exception:
+                # Leave the marker alone so the next poll covers the gap.
+                LOG.exception(_("Error listing changed compute servers."))
+                poll_started = watch.changes_since
+            else:
+                for server in changed:
+                    if server.id in watch.waiters:
+                        servers[server.id] = server
+        # Servers seen for the first time are fetched individually, since
+        # they will not show up in a changes-since listing unless they change.
+        failed = set()
+        while watch.unseeded:
+            server_id = watch.unseeded.pop()
+            try:
+                servers[server_id] = watch.nova_client.servers.get(server_id)
+            except nova_exceptions.NotFound:
+                servers[server_id] = None
+            except Exception:
+                LOG.exception(_("Error getting compute server %s.")
+                              % server_id)
+                failed.add(server_id)
+        watch.unseeded.update(failed)
+        watch.changes_since = poll_started
+
+        for server_id, server in servers.items():
+            if server is not None and server.status == DELETED_STATUS:
+                server = None
+            for waiter in list(watch.waiters.get(server_id, [])):
+                waiter.notify(server)
+
+
+def get_watcher():
+    global _WATCHER
+    if _WATCHER is None:
+        _WATCHER = ServerStateWatcher()
+    return _WATCHER
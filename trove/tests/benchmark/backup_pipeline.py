@@ -0,0 +1,548 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Backup pipeline benchmark.
+
+Streams a synthetic backup through BackupAgent.stream_backup_to_storage
+into SwiftStorage, then restores it with BackupAgent.execute_restore, and
+reports the throughput, CPU time and peak RSS of each stage of both
+pipelines. Swift is stood in for by a local HTTP server storing objects the
+way the fake swift connection of the tests does, in a process of its own so
+that it does not count against the agent, e.g.:
+
+    python -m trove.tests.benchmark.backup_pipeline --size 256 \
+        --compressibility 0.6 --codec lz4 --workers 4 --segment-size 32 \
+        --upload-concurrency 4 --download-concurrency 4
+"""
+
+import argparse
+import BaseHTTPServer
+import functools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import SocketServer
+import sys
+import time
+import urlparse
+
+import eventlet
+from mock import MagicMock
+from mock import patch
+from swiftclient import client as swift_client
+
+from trove.common import cfg
+from trove.common.context import TroveContext
+from trove.guestagent.backup import backupagent
+from trove.guestagent.common import encryption
+from trove.guestagent.strategies.backup import base as backup_base
+from trove.guestagent.strategies import compression
+from trove.guestagent.strategies.restore import base as restore_base
+from trove.guestagent.strategies.storage import swift
+from trove.tests.fakes.swift import FakeSwiftConnection
+
+CONF = cfg.CONF
+
+MEGABYTE = 1024 * 1024
+ACCOUNT_PATH = '/v1/AUTH_benchmark'
+LISTING_LIMIT = 10000
+# Random data the synthetic backup is cut from, larger than the windows of
+# the codecs so that it does not compress.
+RANDOM_POOL_SIZE = 4 * MEGABYTE
+FILLER = 'INSERT INTO `orders` VALUES (1,"alpha","bravo",42,3.14);\n'
+
+
+class SwiftStore(FakeSwiftConnection):
+    """The fake swift connection, serving manifests and listings the way
+    swift does so that backups can be restored from it.
+    """
+
+    def get_container(self, container, prefix=None, marker=None,
+                      limit=LISTING_LIMIT, **kwargs):
+        # Only the segments of manifests are listed, by their prefix.
+        headers, listing = super(SwiftStore, self).get_container(
+            container, prefix=prefix)
+        listing = [item for item in listing
+                   if marker is None or item['name'] > marker]
+        return headers, listing[:limit]
+
+    def get_object(self, container, name, resp_chunk_size=None):
+        if self.manifest_prefix and name == self.manifest_name:
+            headers = self.head_object(container, name)
+            prefix = self.manifest_prefix.split('/', 1)[1]
+            return headers, ''.join(
+                self.container_objects[segment]
+                for segment in sorted(self.container_objects)
+                if segment.startswith(prefix))
+        if name not in self.container_objects:
+            raise swift_client.ClientException('Object GET failed',
+                                               http_status=404)
+        return super(SwiftStore, self).get_object(container, name)
+
+
+class SwiftHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the object API of swift from the store of the server."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        url = urlparse.urlparse(self.path)
+        path = urlparse.unquote(url.path)
+        if not path.startswith(ACCOUNT_PATH + '/'):
+            return None, None, {}
+        container, _sep, name = path[len(ACCOUNT_PATH) + 1:].partition('/')
+        query = dict(urlparse.parse_qsl(url.query))
+        return container, name, query
+
+    def _read_body(self):
+        if self.headers.get('transfer-encoding', '').lower() != 'chunked':
+            return self.rfile.read(int(self.headers.get('content-length',
+                                                        0)))
+        chunks = []
+        while True:
+            length = int(self.rfile.readline().split(';')[0], 16)
+            if not length:
+                self.rfile.readline()
+                return ''.join(chunks)
+            chunks.append(self.rfile.read(length))
+            self.rfile.readline()
+
+    def _respond(self, status, headers=None, body=''):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if self.command != 'HEAD':
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_PUT(self):
+        store = self.server.store
+        container, name, query = self._parse()
+        body = self._read_body()
+        if not name:
+            return self._respond(201)
+        headers = {}
+        manifest = self.headers.get(store.MANIFEST_HEADER_KEY)
+        if manifest:
+            headers[store.MANIFEST_HEADER_KEY] = manifest
+        etag = store.put_object(container, name, body, headers=headers)
+        self._respond(201, {'Etag': etag})
+
+    def do_HEAD(self):
+        container, name, query = self._parse()
+        if name not in self.server.store.container_objects and (
+                name != self.server.store.manifest_name):
+            return self._respond(404)
+        self._respond(200, self.server.store.head_object(container, name))
+
+    def do_GET(self):
+        container, name, query = self._parse()
+        if not name:
+            headers, listing = self.server.store.get_container(
+                container, prefix=query.get('prefix'),
+                marker=query.get('marker'),
+                limit=int(query.get('limit', LISTING_LIMIT)))
+            return self._respond(200,
+                                 {'Content-Type': 'application/json'},
+                                 json.dumps(listing))
+        try:
+            headers, body = self.server.store.get_object(container, name)
+        except swift_client.ClientException as e:
+            return self._respond(e.http_status)
+        self._respond(200, headers, body)
+
+    def do_POST(self):
+        self._read_body()
+        self._respond(202)
+
+    def do_DELETE(self):
+        container, name, query = self._parse()
+        self.server.store.container_objects.pop(name, None)
+        self._respond(204)
+
+
+class SwiftServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           SwiftHandler)
+        self.store = SwiftStore()
+
+
+def serve_swift(ports):
+    server = SwiftServer()
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_swift():
+    """Start the swift stand-in in a process, returning the process and
+    the storage url of its account.
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve_swift, args=(ports,))
+    process.daemon = True
+    process.start()
+    return process, 'http://127.0.0.1:%d%s' % (ports.get(), ACCOUNT_PATH)
+
+
+def cpu_time():
+    """CPU time of the process, counting the native threads the codecs
+    run on.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def rss():
+    """Resident set size of the process, in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # Only the peak is known, in kilobytes.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Stage(object):
+    """Bytes put out by a stage of a pipeline, with the time, CPU time and
+    peak RSS of the calls to it.
+
+    A stage is called by the stage after it and calls the stage before it,
+    so its time includes that of the stages before it; report subtracts
+    them. Uploads and downloads running concurrently overlap the other
+    stages, which blurs the split between them.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.cpu = 0.0
+        self.peak_rss = 0
+
+    def call(self, function, *args, **kwargs):
+        started = time.time()
+        cpu = cpu_time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.elapsed += time.time() - started
+            self.cpu += cpu_time() - cpu
+            self.peak_rss = max(self.peak_rss, rss())
+
+
+class MeteredReader(object):
+    """File-like reader counting the reads of another one against a
+    stage.
+    """
+
+    def __init__(self, stage, reader):
+        self.stage = stage
+        self.reader = reader
+
+    def read(self, *args):
+        data = self.stage.call(self.reader.read, *args)
+        self.stage.bytes += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
+
+
+def metered_chunks(stage, chunks):
+    """Yield the chunks of an iterable, counted against stage."""
+    chunks = iter(chunks)
+    while True:
+        try:
+            chunk = stage.call(next, chunks)
+        except StopIteration:
+            return
+        stage.bytes += len(chunk)
+        yield chunk
+
+
+class MeteredCompression(object):
+    """Compression strategy whose streams are counted against the
+    compression and decompression stages.
+    """
+
+    def __init__(self, stages, compressor):
+        self.stages = stages
+        self.compressor = compressor
+
+    def compress(self, stream, workers):
+        return MeteredReader(self.stages['compression'],
+                             self.compressor.compress(stream, workers))
+
+    def decompress(self, chunks):
+        return metered_chunks(self.stages['decompression'],
+                              self.compressor.decompress(chunks))
+
+    def __getattr__(self, name):
+        return getattr(self.compressor, name)
+
+
+class SyntheticData(object):
+    """File-like reader of size bytes of data, of which about a
+    compressibility fraction is filler text and the rest random bytes.
+    """
+
+    def __init__(self, size, compressibility):
+        self.random = random.Random(size)
+        self.pool = os.urandom(RANDOM_POOL_SIZE)
+        self.remaining = size
+        self.compressibility = compressibility
+
+    def read(self, size):
+        size = min(size, self.remaining)
+        self.remaining -= size
+        filler = int(size * self.compressibility)
+        offset = self.random.randint(0, RANDOM_POOL_SIZE - (size - filler))
+        text = FILLER * (filler // len(FILLER) + 1)
+        return self.pool[offset:offset + size - filler] + text[:filler]
+
+
+class SyntheticBackup(backup_base.BackupRunner):
+    """Backup of synthetic data, compressed and encrypted by the agent."""
+    __strategy_name__ = 'syntheticbackup'
+    cmd = ''
+
+    def __init__(self, filename, settings=None, stages=None, **kwargs):
+        self.settings = settings
+        self.stages = stages
+        self.is_zipped = settings.compressor is not None
+        self.is_encrypted = settings.encrypt
+        self.encrypt_in_agent = True
+        self.compression_workers = settings.workers
+        self.encryption_workers = settings.workers
+        if self.is_zipped:
+            kwargs['compressor'] = MeteredCompression(stages,
+                                                      settings.compressor)
+        super(SyntheticBackup, self).__init__(filename, **kwargs)
+
+    def _run(self):
+        self.stream = self._agent_stages(MeteredReader(
+            self.stages['source'],
+            SyntheticData(self.settings.size, self.settings.compressibility)))
+        if self.is_encrypted:
+            # Encryption is the last of the stages of the agent.
+            self.stream = MeteredReader(self.stages['encryption'],
+                                        self.stream)
+
+
+class SyntheticRestore(restore_base.RestoreRunner):
+    """Restore of a synthetic backup, discarding the data."""
+    __strategy_name__ = 'syntheticrestore'
+    base_restore_cmd = 'cat > /dev/null'
+
+    def __init__(self, storage, settings=None, stages=None, **kwargs):
+        self.stages = stages
+        self.is_zipped = settings.compressor is not None
+        self.is_encrypted = settings.encrypt
+        self.compression_workers = settings.workers
+        super(SyntheticRestore, self).__init__(storage, **kwargs)
+
+    def _compressor(self, location):
+        compressor = super(SyntheticRestore, self)._compressor(location)
+        if compressor is None:
+            return None
+        return MeteredCompression(self.stages, compressor)
+
+    def restore(self):
+        return self.stages['restore'].call(
+            super(SyntheticRestore, self).restore)
+
+
+class Settings(object):
+    """The settings of the backup, from the command line."""
+
+    def __init__(self, args):
+        self.size = args.size * MEGABYTE
+        self.compressibility = args.compressibility
+        self.compressor = get_compressor(args.codec)
+        self.encrypt = not args.no_encryption
+        self.workers = max(1, args.workers)
+        self.segment_size = args.segment_size * MEGABYTE
+
+
+def get_compressor(codec):
+    if codec == 'none':
+        return None
+    name, _sep, level = codec.partition(':')
+    strategy = compression.get_compression_strategy(name.capitalize())
+    compressor = strategy(level=int(level) if level else None)
+    if not compressor.is_enabled():
+        sys.exit("The %s compression is not available." % name)
+    return compressor
+
+
+def make_stages(*names):
+    return dict((name, Stage(name)) for name in names)
+
+
+def run_backup(settings, agent, conductor):
+    """Stream a backup to swift, returning its stages and the backup
+    info to restore it with.
+    """
+    stages = make_stages('source', 'compression', 'encryption',
+                         'segmenting', 'upload')
+    storage = swift.SwiftStorage(TroveContext())
+    storage.save = functools.partial(stages['upload'].call, storage.save)
+    stream_reader = swift.StreamReader
+
+    def _segment(stream, filename, **kwargs):
+        return MeteredReader(stages['segmenting'],
+                             stream_reader(stream, filename,
+                                           max_file_size=settings.segment_size,
+                                           **kwargs))
+
+    runner = functools.partial(SyntheticBackup, settings=settings,
+                               stages=stages)
+    backup_info = {'id': 'benchmark', 'datastore': 'mysql',
+                   'datastore_version': '5.6'}
+    with patch.object(swift, 'StreamReader', _segment):
+        agent.stream_backup_to_storage(backup_info, runner, storage)
+    stages['upload'].bytes = stages['segmenting'].bytes
+    # The location and checksum of the backup, as sent to the conductor.
+    backup_info.update(conductor.update_backup.call_args[1])
+    backup_info['type'] = SyntheticRestore.__name__
+    return stages, backup_info
+
+
+def run_restore(settings, agent, backup_info):
+    stages = make_stages('download', 'decryption', 'decompression',
+                         'restore')
+    storage = swift.SwiftStorage(TroveContext())
+    load = storage.load
+    storage.load = lambda location, checksum: metered_chunks(
+        stages['download'], load(location, checksum))
+    decrypt = encryption.decrypt
+
+    def _decrypt(chunks, password):
+        return metered_chunks(stages['decryption'],
+                              decrypt(chunks, password))
+
+    runner = functools.partial(SyntheticRestore, settings=settings,
+                               stages=stages)
+    with patch.object(encryption, 'decrypt', _decrypt), \
+            patch.object(backupagent, 'get_storage_strategy',
+                         return_value=lambda context: storage), \
+            patch.object(backupagent.BackupAgent, '_get_restore_runner',
+                         return_value=runner):
+        agent.execute_restore(TroveContext(), backup_info, '/dev/null')
+    stages['restore'].bytes = stages['decompression'].bytes or (
+        stages['decryption'].bytes or stages['download'].bytes)
+    return stages
+
+
+def report(title, stages, names, size):
+    """Print the throughput of each stage on the data it read and its CPU
+    time, both exclusive of the stages before it, and the peak RSS of the
+    process while the stage ran.
+    """
+    print(title)
+    print("  %-14s %10s %10s %10s %10s %12s"
+          % ('stage', 'MB in', 'MB out', 'MB/s', 'CPU s', 'peak RSS MB'))
+    upstream = None
+    peak_rss = 0
+    for name in names:
+        stage = stages[name]
+        if not stage.bytes and not stage.elapsed:
+            # The stage is disabled.
+            continue
+        read = upstream.bytes if upstream else stage.bytes
+        elapsed = stage.elapsed - (upstream.elapsed if upstream else 0)
+        cpu = stage.cpu - (upstream.cpu if upstream else 0)
+        # The stages before it ran within its calls.
+        peak_rss = max(peak_rss, stage.peak_rss)
+        print("  %-14s %10.1f %10.1f %10.1f %10.2f %12.1f"
+              % (name, float(read) / MEGABYTE,
+                 float(stage.bytes) / MEGABYTE,
+                 float(read) / MEGABYTE / max(elapsed, 1e-9),
+                 cpu, float(peak_rss) / MEGABYTE))
+        upstream = stage
+    print("  %-14s %10.1f %10s %10.1f %10.2f"
+          % ('total', float(size) / MEGABYTE, '',
+             float(size) / MEGABYTE / max(upstream.elapsed, 1e-9),
+             upstream.cpu))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=64,
+                        help='Size of the backup in MB.')
+    parser.add_argument('--compressibility', type=float, default=0.5,
+                        help='Fraction of the backup that is filler text, '
+                        'the rest being random bytes.')
+    parser.add_argument('--codec', default='gzip',
+                        help='Compression strategy and optional level, e.g. '
+                        'gzip:6, lz4 or none.')
+    parser.add_argument('--no-encryption', action='store_true',
+                        help='Do not encrypt the backup.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of compression and encryption threads.')
+    parser.add_argument('--segment-size', type=int, default=32,
+                        help='Size of the swift segments in MB.')
+    parser.add_argument('--upload-concurrency', type=int, default=1,
+                        help='Number of segments uploaded at the same time.')
+    parser.add_argument('--download-concurrency', type=int, default=1,
+                        help='Number of segments downloaded at the same '
+                        'time.')
+    args = parser.parse_args(argv)
+    settings = Settings(args)
+
+    # The stand-in forks before the agent's sockets turn green.
+    server, url = start_swift()
+    eventlet.monkey_patch(all=True, thread=False)
+    CONF.set_override('backup_upload_concurrency', args.upload_concurrency)
+    CONF.set_override('backup_download_concurrency',
+                      args.download_concurrency)
+
+    def connect(context):
+        return swift_client.Connection(preauthurl=url,
+                                       preauthtoken='benchmark')
+
+    agent = backupagent.BackupAgent()
+    conductor = MagicMock()
+    try:
+        with patch.object(swift, 'create_swift_client', connect), \
+                patch.object(backupagent.conductor_api, 'API',
+                             return_value=conductor), \
+                patch.object(backupagent, 'get_filesystem_volume_stats',
+                             return_value={'used': 0.0}), \
+                patch.object(backupagent.BackupAgent, '_get_compressor',
+                             return_value=settings.compressor):
+            backup_stages, backup_info = run_backup(settings, agent,
+                                                    conductor)
+            report('backup of %d MB' % args.size, backup_stages,
+                   ['source', 'compression', 'encryption', 'segmenting',
+                    'upload'], settings.size)
+            restore_stages = run_restore(settings, agent, backup_info)
+            report('restore of %d MB' % args.size, restore_stages,
+                   ['download', 'decryption', 'decompression', 'restore'],
+                   settings.size)
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Backup compression codec benchmark.
+
+Compresses and decompresses synthetic backup streams with each compression
+strategy and level, and reports the throughput and the compression ratio,
+to help pick the backup_compression_strategy of a datastore, e.g.:
+
+    python -m trove.tests.benchmark.compression --size 64 \
+        --codec gzip:1 --codec gzip:6 --codec lz4:0 --workers 4
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+from trove.guestagent.strategies import compression
+
+READ_SIZE = 64 * 1024
+PAGE_SIZE = 16 * 1024
+
+
+def sql_dump(size):
+    """Text looking like the INSERT statements of a logical dump."""
+    rand = random.Random(size)
+    words = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot']
+    lines = []
+    length = 0
+    row = 0
+    while length < size:
+        line = ("INSERT INTO `orders` VALUES (%d,'%s','%s',%d,%.2f);\n"
+                % (row, rand.choice(words), rand.choice(words),
+                   rand.randint(0, 10 ** 6), rand.random() * 1000))
+        lines.append(line)
+        length += len(line)
+        row += 1
+    return ''.join(lines)[:size]
+
+
+def innodb_pages(size):
+    """Pages of a data file, partly filled with random rows and zeros."""
+    rand = random.Random(size)
+    pages = []
+    for _ in range(size // PAGE_SIZE + 1):
+        used = rand.randint(PAGE_SIZE // 4, PAGE_SIZE)
+        pages.append(os.urandom(used // 4) * 2 +
+                     '\0' * (PAGE_SIZE - used // 2))
+    return ''.join(pages)[:size]
+
+
+DATASETS = {'sql': sql_dump, 'innodb': innodb_pages}
+
+
+def _read_all(reader):
+    chunks = []
+    chunk = reader.read(READ_SIZE)
+    while chunk:
+        chunks.append(chunk)
+        chunk = reader.read(READ_SIZE)
+    return ''.join(chunks)
+
+
+def run_codec(codec, data, workers):
+    name, _sep, level = codec.partition(':')
+    strategy = compression.get_compression_strategy(name.capitalize())
+    compressor = strategy(level=int(level) if level else None)
+    if not compressor.is_enabled():
+        return None
+
+    started = time.time()
+    compressed = _read_all(compressor.compress(io.BytesIO(data), workers))
+    compress_time = time.time() - started
+
+    chunks = [compressed[offset:offset + READ_SIZE]
+              for offset in range(0, len(compressed), READ_SIZE)]
+    started = time.time()
+    decompressed = ''.join(compressor.decompress(chunks))
+    decompress_time = time.time() - started
+    assert decompressed == data, "%s did not round trip." % codec
+    return (float(len(data)) / len(compressed), compress_time,
+            decompress_time)
+
+
+def report(dataset, codec, size, result):
+    if result is None:
+        print("%-8s %-10s not available" % (dataset, codec))
+        return
+    ratio, compress_time, decompress_time = result
+    megabytes = float(size) / 1024 / 1024
+    print("%-8s %-10s ratio %6.2f  compress %8.1f MB/s  "
+          "decompress %8.1f MB/s"
+          % (dataset, codec, ratio, megabytes / max(compress_time, 1e-9),
+             megabytes / max(decompress_time, 1e-9)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=32,
+                        help='Size of each dataset in MB.')
+    parser.add_argument('--dataset', action='append',
+                        choices=sorted(DATASETS),
+                        help='Datasets to compress (default: all).')
+    parser.add_argument('--codec', action='append',
+                        help='Compression strategy and optional level, e.g. '
+                        'gzip:6 (default: gzip:1, gzip:6, lz4:0).')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of compression threads.')
+    args = parser.parse_args(argv)
+
+    size = args.size * 1024 * 1024
+    for dataset in args.dataset or sorted(DATASETS):
+        data = DATASETS[dataset](size)
+        for codec in args.codec or ['gzip:1', 'gzip:6', 'lz4:0']:
+            report(dataset, codec, size, run_codec(codec, data,
+                                                   args.workers))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
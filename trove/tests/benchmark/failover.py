@@ -0,0 +1,174 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Simulated failover benchmark.
+
+Drives Manager.promote_to_replica_source and Manager.eject_replica_source
+against fake instances whose guest and Nova calls just sleep for a
+configurable latency, and reports how long each failover phase took. Use it
+to spot regressions in the failover recovery time, e.g.:
+
+    python -m trove.tests.benchmark.failover --replicas 10 \
+        --guest-latency 0.5 --nova-latency 1.0
+"""
+
+import argparse
+import collections
+import sys
+
+import eventlet
+from mock import patch
+
+from trove.common.context import TroveContext
+from trove.taskmanager.manager import Manager
+from trove.taskmanager import models
+from trove import rpc
+
+
+class FakeDBInfo(object):
+
+    def __init__(self, id):
+        self.id = id
+        self.task_status = None
+
+    def save(self):
+        pass
+
+
+class FakeFailoverInstance(object):
+    """Stands in for a BuiltInstanceTasks during a failover.
+
+    Guest calls sleep for guest_latency, floating IP moves for nova_latency
+    and waiting for a transaction for txn_latency.
+    """
+
+    def __init__(self, id, latencies, slave_of_id=None):
+        self.id = id
+        self.latencies = latencies
+        self.slave_of_id = slave_of_id
+        self.slaves = []
+        self.db_info = FakeDBInfo(id)
+
+    def _guest_call(self, result=None):
+        eventlet.sleep(self.latencies.guest)
+        return result
+
+    def _nova_call(self, result=None):
+        eventlet.sleep(self.latencies.nova)
+        return result
+
+    def make_read_only(self, read_only):
+        self._guest_call()
+
+    def detach_public_ips(self):
+        return self._nova_call(['ip-%s' % self.id])
+
+    def attach_public_ips(self, ips):
+        self._nova_call()
+
+    def get_latest_txn_id(self):
+        return self._guest_call('txn-id')
+
+    def get_last_txn(self):
+        return self._guest_call(['master-id', 1])
+
+    def wait_for_txn(self, txn):
+        eventlet.sleep(self.latencies.txn)
+
+    def detach_replica(self, master, for_failover=False):
+        self._guest_call()
+
+    def attach_replica(self, master):
+        self._guest_call()
+
+    def enable_as_master(self):
+        self._guest_call()
+
+    def demote_replication_master(self):
+        self._guest_call()
+
+
+def build_topology(replica_count, latencies):
+    """Returns a master with replica_count replicas, all by id."""
+    master = FakeFailoverInstance('master', latencies)
+    instances = {master.id: master}
+    for index in range(replica_count):
+        replica = FakeFailoverInstance('replica-%d' % index, latencies,
+                                       slave_of_id=master.id)
+        master.slaves.append(replica.db_info)
+        instances[replica.id] = replica
+    return instances
+
+
+def run_failover(operation, replica_count, latencies):
+    """Runs one simulated failover, returning its per-phase timings."""
+    instances = build_topology(replica_count, latencies)
+    manager = Manager()
+    context = TroveContext(tenant='benchmark')
+
+    def load(context, id):
+        return instances[id]
+
+    with patch.object(models.BuiltInstanceTasks, 'load', side_effect=load), \
+            patch.object(rpc, 'get_notifier') as mock_get_notifier:
+        if operation == 'promote':
+            manager.promote_to_replica_source(context, 'replica-0')
+        else:
+            manager.eject_replica_source(context, 'master')
+    # The timings are sent out in the notification of the failover.
+    event_type, payload = mock_get_notifier.return_value.info.call_args[0][1:]
+    return payload['phases']
+
+
+def report(operation, results):
+    phases = collections.OrderedDict()
+    for timings in results:
+        for phase, elapsed in timings.items():
+            phases.setdefault(phase, []).append(elapsed)
+    totals = [sum(timings.values()) for timings in results]
+    print("%s (%d runs)" % (operation, len(results)))
+    for phase, samples in phases.items():
+        print("  %-28s mean %8.3fs  max %8.3fs"
+              % (phase, sum(samples) / len(samples), max(samples)))
+    print("  %-28s mean %8.3fs  max %8.3fs"
+          % ('total', sum(totals) / len(totals), max(totals)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--operation', choices=['promote', 'eject', 'both'],
+                        default='both')
+    parser.add_argument('--replicas', type=int, default=5,
+                        help='Number of replicas of the replica source.')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Number of failovers to run per operation.')
+    parser.add_argument('--guest-latency', dest='guest', type=float,
+                        default=0.1, help='Seconds taken by a guest call.')
+    parser.add_argument('--nova-latency', dest='nova', type=float,
+                        default=0.2,
+                        help='Seconds taken by a floating IP move.')
+    parser.add_argument('--txn-latency', dest='txn', type=float, default=0.1,
+                        help='Seconds taken to catch up to a transaction.')
+    args = parser.parse_args(argv)
+
+    operations = (['promote', 'eject'] if args.operation == 'both'
+                  else [args.operation])
+    for operation in operations:
+        results = [run_failover(operation, args.replicas, args)
+                   for run in range(args.runs)]
+        report(operation, results)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
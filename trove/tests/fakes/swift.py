@@ -51,6 +51,7 @@ class FakeSwiftConnection(object):
         self.manifest_prefix = None
         self.manifest_name = None
         self.container_objects = {}
+        self.content_types = {}
 
     def get_auth(self):
         return (
@@ -92,6 +93,17 @@ class FakeSwiftConnection(object):
     def get_container(self, container, **kwargs):
         LOG.debug("fake get_container(%s)" % container)
         fake_header = None
+        prefix = kwargs.get('prefix')
+        if prefix:
+            # list the objects uploaded through put_object
+            fake_body = [{'name': name,
+                          'hash': md5(self.container_objects[name]
+                                      ).hexdigest(),
+                          'bytes': len(self.container_objects[name]),
+                          'content_type': self.content_types.get(name)}
+                         for name in sorted(self.container_objects)
+                         if name.startswith(prefix)]
+            return fake_header, fake_body
         fake_body = [{'name': 'backup_001'},
                      {'name': 'backup_002'},
                      {'name': 'backup_003'}]
@@ -110,6 +122,9 @@ class FakeSwiftConnection(object):
             # this is included to test bad swift segment etags
             if name.startswith("bad_manifest_etag_"):
                 return {'etag': '"this_is_an_intentional_bad_manifest_etag"'}
+            # Currently a swift HEAD object returns etag with double quotes
+            return {'etag': '"%s"' % checksum.hexdigest(),
+                    'x-object-manifest': self.manifest_prefix}
         else:
             if name in self.container_objects:
                 checksum.update(self.container_objects[name])
@@ -117,7 +132,10 @@ class FakeSwiftConnection(object):
                 return {'etag': 'fake-md5-sum'}
 
         # Currently a swift HEAD object returns etag with double quotes
-        return {'etag': '"%s"' % checksum.hexdigest()}
+        headers = {'etag': '"%s"' % checksum.hexdigest()}
+        if name in self.content_types:
+            headers['content-type'] = self.content_types[name]
+        return headers
 
     def get_object(self, container, name, resp_chunk_size=None):
         LOG.debug("fake get_object(%(container)s, %(name)s)" %
@@ -145,6 +163,11 @@ class FakeSwiftConnection(object):
             fake_object_body = metadata_json
             return (fake_object_header, fake_object_body)
 
+        if name in self.container_objects:
+            # return a segment uploaded through put_object
+            contents = self.container_objects[name]
+            return {'etag': md5(contents).hexdigest()}, contents
+
         fake_header = {'etag': '"fake-md5-sum"'}
         if resp_chunk_size:
             def _object_info():
@@ -163,6 +186,8 @@ class FakeSwiftConnection(object):
         if container == 'socket_error_on_put':
             raise socket.error(111, 'ECONNREFUSED')
         headers = kwargs.get('headers', {})
+        if kwargs.get('content_type'):
+            self.content_types[name] = kwargs['content_type']
         object_checksum = md5()
         if self.MANIFEST_HEADER_KEY in headers:
             # the manifest prefix format is <container>/<prefix> where
@@ -76,6 +76,28 @@ class TestBackupController(trove_testtools.TestCase):
         validator = jsonschema.Draft4Validator(schema)
         self.assertTrue(validator.is_valid(body))
 
+    def test_validate_create_throttle(self):
+        body = {"backup": {"instance": self.uuid,
+                           "name": "testback-backup",
+                           "throttle": {"max_rate": 10240,
+                                        "ionice_class": "idle",
+                                        "nice": 10,
+                                        "adaptive": True}}}
+        schema = self.controller.get_schema('create', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertTrue(validator.is_valid(body))
+
+    def test_validate_create_invalid_throttle(self):
+        body = {"backup": {"instance": self.uuid,
+                           "name": "testback-backup",
+                           "throttle": {"nice": 20,
+                                        "ionice_class": "realtime"}}}
+        schema = self.controller.get_schema('create', body)
+        validator = jsonschema.Draft4Validator(schema)
+        self.assertFalse(validator.is_valid(body))
+        errors = sorted(validator.iter_errors(body), key=lambda e: e.path)
+        self.assertEqual(2, len(errors))
+
     def test_invalid_parent_id(self):
         body = {"backup": {"instance": self.uuid,
                            "name": "testback-backup",
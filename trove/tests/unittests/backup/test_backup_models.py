@@ -19,6 +19,7 @@ from mock import patch
 
 from trove.backup import models
 from trove.backup import state
+from trove.backup import views
 from trove.common import context
 from trove.common import exception
 from trove.common import utils
@@ -232,6 +233,185 @@ class BackupDeleteTest(trove_testtools.TestCase):
                                   models.Backup.delete,
                                   self.context, 'backup_id')
 
+    def _create_backup(self, name, parent_id=None,
+                       backup_state=BACKUP_STATE_COMPLETED):
+        backup = models.DBBackup.create(tenant_id=self.context.tenant,
+                                        name=name,
+                                        state=backup_state,
+                                        instance_id=self.instance_id,
+                                        parent_id=parent_id,
+                                        deleted=False)
+        self.addCleanup(backup.delete)
+        return backup
+
+    def _create_chain(self, child_state=BACKUP_STATE_COMPLETED):
+        full = self._create_backup(BACKUP_NAME)
+        incremental = self._create_backup(BACKUP_NAME_2, full.id)
+        self._create_backup(BACKUP_NAME_3)
+        return [full, incremental,
+                self._create_backup(BACKUP_NAME_5, incremental.id,
+                                    child_state)]
+
+    def test_chain(self):
+        full, incremental, last = self._create_chain()
+        self.assertEqual([full.id, incremental.id, last.id],
+                         [backup.id for backup in models.Backup.chain(full)])
+        self.assertEqual([incremental.id, last.id],
+                         [backup.id
+                          for backup in models.Backup.chain(incremental)])
+
+    @patch.object(api.API, 'get_client', MagicMock(return_value=MagicMock()))
+    @patch.object(models.Backup, 'verify_swift_auth_token')
+    def test_delete_chain(self, mock_verify):
+        chain = self._create_chain()
+        with patch.object(api.API, 'delete_backup') as mock_delete:
+            models.Backup.delete(self.context, chain[0].id)
+        mock_delete.assert_called_once_with(chain[0].id)
+        for backup in chain:
+            self.assertEqual(state.BackupState.DELETE_PENDING,
+                             models.DBBackup.find_by(id=backup.id).state)
+        other = models.DBBackup.find_by(name=BACKUP_NAME_3,
+                                        tenant_id=self.context.tenant)
+        self.assertEqual(BACKUP_STATE_COMPLETED, other.state)
+
+    @patch.object(api.API, 'get_client', MagicMock(return_value=MagicMock()))
+    @patch.object(models.Backup, 'verify_swift_auth_token')
+    def test_delete_pending(self, mock_verify):
+        chain = self._create_chain()
+        with patch.object(api.API, 'delete_backup') as mock_delete:
+            models.Backup.delete(self.context, chain[0].id)
+            with patch.object(models, 'run_with_quotas') as mock_quotas:
+                self.assertRaises(exception.UnprocessableEntity,
+                                  models.Backup.delete,
+                                  self.context, chain[0].id)
+        # The deletion is only requested, and the quota released, once.
+        mock_delete.assert_called_once_with(chain[0].id)
+        self.assertFalse(mock_quotas.called)
+
+    @patch.object(api.API, 'get_client', MagicMock(return_value=MagicMock()))
+    @patch.object(models.Backup, 'verify_swift_auth_token')
+    def test_delete_pending_stalled(self, mock_verify):
+        chain = self._create_chain()
+        with patch.object(api.API, 'delete_backup') as mock_delete:
+            models.Backup.delete(self.context, chain[0].id)
+            stalled = utils.utcnow() - datetime.timedelta(
+                seconds=models.CONF.backup_delete_timeout + 1)
+            models.DBBackup.query().filter(
+                models.DBBackup.id == chain[0].id).update(
+                {'updated': stalled}, synchronize_session=False)
+            with patch.object(models, 'run_with_quotas',
+                              side_effect=lambda tenant, deltas, f: f()
+                              ) as mock_quotas:
+                models.Backup.delete(self.context, chain[0].id)
+        self.assertEqual(2, mock_delete.call_count)
+        # Only the quota of the backups not yet being deleted is released.
+        self.assertEqual({'backups': 0}, mock_quotas.call_args[0][1])
+
+    @patch.object(api.API, 'get_client', MagicMock(return_value=MagicMock()))
+    @patch.object(models.Backup, 'verify_swift_auth_token')
+    def test_delete_cast_fails(self, mock_verify):
+        chain = self._create_chain()
+        with patch.object(api.API, 'delete_backup',
+                          side_effect=exception.TroveError('cast failed')):
+            self.assertRaises(exception.TroveError, models.Backup.delete,
+                              self.context, chain[0].id)
+        # The chain can be deleted again.
+        for backup in chain:
+            self.assertEqual(BACKUP_STATE_COMPLETED,
+                             models.DBBackup.find_by(id=backup.id).state)
+
+    @patch.object(models.Backup, 'verify_swift_auth_token')
+    def test_delete_chain_child_running(self, mock_verify):
+        chain = self._create_chain(child_state=BACKUP_STATE)
+        with patch.object(api.API, 'delete_backup') as mock_delete:
+            self.assertRaises(exception.UnprocessableEntity,
+                              models.Backup.delete,
+                              self.context, chain[0].id)
+        self.assertFalse(mock_delete.called)
+        self.assertEqual(BACKUP_STATE_COMPLETED,
+                         models.DBBackup.find_by(id=chain[0].id).state)
+
+
+class SwiftCheckCacheTest(trove_testtools.TestCase):
+    def setUp(self):
+        super(SwiftCheckCacheTest, self).setUp()
+        self.context = context.TroveContext(tenant='TENANT')
+        self.backup = models.DBBackup(id='backup-id',
+                                      location=BACKUP_LOCATION,
+                                      checksum='checksum')
+        cache_patch = patch.object(models, 'SWIFT_CHECK_CACHE',
+                                   models.SwiftCheckCache())
+        self.cache = cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+        self.client = MagicMock()
+        self.client.head_object.return_value = {'etag': '"checksum"'}
+        client_patch = patch.object(models, 'create_swift_client',
+                                    return_value=self.client)
+        client_patch.start()
+        self.addCleanup(client_patch.stop)
+
+    def _check(self, verify_checksum=True):
+        return self.backup.check_swift_object_exist(self.context,
+                                                    verify_checksum)
+
+    def test_check_cached(self):
+        self.assertTrue(self._check())
+        self.assertTrue(self._check())
+        self.assertTrue(self._check(verify_checksum=False))
+        self.client.head_object.assert_called_once_with('database_backups',
+                                                        BACKUP_FILENAME)
+
+    def test_check_cached_without_checksum(self):
+        self.assertTrue(self._check(verify_checksum=False))
+        self.assertTrue(self._check())
+        self.assertTrue(self._check())
+        self.assertEqual(2, self.client.head_object.call_count)
+
+    def test_check_other_checksum(self):
+        self.assertTrue(self._check())
+        self.backup.checksum = 'other'
+        self.assertRaises(exception.RestoreBackupIntegrityError, self._check)
+        self.assertEqual(2, self.client.head_object.call_count)
+
+    def test_check_not_found_not_cached(self):
+        self.client.head_object.side_effect = models.ClientException(
+            'foo', http_status=404)
+        self.assertFalse(self._check())
+        self.assertFalse(self._check())
+        self.assertEqual(2, self.client.head_object.call_count)
+
+    @patch.object(models.time, 'time', return_value=1000.0)
+    def test_check_expired(self, mock_time):
+        self.assertTrue(self._check())
+        mock_time.return_value += models.CONF.swift_check_cache_ttl
+        self.assertTrue(self._check())
+        self.assertEqual(2, self.client.head_object.call_count)
+
+    def test_check_cache_disabled(self):
+        models.CONF.set_override('swift_check_cache_ttl', 0)
+        self.addCleanup(models.CONF.clear_override, 'swift_check_cache_ttl')
+        self.assertTrue(self._check())
+        self.assertTrue(self._check())
+        self.assertEqual(2, self.client.head_object.call_count)
+
+    def test_cache_size(self):
+        models.CONF.set_override('swift_check_cache_size', 2)
+        self.addCleanup(models.CONF.clear_override, 'swift_check_cache_size')
+        for location in ('a', 'b', 'c'):
+            self.cache.add(location, 'checksum', True)
+        self.cache.get('b', 'checksum', True)
+        self.cache.add('d', 'checksum', True)
+        self.assertEqual([('b', 'checksum'), ('d', 'checksum')],
+                         list(self.cache.entries))
+
+    def test_invalidate(self):
+        self.assertTrue(self._check())
+        self.cache.add(BACKUP_LOCATION, 'other', True)
+        self.cache.invalidate(BACKUP_LOCATION)
+        self.assertEqual({}, self.cache.entries)
+        self.assertTrue(self._check())
+        self.assertEqual(2, self.client.head_object.call_count)
+
 
 class BackupORMTest(trove_testtools.TestCase):
     def setUp(self):
@@ -317,6 +497,42 @@ class BackupORMTest(trove_testtools.TestCase):
                                             exclude=self.backup.id)
         self.assertFalse(not_running)
 
+    def test_fail_unstarted(self):
+        models.Backup.fail_unstarted(self.backup.id)
+        backup = models.DBBackup.find_by(id=self.backup.id)
+        self.assertEqual(models.BackupState.FAILED, backup.state)
+
+    def test_fail_unstarted_building(self):
+        self.backup.state = models.BackupState.BUILDING
+        self.backup.save()
+        models.Backup.fail_unstarted(self.backup.id)
+        backup = models.DBBackup.find_by(id=self.backup.id)
+        self.assertEqual(models.BackupState.BUILDING, backup.state)
+
+    def test_running_for_tenant(self):
+        self.assertTrue(models.Backup.running_for_tenant(self.context.tenant))
+        self.assertFalse(models.Backup.running_for_tenant('other-tenant'))
+
+    def test_running_for_tenant_oldest(self):
+        older = models.DBBackup.create(
+            tenant_id=self.context.tenant, name=BACKUP_NAME_2,
+            state=BACKUP_STATE, instance_id=self.instance_id, size=2.0,
+            deleted=False,
+            created=self.backup.created - datetime.timedelta(hours=1))
+        self.addCleanup(older.delete)
+        self.assertEqual(
+            older.id, models.Backup.running_for_tenant(self.context.tenant).id)
+
+    def test_progress_view(self):
+        self.assertNotIn('progress', views.BackupView(self.backup).data()[
+            'backup'])
+        self.backup.progress = '{"bytes_read": 100, "segments": 1}'
+        self.backup.save()
+        backup = models.DBBackup.find_by(id=self.backup.id)
+        self.assertEqual({'bytes_read': 100, 'segments': 1},
+                         views.BackupView(backup).data()['backup'][
+                             'progress'])
+
     def test_is_running(self):
         self.assertTrue(self.backup.is_running)
 
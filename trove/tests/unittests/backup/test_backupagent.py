@@ -13,8 +13,11 @@
 # limitations under the License.
 
 import hashlib
+import json
 import os
+import socket
 
+import eventlet
 from mock import Mock, MagicMock, patch, ANY
 from oslo_utils import netutils
 from webob.exc import HTTPNotFound
@@ -24,6 +27,7 @@ from trove.common.context import TroveContext
 from trove.common import utils
 from trove.conductor import api as conductor_api
 from trove.guestagent.backup import backupagent
+from trove.guestagent.common.progress import BackupProgress
 from trove.guestagent.strategies.backup.base import BackupRunner
 from trove.guestagent.strategies.backup.base import UnknownBackupType
 from trove.guestagent.strategies.backup.experimental import couchbase_impl
@@ -31,6 +35,7 @@ from trove.guestagent.strategies.backup.experimental import mongo_impl
 from trove.guestagent.strategies.backup import mysql_impl
 from trove.guestagent.strategies.restore.base import RestoreRunner
 from trove.guestagent.strategies.storage.base import Storage
+from trove.guestagent.strategies.storage.experimental import stream_impl
 from trove.tests.unittests import trove_testtools
 
 
@@ -75,6 +80,8 @@ class MockLossyBackup(MockBackup):
 class MockSwift(object):
     """Store files in String."""
 
+    manifest_extension = None
+
     def __init__(self, *args, **kwargs):
         self.store = ''
         self.containers = []
@@ -131,6 +138,12 @@ class MockStorage(Storage):
     def save_metadata(self, location, metadata={}):
         pass
 
+    def location(self, filename):
+        return 'fake-location/%s' % filename
+
+    def get_checksum(self, location):
+        return None
+
     def is_enabled(self):
         return True
 
@@ -261,6 +274,48 @@ class BackupAgentTest(trove_testtools.TestCase):
             self.assertIsNone(backup_runner.zip_cmd)
         self.assertEqual('BackupRunner', backup_runner.backup_type)
 
+    @patch.object(conductor_api.API, 'get_client', Mock(return_value=Mock()))
+    @patch.object(conductor_api.API, 'update_backup')
+    def test_execute_backup_reports_progress(self, update_backup):
+        class ProgressSwift(MockSwift):
+            def save(self, filename, stream):
+                self.progress.read(10)
+                self.progress.saved(10)
+                return super(ProgressSwift, self).save(filename, stream)
+
+        self.get_ss_mock.return_value = ProgressSwift
+        agent = backupagent.BackupAgent()
+        backup_info = {'id': '123',
+                       'location': 'fake-location',
+                       'type': 'InnoBackupEx',
+                       'checksum': 'fake-checksum',
+                       'datastore': 'mysql',
+                       'datastore_version': '5.5'
+                       }
+        agent.execute_backup(context=None, backup_info=backup_info,
+                             runner=MockBackup)
+        final_state = update_backup.call_args[1]
+        self.assertEqual(BackupState.COMPLETED, final_state['state'])
+        progress = json.loads(final_state['progress'])
+        self.assertEqual(10, progress['bytes_read'])
+        self.assertEqual(10, progress['bytes_saved'])
+        self.assertEqual(1, progress['segments'])
+
+    def test_report_progress(self):
+        conductor = Mock()
+        backup_progress = BackupProgress()
+        backup_progress.read(100)
+        finished = Mock()
+        finished.wait.side_effect = [None, None, True]
+        backupagent.BackupAgent()._report_progress(
+            conductor, '123', backup_progress, 30, finished)
+        finished.wait.assert_called_with(30)
+        self.assertEqual(2, conductor.update_backup.call_count)
+        kwargs = conductor.update_backup.call_args[1]
+        self.assertEqual('123', kwargs['backup_id'])
+        self.assertNotIn('state', kwargs)
+        self.assertEqual(100, json.loads(kwargs['progress'])['bytes_read'])
+
     @patch.object(conductor_api.API, 'get_client', Mock(return_value=Mock()))
     @patch.object(conductor_api.API, 'update_backup',
                   Mock(return_value=Mock()))
@@ -306,6 +361,52 @@ class BackupAgentTest(trove_testtools.TestCase):
                 backup_type=backup_info['type'],
                 state=BackupState.COMPLETED))
 
+    @patch.object(conductor_api.API, 'get_client', Mock(return_value=Mock()))
+    @patch.object(conductor_api.API, 'update_backup',
+                  Mock(return_value=Mock()))
+    def test_execute_backup_throttled(self):
+        agent = backupagent.BackupAgent()
+        storage = MockSwift()
+        backup_info = {'id': '123',
+                       'datastore': 'mysql',
+                       'datastore_version': '5.5',
+                       'throttle': {'max_rate': 10}}
+        with patch.object(storage, 'save',
+                          return_value=(True, 'w00t', 'fake-checksum',
+                                        'fake-location')) as save:
+            agent.stream_backup_to_storage(backup_info, MockBackup, storage)
+        self.assertEqual(10 * 1024, storage.throttle.max_rate)
+        self.assertIs(storage.throttle, save.call_args[0][1].throttle)
+
+    @patch.object(conductor_api.API, 'get_client', Mock(return_value=Mock()))
+    @patch.object(conductor_api.API, 'update_backup',
+                  Mock(return_value=Mock()))
+    def test_execute_backup_runner_fails_to_start(self):
+        class FailingBackup(MockBackup):
+            def __enter__(self):
+                raise backupagent.BackupError('Unable to start the backup.')
+
+        agent = backupagent.BackupAgent()
+        report_progress = agent._report_progress
+        reporters = []
+
+        def _report_progress(*args):
+            reporters.append(eventlet.getcurrent())
+            report_progress(*args)
+
+        backup_info = {'id': '123',
+                       'datastore': 'mysql',
+                       'datastore_version': '5.5',
+                       'throttle': {'adaptive': True}}
+        with patch.object(agent, '_report_progress',
+                          side_effect=_report_progress):
+            self.assertRaises(backupagent.BackupError,
+                              agent.stream_backup_to_storage,
+                              backup_info, FailingBackup, MockSwift())
+            eventlet.sleep(0)
+        # No progress reporter is left waiting for the backup.
+        self.assertTrue(all(reporter.dead for reporter in reporters))
+
     @patch.object(conductor_api.API, 'get_client', Mock(return_value=Mock()))
     @patch.object(conductor_api.API, 'update_backup',
                   Mock(return_value=Mock()))
@@ -396,6 +497,61 @@ class BackupAgentTest(trove_testtools.TestCase):
                                       bkup_info,
                                       '/var/lib/mysql')
 
+    @patch.object(stream_impl.StreamStorage, 'connect',
+                  return_value='123.xbstream.gz')
+    def test_execute_restore_stream(self, mock_connect):
+        stream = {'host': '10.0.0.1', 'port': 4000, 'token': 'token',
+                  'type': 'InnoBackupEx',
+                  'fallback': 'http://mockswift/v1/database_backups/'
+                              '123.xbstream.gz'}
+        restore_runner = Mock()
+        with patch.object(backupagent, 'get_restore_strategy',
+                          return_value=restore_runner):
+            agent = backupagent.BackupAgent()
+            bkup_info = {'id': '123',
+                         'location': None,
+                         'type': 'InnoBackupEx',
+                         'checksum': None,
+                         'stream': stream,
+                         }
+            agent.execute_restore(TroveContext(), bkup_info, '/var/lib/mysql')
+        mock_connect.assert_called_once_with(stream)
+        storage = restore_runner.call_args[0][0]
+        self.assertIsInstance(storage, stream_impl.StreamStorage)
+        restore_runner.assert_called_once_with(
+            storage, location='123.xbstream.gz', checksum=None,
+            restore_location='/var/lib/mysql')
+
+    @patch.object(utils, 'poll_until', side_effect=lambda retriever, **kw:
+                  retriever())
+    @patch.object(stream_impl.StreamStorage, 'connect',
+                  side_effect=socket.error)
+    def test_execute_restore_stream_fallback(self, mock_connect,
+                                             mock_poll_until):
+        location = 'http://mockswift/v1/database_backups/123.xbstream.gz'
+        stream = {'host': '10.0.0.1', 'port': 4000, 'token': 'token',
+                  'type': 'InnoBackupEx', 'fallback': location}
+        restore_runner = Mock()
+        storage = MockStorage(None)
+        with patch.object(backupagent, 'get_storage_strategy',
+                          return_value=storage):
+            with patch.object(backupagent, 'get_restore_strategy',
+                              return_value=restore_runner):
+                with patch.object(storage, 'get_checksum',
+                                  return_value='fake-checksum'):
+                    agent = backupagent.BackupAgent()
+                    bkup_info = {'id': '123',
+                                 'location': None,
+                                 'type': 'InnoBackupEx',
+                                 'checksum': None,
+                                 'stream': stream,
+                                 }
+                    agent.execute_restore(TroveContext(), bkup_info,
+                                          '/var/lib/mysql')
+        restore_runner.assert_called_once_with(
+            storage, location=location, checksum='fake-checksum',
+            restore_location='/var/lib/mysql')
+
     def test_restore_unknown(self):
         with patch.object(backupagent, 'get_restore_strategy',
                           side_effect=ImportError):
@@ -0,0 +1,124 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import binascii
+import io
+import os
+
+from mock import patch
+
+from trove.common import cfg
+from trove.common import chunk_index
+from trove.common.context import TroveContext
+from trove.guestagent.common import encryption
+from trove.guestagent.strategies.storage.experimental import dedup_impl
+from trove.tests.fakes.swift import FakeSwiftConnection
+from trove.tests.unittests import trove_testtools
+
+CONF = cfg.CONF
+
+def _rows(start, count):
+    return ''.join('%d,%s\n' % (row, binascii.hexlify(os.urandom(16)))
+                   for row in range(start, start + count))
+
+
+class DedupSwiftStorageTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(DedupSwiftStorageTests, self).setUp()
+        self.swift_client = FakeSwiftConnection()
+        self.create_swift_client_patch = patch.object(
+            dedup_impl.swift, 'create_swift_client',
+            return_value=self.swift_client)
+        self.create_swift_client_patch.start()
+        self.addCleanup(self.create_swift_client_patch.stop)
+        self.storage = dedup_impl.DedupSwiftStorage(TroveContext())
+        # Several chunks of rows of a logical dump.
+        self.data = _rows(0, 120000)
+
+    def _chunk_names(self):
+        return set(name for name in self.swift_client.container_objects
+                   if name.startswith(chunk_index.CHUNK_PREFIX))
+
+    def test_save_and_load(self):
+        success, note, checksum, location = self.storage.save(
+            '123.sql', io.BytesIO(self.data))
+        self.assertTrue(success)
+        self.assertTrue(len(self._chunk_names()) > 2)
+        self.assertEqual(chunk_index.CONTENT_TYPE,
+                         self.swift_client.content_types['123.sql'])
+        self.assertEqual(self.data,
+                         ''.join(self.storage.load(location, checksum)))
+
+    def test_save_uploads_new_chunks_only(self):
+        self.storage.save('123.sql', io.BytesIO(self.data))
+        chunks = self._chunk_names()
+        changed = self.data[:1000] + _rows(-10, 10) + self.data[1000:]
+        with patch.object(self.swift_client, 'put_object',
+                          wraps=self.swift_client.put_object) as put_object:
+            success, note, checksum, location = self.storage.save(
+                '456.sql', io.BytesIO(changed))
+        self.assertTrue(success)
+        # A new chunk around the change, and the index.
+        self.assertTrue(put_object.call_count <= 3)
+        self.assertTrue(len(self._chunk_names() - chunks) <= 2)
+        self.assertEqual(changed,
+                         ''.join(self.storage.load(location, checksum)))
+
+    def test_save_and_load_encrypted(self):
+        CONF.set_override('backup_use_openssl_encryption', True)
+        self.addCleanup(CONF.clear_override, 'backup_use_openssl_encryption')
+        success, note, checksum, location = self.storage.save(
+            '123.xbstream' + chunk_index.EXTENSION, io.BytesIO(self.data))
+        self.assertTrue(success)
+        chunks = self._chunk_names()
+        for name in chunks:
+            self.assertTrue(self.swift_client.container_objects[name]
+                            .startswith(encryption.MAGIC))
+        self.assertEqual(self.data,
+                         ''.join(self.storage.load(location, checksum)))
+
+        # Chunks encrypt alike from one backup to the next.
+        with patch.object(self.swift_client, 'put_object',
+                          wraps=self.swift_client.put_object) as put_object:
+            success, note, checksum, location = self.storage.save(
+                '456.xbstream' + chunk_index.EXTENSION, io.BytesIO(self.data))
+        self.assertTrue(success)
+        self.assertEqual(1, put_object.call_count)
+        self.assertEqual(chunks, self._chunk_names())
+        self.assertEqual(self.data,
+                         ''.join(self.storage.load(location, checksum)))
+
+    def test_save_empty_backup(self):
+        success, note, checksum, location = self.storage.save(
+            '123.sql', io.BytesIO(''))
+        self.assertTrue(success)
+        self.assertEqual('', ''.join(self.storage.load(location, checksum)))
+
+    def test_save_chunk_etag_mismatch(self):
+        with patch.object(self.swift_client, 'put_object',
+                          return_value='bad-etag'):
+            success, note, checksum, location = self.storage.save(
+                '123.sql', io.BytesIO(self.data))
+        self.assertFalse(success)
+        self.assertIsNone(checksum)
+
+    def test_save_metadata_keeps_content_type(self):
+        location = 'http://mockswift/v1/backups/123.sql'
+        with patch.object(self.swift_client, 'post_object') as post_object:
+            self.storage.save_metadata(location, {'lsn': '1234567'})
+        post_object.assert_called_once_with(
+            'backups', '123.sql',
+            headers={'Content-Type': chunk_index.CONTENT_TYPE,
+                     'X-Object-Meta-lsn': '1234567'})
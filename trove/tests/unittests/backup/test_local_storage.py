@@ -0,0 +1,113 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
+from trove.common import cfg
+from trove.common.context import TroveContext
+from trove.guestagent.strategies.storage.experimental import local_impl
+from trove.guestagent.strategies.storage import swift
+from trove.tests.unittests import trove_testtools
+
+
+class LocalStorageTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(LocalStorageTests, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        cfg.CONF.set_override('backup_local_storage_path', self.root)
+        self.addCleanup(cfg.CONF.clear_override, 'backup_local_storage_path')
+        # Buffers of a single page.
+        cfg.CONF.set_override('backup_local_storage_buffer_size', 1)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'backup_local_storage_buffer_size')
+        self.storage = local_impl.LocalStorage(TroveContext())
+        self.storage.max_file_size = 3 * swift.CHUNK_SIZE
+        self.data = os.urandom(7 * swift.CHUNK_SIZE + 100)
+
+    def _container_path(self):
+        return os.path.join(self.root, local_impl.BACKUP_CONTAINER)
+
+    def test_save(self):
+        success, note, checksum, location = self.storage.save(
+            '123.xbstream.gz', io.BytesIO(self.data))
+        self.assertTrue(success)
+        self.assertEqual(os.path.join(self._container_path(),
+                                      '123.xbstream.gz'), location)
+        segment_names = sorted(name for name in os.listdir(
+            self._container_path()) if name.startswith('123_'))
+        self.assertEqual(['123_00000000', '123_00000001', '123_00000002'],
+                         segment_names)
+        listing_checksum = hashlib.md5()
+        contents = []
+        for name in segment_names:
+            with open(os.path.join(self._container_path(), name)) as f:
+                segment = f.read()
+            contents.append(segment)
+            listing_checksum.update(hashlib.md5(segment).hexdigest())
+        self.assertEqual(self.data, ''.join(contents))
+        self.assertEqual(listing_checksum.hexdigest(), checksum)
+
+    def test_load(self):
+        success, note, checksum, location = self.storage.save(
+            '123.xbstream.gz', io.BytesIO(self.data))
+        self.assertEqual(self.data,
+                         ''.join(self.storage.load(location, checksum)))
+
+    def test_load_empty_backup(self):
+        success, note, checksum, location = self.storage.save(
+            '123.xbstream.gz', io.BytesIO(''))
+        self.assertTrue(success)
+        self.assertEqual('', ''.join(self.storage.load(location, checksum)))
+
+    def test_load_checksum_mismatch(self):
+        success, note, checksum, location = self.storage.save(
+            '123.xbstream.gz', io.BytesIO(self.data))
+        self.assertRaises(local_impl.LocalStorageIntegrityError,
+                          self.storage.load, location, 'bad-checksum')
+
+    def test_load_corrupt_segment(self):
+        success, note, checksum, location = self.storage.save(
+            '123.xbstream.gz', io.BytesIO(self.data))
+        with open(os.path.join(self._container_path(), '123_00000001'),
+                  'r+') as f:
+            f.write('corrupt')
+        self.assertRaises(local_impl.LocalStorageIntegrityError, ''.join,
+                          self.storage.load(location, checksum))
+
+    def test_metadata(self):
+        success, note, checksum, location = self.storage.save(
+            '123.xbstream.gz', io.BytesIO(self.data))
+        self.storage.save_metadata(location, {'lsn': '1234567'})
+        self.storage.save_metadata(location, {'parent_location': 'parent'})
+        self.assertEqual({'lsn': '1234567', 'parent_location': 'parent'},
+                         self.storage.load_metadata(location, checksum))
+        # The metadata does not change the checksum of the backup.
+        self.assertEqual(self.data,
+                         ''.join(self.storage.load(location, checksum)))
+
+    def test_save_write_error_keeps_manifest_out(self):
+        with patch.object(local_impl, '_write_all',
+                          side_effect=OSError(28, 'ENOSPC')):
+            self.assertRaises(OSError, self.storage.save, '123.xbstream.gz',
+                              io.BytesIO(self.data))
+        self.assertFalse(os.path.exists(
+            os.path.join(self._container_path(), '123.xbstream.gz')))
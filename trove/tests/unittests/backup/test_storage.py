@@ -12,11 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import hashlib
+import socket
 
 from mock import Mock, MagicMock, patch
 
+from trove.common import cfg
 from trove.common.context import TroveContext
+from trove.guestagent.common.progress import BackupProgress
 from trove.guestagent.strategies.storage import swift
 from trove.guestagent.strategies.storage.swift import StreamReader
 from trove.guestagent.strategies.storage.swift \
@@ -130,6 +134,127 @@ class SwiftStorageSaveChecksumTests(trove_testtools.TestCase):
                          "Incorrect swift location was returned.")
 
 
+class MockChunkedBackupStream(object):
+    """Return a different full chunk on every read until exhausted."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunks_read = 0
+
+    def read(self, chunk_size):
+        if self.chunks_read == self.chunks:
+            return ''
+        self.chunks_read += 1
+        return chr(ord('a') + self.chunks_read) * chunk_size
+
+
+class SwiftStorageSaveConcurrentTests(trove_testtools.TestCase):
+    """SwiftStorage.save uploading several segments in parallel."""
+
+    def setUp(self):
+        super(SwiftStorageSaveConcurrentTests, self).setUp()
+        self.context = TroveContext()
+        # Segments of two chunks each.
+        self.stream_reader_patch = patch.object(
+            swift, 'StreamReader',
+            functools.partial(StreamReader,
+                              max_file_size=2 * swift.CHUNK_SIZE))
+        self.stream_reader_patch.start()
+        self.addCleanup(self.stream_reader_patch.stop)
+
+    def _save(self, filename, concurrency, swift_client=None):
+        cfg.CONF.set_override('backup_upload_concurrency', concurrency)
+        self.addCleanup(cfg.CONF.clear_override, 'backup_upload_concurrency')
+        swift_client = swift_client or FakeSwiftConnection()
+        with patch.object(swift, 'create_swift_client',
+                          return_value=swift_client):
+            storage_strategy = SwiftStorage(self.context)
+            result = storage_strategy.save(filename,
+                                           MockChunkedBackupStream(5))
+        return swift_client, result
+
+    def test_save_concurrently(self):
+        client, result = self._save('123.gz.enc', 3)
+        success, note, checksum, location = result
+        self.assertTrue(success, "The backup should have been successful.")
+        chunk_size = swift.CHUNK_SIZE
+        segments = {'123_00000000': 'b' * chunk_size + 'c' * chunk_size,
+                    '123_00000001': 'd' * chunk_size + 'e' * chunk_size,
+                    '123_00000002': 'f' * chunk_size}
+        self.assertEqual(segments, client.container_objects)
+        swift_checksum = hashlib.md5()
+        for segment in sorted(segments):
+            swift_checksum.update(hashlib.md5(segments[segment]).hexdigest())
+        self.assertEqual(swift_checksum.hexdigest(), checksum)
+        self.assertEqual('123.gz.enc', client.manifest_name)
+
+    def test_save_concurrently_segment_etag_mismatch(self):
+        client, result = self._save('bad_segment_etag_123.gz.enc', 3)
+        success, note, checksum, location = result
+        self.assertFalse(success, "The backup should have failed!")
+        self.assertTrue(note.startswith("Error saving data to Swift!"))
+        self.assertIsNone(checksum)
+        self.assertIsNone(client.manifest_name,
+                          "No manifest should be written for failed backup.")
+
+    def test_save_concurrently_upload_error(self):
+        swift_client = FakeSwiftConnection()
+        swift_client.put_object = Mock(
+            side_effect=socket.error(111, 'ECONNREFUSED'))
+        self.assertRaises(socket.error, self._save, '123.gz.enc', 3,
+                          swift_client=swift_client)
+        # Only the segments already read were attempted.
+        self.assertTrue(swift_client.put_object.call_count <= 3)
+        self.assertIsNone(swift_client.manifest_name)
+
+
+class SwiftStorageLoadConcurrentTests(trove_testtools.TestCase):
+    """SwiftStorage.load downloading several segments in parallel."""
+
+    def setUp(self):
+        super(SwiftStorageLoadConcurrentTests, self).setUp()
+        self.context = TroveContext()
+        self.location = 'http://mockswift/v1/database_backups/123.gz.enc'
+        self.swift_client = FakeSwiftConnection()
+        self.create_swift_client_patch = patch.object(
+            swift, 'create_swift_client',
+            MagicMock(return_value=self.swift_client))
+        self.create_swift_client_patch.start()
+        self.addCleanup(self.create_swift_client_patch.stop)
+        cfg.CONF.set_override('backup_download_concurrency', 3)
+        self.addCleanup(cfg.CONF.clear_override,
+                        'backup_download_concurrency')
+        self.swift = SwiftStorage(self.context)
+        self.segments = ['a' * 100, 'b' * 100, 'c' * 100, 'd' * 10]
+        for index, contents in enumerate(self.segments):
+            self.swift_client.put_object('database_backups',
+                                         '123_%08d' % index, contents)
+        self.swift_client.put_object(
+            'database_backups', '123.gz.enc', '',
+            headers={'X-Object-Manifest': 'database_backups/123_'})
+        self.checksum = self.swift_client.head_object(
+            'database_backups', '123.gz.enc')['etag'].strip('"')
+
+    def test_load_concurrently(self):
+        stream = self.swift.load(self.location, self.checksum)
+        self.assertEqual(''.join(self.segments), ''.join(stream))
+
+    def test_load_concurrently_corrupt_segment(self):
+        stream = self.swift.load(self.location, self.checksum)
+        self.swift_client.container_objects['123_00000002'] = 'x' * 100
+        self.assertRaises(SwiftDownloadIntegrityError, ''.join, stream)
+
+    def test_load_concurrently_incomplete_listing(self):
+        del self.swift_client.container_objects['123_00000003']
+        self.assertRaises(SwiftDownloadIntegrityError, self.swift.load,
+                          self.location, self.checksum)
+
+    def test_load_not_a_manifest(self):
+        location = 'http://mockswift/v1/database_backups/456.gz.enc'
+        stream = self.swift.load(location, 'fake-md5-sum')
+        self.assertIsNotNone(stream)
+
+
 class SwiftStorageUtils(trove_testtools.TestCase):
 
     def setUp(self):
@@ -268,6 +393,21 @@ class StreamReaderTests(trove_testtools.TestCase):
         self.assertEqual('', results, "Results should be empty.")
         self.assertEqual('123_00000001', self.stream.segment)
 
+    def test_progress(self):
+        backup_progress = BackupProgress()
+        stream = StreamReader(self.runner, self.runner.manifest,
+                              progress=backup_progress)
+        stream.read(5)
+        stream.read(7)
+        self.assertEqual(12, backup_progress.bytes_read)
+
+    def test_throttle(self):
+        throttle = MagicMock()
+        stream = StreamReader(self.runner, self.runner.manifest,
+                              throttle=throttle)
+        stream.read(5)
+        throttle.consume.assert_called_once_with(5)
+
     def test_stream_complete(self):
         results = self.stream.read(0)
         self.assertEqual('', results, "Results should be empty.")
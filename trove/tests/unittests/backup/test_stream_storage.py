@@ -0,0 +1,98 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import io
+import os
+
+import eventlet
+
+from trove.common.context import TroveContext
+from trove.guestagent.strategies.storage.experimental import stream_impl
+from trove.tests.unittests import trove_testtools
+
+
+class StreamStorageTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(StreamStorageTests, self).setUp()
+        self.server = stream_impl.StreamServer('127.0.0.1')
+        self.addCleanup(self.server.close)
+        self.context = TroveContext()
+        self.data = os.urandom(3 * stream_impl.CHUNK_SIZE + 100)
+
+    def _serve(self, send):
+        """Accept a connection and send the backup with send, in a green
+        thread.
+        """
+        def _accept():
+            connection = self.server.accept(5)
+            if connection is not None:
+                send(stream_impl.StreamStorage(self.context, connection))
+        return eventlet.spawn(_accept)
+
+    def _send(self, storage):
+        success, note, checksum, location = storage.save(
+            '123.xbstream.gz', io.BytesIO(self.data))
+        self.assertTrue(success)
+        self.assertIsNone(location)
+        storage.finish()
+
+    def test_stream(self):
+        sender = self._serve(self._send)
+        storage = stream_impl.StreamStorage(self.context)
+        self.assertEqual('123.xbstream.gz',
+                         storage.connect(self.server.address))
+        self.assertEqual(self.data, ''.join(storage.load(None, None)))
+        sender.wait()
+
+    def test_stream_refused(self):
+        sender = self._serve(self._send)
+        address = dict(self.server.address, token='wrong')
+        storage = stream_impl.StreamStorage(self.context)
+        self.assertRaisesRegexp(stream_impl.StreamError, 'refused',
+                                storage.connect, address)
+        sender.kill()
+
+    def test_stream_cut_short(self):
+        def _send(storage):
+            storage.save('123.xbstream.gz', io.BytesIO(self.data))
+            storage.close()
+        sender = self._serve(_send)
+        storage = stream_impl.StreamStorage(self.context)
+        storage.connect(self.server.address)
+        chunks = storage.load(None, None)
+        self.assertRaisesRegexp(stream_impl.StreamError, 'cut short',
+                                ''.join, chunks)
+        sender.wait()
+
+    def test_stream_corrupt(self):
+        def _send(storage):
+            storage.save('123.xbstream.gz', io.BytesIO(self.data))
+            storage.checksum.update('corrupt')
+            storage.finish()
+        sender = self._serve(_send)
+        storage = stream_impl.StreamStorage(self.context)
+        storage.connect(self.server.address)
+        self.assertRaises(stream_impl.StreamIntegrityError,
+                          ''.join, storage.load(None, None))
+        sender.wait()
+
+    def test_stream_not_stored(self):
+        storage = stream_impl.StreamStorage(self.context)
+        self.assertIsNone(storage.location('123.xbstream.gz'))
+        self.assertRaises(stream_impl.StreamError, storage.get_checksum,
+                          None)
+
+    def test_accept_timeout(self):
+        self.assertIsNone(self.server.accept(0.1))
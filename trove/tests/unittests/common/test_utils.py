@@ -13,7 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 #
-from mock import Mock
+from mock import Mock, patch
 from testtools import ExpectedException
 from trove.common import exception
 from trove.common import utils
@@ -61,3 +61,29 @@ class TestTroveExecuteWithTimeout(trove_testtools.TestCase):
         utils.LOG.error.assert_called_with(
             u"Command 'test' failed. test-desc Exit code: 42\n"
             "stderr: err\nstdout: out")
+
+
+class TestPhaseTimer(trove_testtools.TestCase):
+
+    def test_phases_accumulate_in_order(self):
+        timer = utils.PhaseTimer()
+        with patch.object(utils.time, 'time', side_effect=[0, 2, 2, 3, 5, 9]):
+            with timer.phase('first'):
+                pass
+            with timer.phase('second'):
+                pass
+            with timer.phase('first'):
+                pass
+        self.assertEqual([('first', 6), ('second', 1)],
+                         list(timer.timings.items()))
+        self.assertEqual(7, timer.total)
+
+    def test_phase_timed_on_error(self):
+        timer = utils.PhaseTimer()
+
+        def fail():
+            with timer.phase('failing'):
+                raise RuntimeError()
+
+        self.assertRaises(RuntimeError, fail)
+        self.assertIn('failing', timer.timings)
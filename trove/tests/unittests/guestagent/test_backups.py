@@ -11,15 +11,38 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import os
+import shutil
+import tempfile
+
+import eventlet
 import mock
 from mock import ANY, DEFAULT, patch
 from testtools.testcase import ExpectedException
+from trove.common import cfg
 from trove.common import exception
 from trove.common import utils
+from trove.guestagent.common.compression import gzip_block
 from trove.guestagent.common.operating_system import FileMode
+from trove.guestagent.datastore.experimental.redis.client import RedisError
+from trove.guestagent.datastore.experimental.redis import (
+    service as redis_service)
+from trove.guestagent.strategies.backup.experimental import (
+    cassandra_impl as cass_backup_impl)
+from trove.guestagent.strategies.backup.experimental import (
+    postgresql_impl as pg_backup_impl)
+from trove.guestagent.strategies.backup.experimental import (
+    redis_impl as redis_backup_impl)
 from trove.guestagent.strategies.backup import base as backupBase
 from trove.guestagent.strategies.backup import mysql_impl
+from trove.guestagent.strategies.compression import impl as compression_impl
 from trove.guestagent.strategies.restore import base as restoreBase
+from trove.guestagent.strategies.restore.experimental import (
+    cassandra_impl as cass_restore_impl)
+from trove.guestagent.strategies.restore.experimental import (
+    postgresql_impl as pg_restore_impl)
+from trove.guestagent.strategies.restore.experimental import (
+    redis_impl as redis_restore_impl)
 from trove.guestagent.strategies.restore.mysql_impl import MySQLRestoreMixin
 from trove.tests.unittests import trove_testtools
 
@@ -35,6 +58,10 @@ BACKUP_SQLDUMP_CLS = ("trove.guestagent.strategies.backup."
                       "mysql_impl.MySQLDump")
 RESTORE_SQLDUMP_CLS = ("trove.guestagent.strategies.restore."
                        "mysql_impl.MySQLDump")
+BACKUP_MYDUMPER_CLS = ("trove.guestagent.strategies.backup."
+                       "mysql_impl.MyDumper")
+RESTORE_MYDUMPER_CLS = ("trove.guestagent.strategies.restore."
+                        "mysql_impl.MyDumper")
 BACKUP_CBBACKUP_CLS = ("trove.guestagent.strategies.backup."
                        "experimental.couchbase_impl.CbBackup")
 RESTORE_CBBACKUP_CLS = ("trove.guestagent.strategies.restore."
@@ -43,6 +70,30 @@ BACKUP_MONGODUMP_CLS = ("trove.guestagent.strategies.backup."
                         "experimental.mongo_impl.MongoDump")
 RESTORE_MONGODUMP_CLS = ("trove.guestagent.strategies.restore."
                          "experimental.mongo_impl.MongoDump")
+BACKUP_MONGOARCHIVE_CLS = ("trove.guestagent.strategies.backup."
+                           "experimental.mongo_impl.MongoDumpArchive")
+RESTORE_MONGOARCHIVE_CLS = ("trove.guestagent.strategies.restore."
+                            "experimental.mongo_impl.MongoDumpArchive")
+BACKUP_PGBASEBACKUP_CLS = ("trove.guestagent.strategies.backup."
+                           "experimental.postgresql_impl.PgBaseBackup")
+BACKUP_PGBASEBACKUP_INCR_CLS = ("trove.guestagent.strategies.backup."
+                                "experimental.postgresql_impl."
+                                "PgBaseBackupIncremental")
+RESTORE_PGDUMP_CLS = ("trove.guestagent.strategies.restore."
+                      "experimental.postgresql_impl.PgDump")
+RESTORE_PGBASEBACKUP_CLS = ("trove.guestagent.strategies.restore."
+                            "experimental.postgresql_impl.PgBaseBackup")
+RESTORE_PGBASEBACKUP_INCR_CLS = ("trove.guestagent.strategies.restore."
+                                 "experimental.postgresql_impl."
+                                 "PgBaseBackupIncremental")
+BACKUP_REDIS_CLS = ("trove.guestagent.strategies.backup."
+                    "experimental.redis_impl.RedisBackup")
+RESTORE_REDIS_CLS = ("trove.guestagent.strategies.restore."
+                     "experimental.redis_impl.RedisBackup")
+BACKUP_CASSANDRA_CLS = ("trove.guestagent.strategies.backup."
+                        "experimental.cassandra_impl.NodetoolSnapshot")
+RESTORE_CASSANDRA_CLS = ("trove.guestagent.strategies.restore."
+                         "experimental.cassandra_impl.NodetoolSnapshot")
 
 PIPE = " | "
 ZIP = "gzip"
@@ -62,6 +113,13 @@ SQLDUMP_BACKUP_RAW = ("mysqldump --all-databases %(extra_opts)s "
 SQLDUMP_BACKUP = SQLDUMP_BACKUP_RAW % {'extra_opts': ''}
 SQLDUMP_BACKUP_EXTRA_OPTS = (SQLDUMP_BACKUP_RAW %
                              {'extra_opts': '--events --routines --triggers'})
+MYDUMPER_BACKUP_RAW = ("sudo mydumper --stream --threads=4"
+                       " --outputdir=/tmp/mydumper %(extra_opts)s"
+                       " --password=password -u os_admin"
+                       " 2>/tmp/mydumper.log")
+MYDUMPER_BACKUP = MYDUMPER_BACKUP_RAW % {'extra_opts': ''}
+MYDUMPER_RESTORE = ("sudo myloader --stream --threads=4 --overwrite-tables"
+                    " --innodb-optimize-keys --verbose=1")
 XTRA_RESTORE_RAW = "sudo xbstream -x -C %(restore_location)s"
 XTRA_RESTORE = XTRA_RESTORE_RAW % {'restore_location': '/var/lib/mysql'}
 XTRA_INCR_PREPARE = ("sudo innobackupex --apply-log"
@@ -83,6 +141,41 @@ MONGODUMP_CMD = "sudo tar cPf - /var/lib/mongodb/dump"
 
 MONGODUMP_RESTORE = "sudo tar xPf -"
 
+PGBASEBACKUP_CMD = ("sudo -u postgres pg_basebackup --pgdata=- --format=tar"
+                    " --xlog --checkpoint=fast --label=12345 "
+                    " 2>/tmp/pgbasebackup.log")
+
+PGBASEBACKUP_RESTORE = "sudo -u postgres tar -xf - -C /var/lib/postgresql/%s"
+
+PG_BACKUP_HISTORY = """START WAL LOCATION: 0/5000028 (file %(start)s)
+STOP WAL LOCATION: 0/50000F8 (file %(stop)s)
+CHECKPOINT LOCATION: 0/5000060
+BACKUP METHOD: streamed
+BACKUP FROM: master
+START TIME: 2015-06-01 12:00:00 UTC
+LABEL: 12345
+STOP TIME: 2015-06-01 12:00:01 UTC
+"""
+
+MONGOARCHIVE_CMD = ("sudo mongodump --archive --numParallelCollections=4 "
+                    " 2>/tmp/mongodump.log")
+
+MONGOARCHIVE_RESTORE = ("sudo mongorestore --archive"
+                        " --numParallelCollections=4 --quiet")
+
+REDIS_BACKUP_CMD = "sudo cat /var/lib/redis/dump.rdb"
+
+REDIS_RESTORE = "sudo tee /var/lib/redis/dump.rdb >/dev/null"
+
+CASSANDRA_KEYSPACE_CMD = ("sudo tar -cf - -C /var/lib/cassandra/data"
+                          " --transform=s#/snapshots/12345##"
+                          " ks/t1/snapshots/12345 ks/t2/snapshots/12345")
+
+CASSANDRA_RESTORE = "sudo tar -xif - -C /var/lib/cassandra/data"
+
+REDIS_OPTIONS = {'dir': '/var/lib/redis', 'dbfilename': 'dump.rdb',
+                 'appendonly': 'no'}
+
 
 class GuestAgentBackupTest(trove_testtools.TestCase):
 
@@ -124,6 +217,77 @@ class GuestAgentBackupTest(trove_testtools.TestCase):
                          bkup.command)
         self.assertEqual("12345.xbstream.gz.enc", bkup.manifest)
 
+    @patch.multiple(backupBase.BackupRunner, compression_workers=4,
+                    is_zipped=True, is_encrypted=False)
+    def test_backup_agent_zipped_xtrabackup_command(self):
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        self.assertEqual(XTRA_BACKUP, bkup.command)
+        self.assertEqual("12345.xbstream.gz", bkup.manifest)
+
+    @patch.multiple(backupBase.BackupRunner, compression_workers=4,
+                    is_zipped=True, is_encrypted=True, encrypt_in_agent=True,
+                    encrypt_key=CRYPTO_KEY)
+    def test_backup_agent_encrypted_xtrabackup_command(self):
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        self.assertEqual(XTRA_BACKUP, bkup.command)
+        self.assertEqual("12345.xbstream.gz.aenc", bkup.manifest)
+
+    @patch.multiple(backupBase.BackupRunner, compression_workers=4,
+                    is_zipped=True, is_encrypted=True, encrypt_key=CRYPTO_KEY)
+    def test_backup_agent_zipped_encrypted_xtrabackup_command(self):
+        # OpenSSL runs after gzip, so both stay in the pipeline.
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        self.assertEqual(XTRA_BACKUP + PIPE + ZIP + PIPE + ENCRYPT,
+                         bkup.command)
+
+    @patch.multiple(backupBase.BackupRunner, compression_workers=4,
+                    is_zipped=True, is_encrypted=True, encrypt_key=CRYPTO_KEY)
+    def test_backup_storage_encoded_xtrabackup_command(self):
+        # A deduplicating storage compresses and encrypts each chunk.
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="", storage_extension='.dedup')
+        self.assertEqual(XTRA_BACKUP, bkup.command)
+        self.assertEqual("12345.xbstream.dedup", bkup.manifest)
+        self.assertIsNone(bkup.compression)
+        stream = iter(['data'])
+        self.assertIs(stream, bkup._agent_stages(stream))
+
+    @patch.multiple(backupBase.BackupRunner, compression_workers=0,
+                    is_zipped=True, is_encrypted=False)
+    def test_backup_compression_level_xtrabackup_command(self):
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="",
+                           compressor=compression_impl.Gzip(level=1))
+        self.assertEqual(XTRA_BACKUP + PIPE + ZIP + " -1", bkup.command)
+        self.assertEqual("12345.xbstream.gz", bkup.manifest)
+        self.assertEqual("gzip", bkup.compression)
+
+    @patch.multiple(backupBase.BackupRunner, compression_workers=0,
+                    is_zipped=True, is_encrypted=False)
+    def test_backup_lz4_xtrabackup_command(self):
+        # LZ4 has no command, so the agent compresses regardless of the
+        # number of compression workers.
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="",
+                           compressor=compression_impl.Lz4())
+        self.assertEqual(XTRA_BACKUP, bkup.command)
+        self.assertEqual("12345.xbstream.lz4", bkup.manifest)
+        self.assertEqual("lz4", bkup.compression)
+
+    @patch.multiple(backupBase.BackupRunner, compression_workers=0,
+                    is_zipped=True, is_encrypted=True, encrypt_key=CRYPTO_KEY)
+    def test_backup_lz4_encrypted_xtrabackup_command(self):
+        # OpenSSL has to run after the compression, so gzip is used.
+        RunnerClass = utils.import_class(BACKUP_XTRA_CLS)
+        bkup = RunnerClass(12345, extra_opts="",
+                           compressor=compression_impl.Lz4())
+        self.assertEqual(XTRA_BACKUP + PIPE + ZIP + PIPE + ENCRYPT,
+                         bkup.command)
+        self.assertEqual("12345.xbstream.gz.enc", bkup.manifest)
+
     def test_backup_xtrabackup_incremental(self):
         backupBase.BackupRunner.is_zipped = True
         backupBase.BackupRunner.is_encrypted = False
@@ -182,6 +346,51 @@ class GuestAgentBackupTest(trove_testtools.TestCase):
                          bkup.command)
         self.assertEqual("12345.gz.enc", bkup.manifest)
 
+    def test_backup_mydumper_command(self):
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        RunnerClass = utils.import_class(BACKUP_MYDUMPER_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        self.assertEqual(MYDUMPER_BACKUP + PIPE + ZIP, bkup.command)
+        self.assertEqual("12345.mydumper.gz", bkup.manifest)
+
+    def test_backup_mydumper_with_extra_opts_command(self):
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        RunnerClass = utils.import_class(BACKUP_MYDUMPER_CLS)
+        bkup = RunnerClass(12345, extra_opts="--rows=100000")
+        self.assertEqual(MYDUMPER_BACKUP_RAW % {'extra_opts': '--rows=100000'}
+                         + PIPE + ZIP, bkup.command)
+
+    def test_backup_mydumper_threads(self):
+        backupBase.BackupRunner.is_zipped = False
+        backupBase.BackupRunner.is_encrypted = False
+        cfg.CONF.set_override('backup_dump_threads', 16)
+        self.addCleanup(cfg.CONF.clear_override, 'backup_dump_threads')
+        RunnerClass = utils.import_class(BACKUP_MYDUMPER_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        self.assertIn(' --threads=16 ', bkup.command)
+
+    def test_backup_mydumper_check_process(self):
+        RunnerClass = utils.import_class(BACKUP_MYDUMPER_CLS)
+        bkup = RunnerClass(12345, extra_opts="")
+        with patch('%s.open' % mysql_impl.__name__,
+                   mock.mock_open(read_data=''), create=True):
+            self.assertTrue(bkup.check_process())
+        with patch('%s.open' % mysql_impl.__name__, mock.mock_open(
+                read_data='** (mydumper:1): CRITICAL **: Error dumping '
+                          'table (db.t) data: Lost connection\n'),
+                create=True):
+            self.assertFalse(bkup.check_process())
+
+    def test_restore_mydumper_command(self):
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        RunnerClass = utils.import_class(RESTORE_MYDUMPER_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            location="filename", checksum="md5")
+        self.assertEqual(UNZIP + PIPE + MYDUMPER_RESTORE, restr.restore_cmd)
+
     def test_restore_decrypted_xtrabackup_command(self):
         restoreBase.RestoreRunner.is_zipped = True
         restoreBase.RestoreRunner.is_encrypted = False
@@ -202,6 +411,50 @@ class GuestAgentBackupTest(trove_testtools.TestCase):
                          restr.restore_cmd)
         self.assertEqual(PREPARE, restr.prepare_cmd)
 
+    @patch.multiple(restoreBase.RestoreRunner, compression_workers=0,
+                    is_zipped=True, is_encrypted=True, decrypt_key=CRYPTO_KEY)
+    def test_restore_agent_decrypted_xtrabackup_command(self):
+        RunnerClass = utils.import_class(RESTORE_XTRA_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            location="123.xbstream.gz.aenc", checksum="md5")
+        self.assertEqual(UNZIP + PIPE + XTRA_RESTORE, restr.restore_cmd)
+        # Backups encrypted by openssl still go through it.
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            location="123.xbstream.gz.enc", checksum="md5")
+        self.assertEqual(DECRYPT + PIPE + UNZIP + PIPE + XTRA_RESTORE,
+                         restr.restore_cmd)
+
+    @patch.multiple(restoreBase.RestoreRunner, compression_workers=0,
+                    is_zipped=True, is_encrypted=True, decrypt_key=CRYPTO_KEY)
+    def test_restore_storage_decoded_xtrabackup_command(self):
+        RunnerClass = utils.import_class(RESTORE_XTRA_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            location="123.xbstream.dedup", checksum="md5")
+        self.assertEqual(XTRA_RESTORE, restr.restore_cmd)
+        self.assertIsNone(restr._compressor(restr.location))
+
+    @patch.multiple(restoreBase.RestoreRunner, compression_workers=4,
+                    is_zipped=True, is_encrypted=False)
+    def test_restore_agent_unzipped_xtrabackup_command(self):
+        RunnerClass = utils.import_class(RESTORE_XTRA_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            location="filename", checksum="md5")
+        self.assertEqual(XTRA_RESTORE, restr.restore_cmd)
+
+    @patch.multiple(restoreBase.RestoreRunner, compression_workers=0,
+                    is_zipped=True, is_encrypted=False)
+    def test_restore_lz4_xtrabackup_command(self):
+        RunnerClass = utils.import_class(RESTORE_XTRA_CLS)
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            location="123.xbstream.lz4", checksum="md5")
+        self.assertEqual(XTRA_RESTORE, restr.restore_cmd)
+        self.assertIsInstance(restr._compressor(restr.location),
+                              compression_impl.Lz4)
+        # Backups are decompressed as their name says, not as configured.
+        restr = RunnerClass(None, restore_location="/var/lib/mysql",
+                            location="123.xbstream.gz", checksum="md5")
+        self.assertEqual(UNZIP + PIPE + XTRA_RESTORE, restr.restore_cmd)
+
     def test_restore_xtrabackup_incremental_prepare_command(self):
         RunnerClass = utils.import_class(RESTORE_XTRA_INCR_CLS)
         restr = RunnerClass(None, restore_location="/var/lib/mysql",
@@ -248,6 +501,106 @@ class GuestAgentBackupTest(trove_testtools.TestCase):
         observed = restr._incremental_restore_cmd('/foo/bar/')
         self.assertEqual(expected, observed)
 
+    def _incremental_chain_runner(self):
+        metadata = {
+            'inc2': {'parent_location': 'inc1', 'parent_checksum': 'md5-1'},
+            'inc1': {'parent_location': 'full', 'parent_checksum': 'md5-0'},
+            'full': {},
+        }
+        storage = mock.Mock()
+        storage.load_metadata.side_effect = (
+            lambda location, checksum: metadata[location])
+        RunnerClass = utils.import_class(RESTORE_XTRA_INCR_CLS)
+        return RunnerClass(storage, restore_location="/var/lib/mysql",
+                           location="inc2", checksum="md5-2")
+
+    def test_restore_xtrabackup_incremental_chain(self):
+        restr = self._incremental_chain_runner()
+        self.assertEqual([('full', 'md5-0', None),
+                          ('inc1', 'md5-1', '/var/lib/mysql/md5-1'),
+                          ('inc2', 'md5-2', '/var/lib/mysql/md5-2')],
+                         restr._backup_chain('inc2', 'md5-2'))
+        self.assertEqual(3, restr.storage.load_metadata.call_count)
+
+    @patch('trove.guestagent.common.operating_system.remove')
+    @patch('trove.guestagent.common.operating_system.create_directory')
+    def test_restore_xtrabackup_incremental_prefetch(self, *mocks):
+        restr = self._incremental_chain_runner()
+        events = []
+
+        def unpack(location, checksum, command):
+            events.append(('unpack', location))
+            eventlet.sleep(0)
+            events.append(('unpacked', location))
+            return 10
+
+        def prepare(incremental_dir):
+            events.append(('prepare', incremental_dir))
+            eventlet.sleep(0)
+            eventlet.sleep(0)
+            events.append(('prepared', incremental_dir))
+
+        with patch.multiple(restr, _unpack=mock.Mock(side_effect=unpack),
+                            _incremental_prepare=mock.Mock(
+                                side_effect=prepare)):
+            self.assertEqual(30, restr._run_restore())
+        # The next backup is unpacked while the previous one is prepared.
+        self.assertEqual([('unpack', 'full'), ('unpacked', 'full'),
+                          ('prepare', None), ('unpack', 'inc1'),
+                          ('unpacked', 'inc1'), ('prepared', None),
+                          ('prepare', '/var/lib/mysql/md5-1'),
+                          ('unpack', 'inc2'), ('unpacked', 'inc2'),
+                          ('prepared', '/var/lib/mysql/md5-1'),
+                          ('prepare', '/var/lib/mysql/md5-2'),
+                          ('prepared', '/var/lib/mysql/md5-2')], events)
+
+    @patch('trove.guestagent.common.operating_system.remove')
+    @patch('trove.guestagent.common.operating_system.create_directory')
+    def test_restore_xtrabackup_incremental_prepare_fails(self, _, remove):
+        # Greenthreads can only be killed once the hub has run, as it always
+        # has in the guest agent.
+        eventlet.sleep(0)
+        restr = self._incremental_chain_runner()
+        unpack = mock.Mock(return_value=10)
+        with patch.multiple(restr, _unpack=unpack,
+                            _incremental_prepare=mock.Mock(
+                                side_effect=exception.ProcessExecutionError)):
+            self.assertRaises(exception.ProcessExecutionError,
+                              restr._run_restore)
+        # The prefetch of the first incremental is cancelled and what it
+        # unpacked is removed.
+        self.assertEqual(1, unpack.call_count)
+        remove.assert_called_once_with('/var/lib/mysql/md5-1', force=True,
+                                       as_root=True)
+
+    @patch.object(restoreBase.os, 'killpg')
+    @patch.object(restoreBase.subprocess, 'Popen')
+    def test_restore_unpack_cancelled(self, mock_popen, mock_killpg):
+        unpacking = eventlet.event.Event()
+
+        def load(location, checksum):
+            yield 'chunk'
+            unpacking.send()
+            eventlet.sleep(10)
+            yield 'chunk'
+
+        restoreBase.RestoreRunner.is_zipped = False
+        restoreBase.RestoreRunner.is_encrypted = False
+        storage = mock.Mock()
+        storage.load.side_effect = load
+        RunnerClass = utils.import_class(RESTORE_XTRA_CLS)
+        restr = RunnerClass(storage, restore_location="/var/lib/mysql",
+                            location="filename", checksum="md5")
+        unpack = eventlet.spawn(restr._unpack, 'filename', 'md5', 'command')
+        unpacking.wait()
+        unpack.kill()
+        # The restore command is stopped and reaped.
+        process = mock_popen.return_value
+        process.stdin.write.assert_called_once_with('chunk')
+        process.stdin.close.assert_called_once_with()
+        mock_killpg.assert_called_once_with(process.pid, ANY)
+        process.wait.assert_called_once_with()
+
     def test_restore_decrypted_mysqldump_command(self):
         restoreBase.RestoreRunner.is_zipped = True
         restoreBase.RestoreRunner.is_encrypted = False
@@ -360,6 +713,38 @@ class GuestAgentBackupTest(trove_testtools.TestCase):
         self.assertEqual(restr.restore_cmd,
                          DECRYPT + PIPE + UNZIP + PIPE + MONGODUMP_RESTORE)
 
+    def test_backup_mongodump_archive_command(self):
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        RunnerClass = utils.import_class(BACKUP_MONGOARCHIVE_CLS)
+        bkp = RunnerClass(12345, extra_opts='')
+        self.assertEqual(MONGOARCHIVE_CMD + PIPE + ZIP, bkp.command)
+        self.assertEqual('12345.archive.gz', bkp.manifest)
+
+    def test_backup_mongodump_archive_check_process(self):
+        RunnerClass = utils.import_class(BACKUP_MONGOARCHIVE_CLS)
+        bkp = RunnerClass(12345, extra_opts='')
+        module = RunnerClass.__module__
+        with patch('%s.open' % module, mock.mock_open(
+                read_data='done dumping db.coll (10 documents)\n'),
+                create=True):
+            self.assertTrue(bkp.check_process())
+        with patch('%s.open' % module, mock.mock_open(
+                read_data='Failed: error writing data for collection\n'),
+                create=True):
+            self.assertFalse(bkp.check_process())
+
+    def test_restore_mongodump_archive_command(self):
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        cfg.CONF.set_override('backup_dump_threads', 8)
+        self.addCleanup(cfg.CONF.clear_override, 'backup_dump_threads')
+        RunnerClass = utils.import_class(RESTORE_MONGOARCHIVE_CLS)
+        restr = RunnerClass(None, restore_location="/tmp",
+                            location="filename", checksum="md5")
+        self.assertEqual(UNZIP + PIPE + MONGOARCHIVE_RESTORE.replace(
+            'Collections=4', 'Collections=8'), restr.restore_cmd)
+
 
 class CouchbaseBackupTests(trove_testtools.TestCase):
 
@@ -518,3 +903,454 @@ class MongodbRestoreTests(trove_testtools.TestCase):
         self.restore_runner.post_restore = mock.Mock()
         self.assertRaises(exception.ProcessExecutionError,
                           self.restore_runner.restore)
+
+
+class PostgresqlBackupTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(PostgresqlBackupTests, self).setUp()
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        self.backup_runner = utils.import_class(BACKUP_PGBASEBACKUP_CLS)
+        self.incremental_runner = utils.import_class(
+            BACKUP_PGBASEBACKUP_INCR_CLS)
+        self.wal_files = ['000000010000000000000003',
+                          '000000010000000000000004',
+                          '000000010000000000000005',
+                          '000000010000000000000005.00000028.backup']
+        self.history = PG_BACKUP_HISTORY % {
+            'start': '000000010000000000000005',
+            'stop': '000000010000000000000005'}
+        listdir_patch = patch.object(pg_backup_impl.os, 'listdir',
+                                     side_effect=lambda path: self.wal_files)
+        listdir_patch.start()
+        self.addCleanup(listdir_patch.stop)
+        exec_patch = patch.object(utils, 'execute_with_timeout',
+                                  side_effect=lambda *args, **kwargs: (
+                                      self.history, ''))
+        self.execute = exec_patch.start()
+        self.addCleanup(exec_patch.stop)
+        poll_patch = patch.object(utils, 'poll_until',
+                                  side_effect=lambda retriever, **kwargs:
+                                  retriever())
+        poll_patch.start()
+        self.addCleanup(poll_patch.stop)
+
+    def test_backup_command(self):
+        bkup = self.backup_runner('12345', extra_opts='')
+        self.assertEqual(PGBASEBACKUP_CMD + PIPE + ZIP, bkup.command)
+        self.assertEqual('12345.tar.gz', bkup.manifest)
+
+    def test_backup_metadata(self):
+        bkup = self.backup_runner('12345', extra_opts='')
+        self.assertEqual({'label': '12345',
+                          'start_wal_file': '000000010000000000000005',
+                          'stop_wal_file': '000000010000000000000005'},
+                         bkup.metadata())
+        self.execute.assert_called_once_with(
+            'sudo', 'cat', os.path.join(
+                pg_backup_impl.WAL_ARCHIVE_DIR,
+                '000000010000000000000005.00000028.backup'), timeout=30)
+
+    @patch.object(utils, 'poll_until', side_effect=exception.PollTimeOut)
+    def test_backup_metadata_not_archived(self, poll_until):
+        bkup = self.backup_runner('12345', extra_opts='')
+        self.assertRaises(backupBase.BackupError, bkup.metadata)
+
+    @patch.object(pg_backup_impl.PgSqlConfig, '_get_psql_version',
+                  return_value='9.4')
+    @patch.object(pg_backup_impl.pgutil, 'execute')
+    def test_backup_cleans_up_wal_archive(self, execute, get_version):
+        bkup = self.backup_runner('12345', extra_opts='')
+        bkup._run_post_backup()
+        execute.assert_called_once_with(
+            '/usr/lib/postgresql/9.4/bin/pg_archivecleanup',
+            pg_backup_impl.WAL_ARCHIVE_DIR,
+            '000000010000000000000005.00000028.backup', timeout=120)
+
+    def test_incremental_backup_requires_parent(self):
+        self.assertRaises(AttributeError, self.incremental_runner, '12345',
+                          extra_opts='')
+
+    @patch.object(pg_backup_impl.pgutil, 'psql')
+    def test_incremental_backup_command(self, psql):
+        bkup = self.incremental_runner(
+            '12345', extra_opts='', stop_wal_file='000000010000000000000004',
+            parent_location='parent', parent_checksum='md5')
+        bkup._run_pre_backup()
+        self.assertEqual(2, psql.call_count)
+        self.assertEqual('sudo tar -cf - -C %s 000000010000000000000004 '
+                         '000000010000000000000005' %
+                         pg_backup_impl.WAL_ARCHIVE_DIR + PIPE + ZIP,
+                         bkup.command)
+        meta = bkup.metadata()
+        self.assertEqual('parent', meta['parent_location'])
+        self.assertEqual('000000010000000000000005', meta['stop_wal_file'])
+
+    @patch.object(pg_backup_impl.pgutil, 'psql')
+    def test_incremental_backup_parent_wal_cleaned_up(self, psql):
+        bkup = self.incremental_runner(
+            '12345', extra_opts='', stop_wal_file='000000010000000000000001',
+            parent_location='parent', parent_checksum='md5')
+        self.assertRaises(backupBase.BackupError, bkup._run_pre_backup)
+
+
+class PostgresqlRestoreTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(PostgresqlRestoreTests, self).setUp()
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        version_patch = patch.object(pg_restore_impl.PgSqlConfig,
+                                     '_get_psql_version', return_value='9.4')
+        version_patch.start()
+        self.addCleanup(version_patch.stop)
+
+    def test_restore_command(self):
+        restr = utils.import_class(RESTORE_PGBASEBACKUP_CLS)(
+            None, location='filename', checksum='md5')
+        self.assertEqual(UNZIP + PIPE + PGBASEBACKUP_RESTORE % '9.4/main',
+                         restr.restore_cmd)
+
+    @patch.object(pg_restore_impl.operating_system, 'create_directory')
+    @patch.object(pg_restore_impl.operating_system, 'remove')
+    @patch.object(pg_restore_impl.PgSqlConfig, 'stop_db')
+    def test_pre_restore(self, stop_db, remove, create_directory):
+        restr = utils.import_class(RESTORE_PGBASEBACKUP_CLS)(
+            None, location='filename', checksum='md5')
+        restr.pre_restore()
+        stop_db.assert_called_once_with(None)
+        data_dir = '/var/lib/postgresql/9.4/main'
+        remove.assert_any_call(data_dir, force=True, as_root=True)
+        create_directory.assert_any_call(data_dir, user='postgres',
+                                         group='postgres', as_root=True)
+        create_directory.assert_any_call(pg_restore_impl.WAL_ARCHIVE_DIR,
+                                         user='postgres', group='postgres',
+                                         as_root=True)
+
+    @patch.multiple(restoreBase.RestoreRunner, compression_workers=4,
+                    is_zipped=True, is_encrypted=False)
+    @patch.object(pg_restore_impl.subprocess, 'Popen')
+    def test_restore_pg_dump_unzipped_in_agent(self, mock_popen):
+        dump = 'CREATE DATABASE test;\n' * 100
+        storage = mock.Mock()
+        storage.load.return_value = iter([gzip_block(dump, 6)])
+        process = mock_popen.return_value
+        process.stderr.read.return_value = ''
+        restr = utils.import_class(RESTORE_PGDUMP_CLS)(
+            storage, location='filename', checksum='md5')
+        self.assertEqual(len(dump), restr._execute_postgres_restore())
+        # psql is fed the dump, not the gzipped backup.
+        mock_popen.assert_called_once_with('sudo -u postgres psql ',
+                                           shell=True, stdin=ANY,
+                                           stderr=ANY)
+        self.assertEqual(dump, ''.join(
+            args[0] for args, kwargs in process.stdin.write.call_args_list))
+
+    def test_restore_incremental_chain(self):
+        storage = mock.Mock()
+        storage.load_metadata.side_effect = [
+            {'parent_location': 'incr1', 'parent_checksum': 'md5-1'},
+            {'parent_location': 'full', 'parent_checksum': 'md5-0'},
+            {}]
+        restr = utils.import_class(RESTORE_PGBASEBACKUP_INCR_CLS)(
+            storage, location='incr2', checksum='md5-2')
+        with patch.object(restr, '_unpack', return_value=10) as unpack:
+            self.assertEqual(30, restr._run_restore())
+        restore = UNZIP + PIPE + "sudo -u postgres tar -xf - -C %s"
+        self.assertEqual(
+            [mock.call('full', 'md5-0',
+                       restore % '/var/lib/postgresql/9.4/main'),
+             mock.call('incr1', 'md5-1',
+                       restore % pg_restore_impl.WAL_ARCHIVE_DIR),
+             mock.call('incr2', 'md5-2',
+                       restore % pg_restore_impl.WAL_ARCHIVE_DIR)],
+            unpack.call_args_list)
+
+
+class RedisBackupTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(RedisBackupTests, self).setUp()
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        options_patch = patch.object(redis_service, '_load_redis_options',
+                                     return_value=REDIS_OPTIONS)
+        options_patch.start()
+        self.addCleanup(options_patch.stop)
+        self.client = mock.MagicMock()
+        self.client.__enter__.return_value = self.client
+        self.client.info.return_value = {'rdb_last_bgsave_status': 'ok'}
+        client_patch = patch.object(redis_service, 'get_redis_client',
+                                    return_value=self.client)
+        client_patch.start()
+        self.addCleanup(client_patch.stop)
+        poll_patch = patch.object(utils, 'poll_until',
+                                  side_effect=self._poll_until)
+        poll_patch.start()
+        self.addCleanup(poll_patch.stop)
+        time_patch = patch.object(redis_backup_impl.time, 'time',
+                                  return_value=1000.5)
+        time_patch.start()
+        self.addCleanup(time_patch.stop)
+        self.backup_runner = utils.import_class(BACKUP_REDIS_CLS)
+
+    def _poll_until(self, retriever, condition, **kwargs):
+        while True:
+            result = retriever()
+            if condition(result):
+                return result
+
+    def test_backup_command(self):
+        bkup = self.backup_runner('12345', extra_opts='')
+        self.assertEqual(REDIS_BACKUP_CMD + PIPE + ZIP, bkup.command)
+        self.assertEqual('12345.rdb.gz', bkup.manifest)
+
+    def test_backup_waits_for_snapshot(self):
+        self.client.execute.side_effect = [990, 'OK', 990, 990, 1001]
+        bkup = self.backup_runner('12345', extra_opts='')
+        bkup._run_pre_backup()
+        self.assertEqual([mock.call('LASTSAVE'), mock.call('BGSAVE'),
+                          mock.call('LASTSAVE'), mock.call('LASTSAVE'),
+                          mock.call('LASTSAVE')],
+                         self.client.execute.call_args_list)
+
+    @patch.object(redis_backup_impl.eventlet, 'sleep')
+    def test_backup_after_save_in_same_second(self, sleep):
+        self.client.execute.side_effect = [1000, 'OK', 1001]
+        bkup = self.backup_runner('12345', extra_opts='')
+        bkup._run_pre_backup()
+        sleep.assert_called_once_with(1)
+
+    def test_backup_snapshot_in_progress(self):
+        self.client.execute.side_effect = [
+            990, RedisError('ERR Background save already in progress'),
+            1001]
+        bkup = self.backup_runner('12345', extra_opts='')
+        bkup._run_pre_backup()
+
+    def test_backup_snapshot_failed(self):
+        self.client.execute.side_effect = [990, 'OK', 1001]
+        self.client.info.return_value = {'rdb_last_bgsave_status': 'err'}
+        bkup = self.backup_runner('12345', extra_opts='')
+        self.assertRaises(backupBase.BackupError, bkup._run_pre_backup)
+
+    def test_backup_snapshot_timeout(self):
+        self.client.execute.return_value = 990
+        bkup = self.backup_runner('12345', extra_opts='')
+        with patch.object(utils, 'poll_until',
+                          side_effect=exception.PollTimeOut):
+            self.assertRaises(backupBase.BackupError, bkup._run_pre_backup)
+
+
+class RedisRestoreTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(RedisRestoreTests, self).setUp()
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        self.options = dict(REDIS_OPTIONS)
+        options_patch = patch.object(redis_service, '_load_redis_options',
+                                     side_effect=lambda: self.options)
+        options_patch.start()
+        self.addCleanup(options_patch.stop)
+        app_patch = patch.object(redis_service, 'RedisApp')
+        self.app = app_patch.start().return_value
+        self.addCleanup(app_patch.stop)
+        chown_patch = patch.object(redis_restore_impl.operating_system,
+                                   'chown')
+        chown_patch.start()
+        self.addCleanup(chown_patch.stop)
+
+    def _restore_runner(self):
+        return utils.import_class(RESTORE_REDIS_CLS)(
+            None, location='filename', checksum='md5')
+
+    def test_restore_command(self):
+        self.assertEqual(UNZIP + PIPE + REDIS_RESTORE,
+                         self._restore_runner().restore_cmd)
+
+    @patch.object(utils, 'execute_with_timeout')
+    def test_pre_restore(self, execute):
+        self._restore_runner().pre_restore()
+        self.app.stop_db.assert_called_once_with()
+        execute.assert_any_call('rm', '-f', '/var/lib/redis/dump.rdb',
+                                run_as_root=True, root_helper='sudo')
+        execute.assert_any_call('rm', '-f', '/var/lib/redis/appendonly.aof',
+                                run_as_root=True, root_helper='sudo')
+
+    def test_post_restore(self):
+        self._restore_runner().post_restore()
+        self.app.start_redis.assert_called_once_with()
+        self.assertFalse(self.app.write_config.called)
+
+    @patch.object(utils, 'poll_until',
+                  side_effect=lambda retriever, condition, **kwargs:
+                  retriever())
+    @patch.object(redis_service, 'get_redis_client')
+    def test_post_restore_append_only(self, get_client, poll_until):
+        self.options['appendonly'] = 'yes'
+        client = get_client.return_value.__enter__.return_value
+        client.info.return_value = {'aof_last_bgrewrite_status': 'ok'}
+        config = 'appendonly yes\nappendfilename appendonly.aof\n'
+        with patch.object(redis_restore_impl, 'open',
+                          mock.mock_open(read_data=config), create=True):
+            self._restore_runner().post_restore()
+        client.execute.assert_called_once_with('BGREWRITEAOF')
+        self.assertEqual(
+            [mock.call(config.replace('appendonly yes', 'appendonly no')),
+             mock.call(config)],
+            self.app.write_config.call_args_list)
+        self.assertEqual(2, self.app.start_redis.call_count)
+        self.app.stop_db.assert_called_once_with()
+
+    @patch.object(utils, 'poll_until',
+                  side_effect=lambda retriever, condition, **kwargs:
+                  retriever())
+    @patch.object(redis_service, 'get_redis_client')
+    def test_post_restore_append_only_rewrite_failed(self, get_client,
+                                                     poll_until):
+        self.options['appendonly'] = 'yes'
+        client = get_client.return_value.__enter__.return_value
+        client.info.return_value = {'aof_last_bgrewrite_status': 'err'}
+        config = 'appendonly yes\n'
+        with patch.object(redis_restore_impl, 'open',
+                          mock.mock_open(read_data=config), create=True):
+            self.assertRaises(restoreBase.RestoreError,
+                              self._restore_runner().post_restore)
+        # The configuration is put back even though the restore failed.
+        self.app.write_config.assert_called_with(config)
+
+
+class CassandraBackupTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(CassandraBackupTests, self).setUp()
+        backupBase.BackupRunner.is_zipped = True
+        backupBase.BackupRunner.is_encrypted = False
+        exec_patch = patch.object(utils, 'execute_with_timeout')
+        self.execute = exec_patch.start()
+        self.addCleanup(exec_patch.stop)
+        self.backup_runner = utils.import_class(BACKUP_CASSANDRA_CLS)
+
+    def _make_snapshot(self, tag):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        for table in ('ks/t1', 'ks/t2', 'system/local-7ad54392',
+                      'system/schema_keyspaces-b0f22357'):
+            os.makedirs(os.path.join(data_dir, table, 'snapshots', tag))
+        os.makedirs(os.path.join(data_dir, 'empty', 't3'))
+        return data_dir
+
+    def test_snapshot_tables(self):
+        data_dir = self._make_snapshot('12345')
+        self.assertEqual(
+            [('ks', ['ks/t1/snapshots/12345', 'ks/t2/snapshots/12345']),
+             ('system', ['system/schema_keyspaces-b0f22357/snapshots/12345'])],
+            list(cass_backup_impl.snapshot_tables(data_dir,
+                                                  '12345').items()))
+
+    def test_backup_command(self):
+        bkup = self.backup_runner('12345', extra_opts='')
+        self.assertEqual('cat' + PIPE + ZIP, bkup.command)
+        self.assertEqual('12345.tar.gz', bkup.manifest)
+        self.assertEqual(CASSANDRA_KEYSPACE_CMD, bkup._keyspace_command(
+            ['ks/t1/snapshots/12345', 'ks/t2/snapshots/12345']))
+
+    def test_snapshot_reader(self):
+        reader = cass_backup_impl.SnapshotReader(
+            ['printf one', 'printf two', 'printf three'], 2)
+        self.assertEqual('onetwothree', reader.read(100))
+        self.assertEqual('', reader.read(100))
+
+    def test_snapshot_reader_command_failed(self):
+        reader = cass_backup_impl.SnapshotReader(
+            ['printf one', 'false', 'printf three'], 2)
+        self.assertRaises(backupBase.BackupError, reader.read, 100)
+        reader.close()
+        self.assertEqual('', reader.read(100))
+
+    @patch.object(cass_backup_impl, 'snapshot_tables',
+                  side_effect=OSError('No such file or directory'))
+    def test_snapshot_failed(self, snapshot_tables):
+        bkup = self.backup_runner('12345', extra_opts='')
+        self.assertRaises(OSError, bkup._run_pre_backup)
+        self.execute.assert_called_with('nodetool', 'clearsnapshot', '-t',
+                                        '12345', timeout=600)
+
+    @patch.object(cass_backup_impl, 'snapshot_tables',
+                  return_value={'ks1': ['one'], 'ks2': ['two']})
+    def test_backup(self, snapshot_tables):
+        self.backup_runner.is_zipped = False
+        self.addCleanup(setattr, self.backup_runner, 'is_zipped', True)
+        bkup = self.backup_runner('12345', extra_opts='')
+        with patch.object(bkup, '_keyspace_command',
+                          side_effect=lambda paths: 'printf %s' % paths[0]):
+            with bkup:
+                self.assertEqual('onetwo', bkup.read(100))
+                self.assertEqual('', bkup.read(100))
+        self.assertEqual(
+            [mock.call('nodetool', 'snapshot', '-t', '12345', timeout=600),
+             mock.call('nodetool', 'clearsnapshot', '-t', '12345',
+                       timeout=600)],
+            self.execute.call_args_list)
+
+    @patch.object(cass_backup_impl, 'snapshot_tables',
+                  return_value={'ks1': ['one'], 'ks2': ['two']})
+    def test_backup_keyspace_failed(self, snapshot_tables):
+        self.backup_runner.is_zipped = False
+        self.addCleanup(setattr, self.backup_runner, 'is_zipped', True)
+        bkup = self.backup_runner('12345', extra_opts='')
+        with patch.object(bkup, '_keyspace_command',
+                          side_effect=['printf one', 'false']):
+            with ExpectedException(backupBase.BackupError):
+                with bkup:
+                    while bkup.read(100):
+                        pass
+        self.execute.assert_called_with('nodetool', 'clearsnapshot', '-t',
+                                        '12345', timeout=600)
+
+
+class CassandraRestoreTests(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(CassandraRestoreTests, self).setUp()
+        restoreBase.RestoreRunner.is_zipped = True
+        restoreBase.RestoreRunner.is_encrypted = False
+        app_patch = patch.object(cass_restore_impl.service, 'CassandraApp')
+        self.app = app_patch.start().return_value
+        self.addCleanup(app_patch.stop)
+        self.restore_runner = utils.import_class(RESTORE_CASSANDRA_CLS)(
+            None, location='filename', checksum='md5')
+
+    def test_restore_command(self):
+        self.assertEqual(UNZIP + PIPE + CASSANDRA_RESTORE,
+                         self.restore_runner.restore_cmd)
+
+    @patch.object(cass_restore_impl.operating_system, 'remove')
+    @patch.object(cass_restore_impl.os, 'listdir')
+    def test_pre_restore(self, listdir, remove):
+        listdir.side_effect = lambda path: {
+            '/var/lib/cassandra/data': ['ks', 'system'],
+            '/var/lib/cassandra/data/system': ['local-7ad54392',
+                                               'schema_keyspaces-b0f22357'],
+        }[path]
+        self.restore_runner.pre_restore()
+        self.app.stop_db.assert_called_once_with()
+        self.assertEqual(
+            [mock.call('/var/lib/cassandra/data/ks', force=True,
+                       as_root=True),
+             mock.call('/var/lib/cassandra/data/system/'
+                       'schema_keyspaces-b0f22357', force=True, as_root=True),
+             mock.call('/var/lib/cassandra/commitlog', force=True,
+                       as_root=True),
+             mock.call('/var/lib/cassandra/saved_caches', force=True,
+                       as_root=True)],
+            remove.call_args_list)
+
+    @patch.object(cass_restore_impl.operating_system, 'chown')
+    def test_post_restore(self, chown):
+        self.restore_runner.post_restore()
+        chown.assert_called_once_with('/var/lib/cassandra/data', 'cassandra',
+                                      'cassandra', as_root=True)
+        self.app.start_db.assert_called_once_with()
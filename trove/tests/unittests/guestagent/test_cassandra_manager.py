@@ -15,11 +15,13 @@
 import os
 
 from mock import MagicMock
+from mock import patch
 from oslo_utils import netutils
 import testtools
 
 from trove.common.context import TroveContext
 from trove.common.instance import ServiceStatuses
+from trove.guestagent import backup
 from trove.guestagent.datastore.experimental.cassandra import (
     manager as cass_manager)
 from trove.guestagent.datastore.experimental.cassandra import (
@@ -57,6 +59,7 @@ class GuestAgentCassandraDBManagerTest(testtools.TestCase):
         self.original_get_ip = netutils.get_my_ipv4
         self.orig_make_host_reachable = (
             cass_service.CassandraApp.make_host_reachable)
+        self.origin_restore = backup.restore
 
     def tearDown(self):
         super(GuestAgentCassandraDBManagerTest, self).tearDown()
@@ -73,6 +76,7 @@ class GuestAgentCassandraDBManagerTest(testtools.TestCase):
         netutils.get_my_ipv4 = self.original_get_ip
         cass_service.CassandraApp.make_host_reachable = (
             self.orig_make_host_reachable)
+        backup.restore = self.origin_restore
 
     def test_update_status(self):
         mock_status = MagicMock()
@@ -125,6 +129,7 @@ class GuestAgentCassandraDBManagerTest(testtools.TestCase):
         volume.VolumeDevice.migrate_data = MagicMock(return_value=None)
         volume.VolumeDevice.mount = MagicMock(return_value=None)
         volume.VolumeDevice.mount_points = MagicMock(return_value=[])
+        backup.restore = MagicMock(return_value=None)
 
         # invocation
         self.manager.prepare(context=self.context, packages=packages,
@@ -144,3 +149,11 @@ class GuestAgentCassandraDBManagerTest(testtools.TestCase):
         mock_app.make_host_reachable.assert_any_call()
         mock_app.start_db.assert_any_call()
         mock_app.stop_db.assert_any_call()
+        backup.restore.assert_any_call(self.context, backup_info,
+                                       '/var/lib/cassandra')
+
+    def test_create_backup(self):
+        backup_info = {'id': 'backup_id_123abc'}
+        with patch.object(backup, 'backup') as backup_mock:
+            self.manager.create_backup(self.context, backup_info)
+        backup_mock.assert_called_once_with(self.context, backup_info)
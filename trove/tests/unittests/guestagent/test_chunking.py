@@ -0,0 +1,61 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import binascii
+import io
+import os
+
+from trove.guestagent.common import chunking
+from trove.tests.unittests import trove_testtools
+
+
+def _rows(start, count):
+    return ''.join('%d,%s\n' % (row, binascii.hexlify(os.urandom(16)))
+                   for row in range(start, start + count))
+
+
+class ChunkingTest(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(ChunkingTest, self).setUp()
+        self.data = _rows(0, 20000)
+
+    def _chunks(self, data):
+        return list(chunking.chunks(io.BytesIO(data), min_size=4096,
+                                    max_size=65536, boundary_bits=6,
+                                    read_size=1000))
+
+    def test_chunks_join(self):
+        chunks = self._chunks(self.data)
+        self.assertTrue(len(chunks) > 10)
+        self.assertEqual(self.data, ''.join(chunks))
+        for chunk in chunks[:-1]:
+            self.assertTrue(4096 <= len(chunk) <= 65536)
+            # Boundaries follow a newline.
+            self.assertTrue(chunk.endswith('\n'))
+
+    def test_chunks_empty_stream(self):
+        self.assertEqual([], self._chunks(''))
+
+    def test_chunks_without_anchor(self):
+        chunks = self._chunks('\0' * 200000)
+        self.assertEqual([65536, 65536, 65536, 3392],
+                         [len(chunk) for chunk in chunks])
+
+    def test_chunks_survive_insertion(self):
+        chunks = self._chunks(self.data)
+        inserted = self.data[:5000] + _rows(-10, 10) + self.data[5000:]
+        shifted = self._chunks(inserted)
+        # Only the chunks around the insertion change.
+        self.assertTrue(len(set(chunks) - set(shifted)) <= 2)
@@ -0,0 +1,74 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import io
+import os
+
+from trove.guestagent.common import compression
+from trove.tests.unittests import trove_testtools
+
+
+class GzipCompressionTest(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(GzipCompressionTest, self).setUp()
+        # Compressible, but not trivially so.
+        self.data = ''.join(os.urandom(16) * 64 for _ in range(100))
+
+    def _compress(self, data, workers=3, block_size=1000, chunk_size=333):
+        compressor = compression.GzipCompressor(
+            io.BytesIO(data), workers, block_size=block_size)
+        chunks = []
+        chunk = compressor.read(chunk_size)
+        while chunk:
+            self.assertTrue(len(chunk) <= chunk_size)
+            chunks.append(chunk)
+            chunk = compressor.read(chunk_size)
+        return ''.join(chunks)
+
+    def _chunks(self, data, chunk_size):
+        return [data[offset:offset + chunk_size]
+                for offset in range(0, len(data), chunk_size)]
+
+    def test_compress_is_gzip_compatible(self):
+        compressed = self._compress(self.data)
+        self.assertTrue(len(compressed) < len(self.data))
+        unzipped = gzip.GzipFile(fileobj=io.BytesIO(compressed)).read()
+        self.assertEqual(self.data, unzipped)
+
+    def test_compress_empty_stream(self):
+        self.assertEqual('', self._compress(''))
+
+    def test_gunzip_round_trip(self):
+        compressed = self._compress(self.data)
+        for chunk_size in [1, 7, 1000, len(compressed)]:
+            unzipped = compression.gunzip(
+                self._chunks(compressed, chunk_size))
+            self.assertEqual(self.data, ''.join(unzipped))
+
+    def test_gunzip_gzip_output(self):
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as gzip_file:
+            gzip_file.write(self.data)
+        unzipped = compression.gunzip(
+            self._chunks(compressed.getvalue(), 4096))
+        self.assertEqual(self.data, ''.join(unzipped))
+
+    def test_close_discards_pending_blocks(self):
+        compressor = compression.GzipCompressor(
+            io.BytesIO(self.data), 3, block_size=1000)
+        compressor.read(10)
+        compressor.close()
+        self.assertEqual(0, len(compressor.pending))
@@ -0,0 +1,89 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import io
+import os
+import unittest
+
+from trove.guestagent.strategies import compression
+from trove.guestagent.strategies.compression import impl
+from trove.tests.unittests import trove_testtools
+
+
+def _read_all(reader, chunk_size=333):
+    chunks = []
+    chunk = reader.read(chunk_size)
+    while chunk:
+        chunks.append(chunk)
+        chunk = reader.read(chunk_size)
+    return ''.join(chunks)
+
+
+def _chunks(data, chunk_size):
+    return [data[offset:offset + chunk_size]
+            for offset in range(0, len(data), chunk_size)]
+
+
+class CompressionStrategyTest(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(CompressionStrategyTest, self).setUp()
+        self.data = ''.join(os.urandom(16) * 64 for _ in range(100))
+
+    def test_get_compression_strategy(self):
+        self.assertEqual(impl.Gzip,
+                         compression.get_compression_strategy('Gzip'))
+        self.assertEqual(impl.Lz4,
+                         compression.get_compression_strategy('Lz4'))
+
+    def test_detect_compression_strategy(self):
+        self.assertEqual(impl.Gzip, compression.detect_compression_strategy(
+            'backup.xbstream.gz'))
+        self.assertEqual(impl.Lz4, compression.detect_compression_strategy(
+            'backup.xbstream.lz4'))
+        self.assertIsNone(compression.detect_compression_strategy(
+            'backup.xbstream'))
+
+    def test_gzip_commands(self):
+        self.assertEqual('gzip', impl.Gzip().zip_cmd)
+        self.assertEqual('gzip -1', impl.Gzip(level=1).zip_cmd)
+        self.assertEqual('gzip -d -c', impl.Gzip().unzip_cmd)
+
+    def test_gzip_round_trip(self):
+        compressor = impl.Gzip(level=1)
+        compressed = _read_all(compressor.compress(io.BytesIO(self.data), 2))
+        unzipped = gzip.GzipFile(fileobj=io.BytesIO(compressed)).read()
+        self.assertEqual(self.data, unzipped)
+        self.assertEqual(self.data, ''.join(
+            compressor.decompress(_chunks(compressed, 100))))
+
+    @unittest.skipIf(impl.lz4_frame is None, "lz4 is not installed.")
+    def test_lz4_round_trip(self):
+        compressor = impl.Lz4()
+        self.assertTrue(compressor.is_enabled())
+        self.assertIsNone(compressor.zip_cmd)
+        reader = impl.Lz4Compressor(io.BytesIO(self.data), 3,
+                                    block_size=1000)
+        compressed = _read_all(reader)
+        self.assertTrue(len(compressed) < len(self.data))
+        for chunk_size in [1, 7, 1000, len(compressed)]:
+            self.assertEqual(self.data, ''.join(
+                compressor.decompress(_chunks(compressed, chunk_size))))
+
+    @unittest.skipIf(impl.lz4_frame is None, "lz4 is not installed.")
+    def test_lz4_empty_stream(self):
+        compressor = impl.Lz4()
+        compressed = _read_all(compressor.compress(io.BytesIO(''), 1))
+        self.assertEqual('', ''.join(compressor.decompress([compressed])))
@@ -0,0 +1,93 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import io
+import os
+
+from trove.guestagent.common import encryption
+from trove.tests.unittests import trove_testtools
+
+KEY = 'default_aes_cbc_key'
+
+
+class EncryptionTest(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(EncryptionTest, self).setUp()
+        self.data = os.urandom(10000)
+
+    def _encrypt(self, data, workers=3, block_size=1000, chunk_size=333):
+        encryptor = encryption.Encryptor(io.BytesIO(data), KEY, workers,
+                                         block_size=block_size)
+        chunks = []
+        chunk = encryptor.read(chunk_size)
+        while chunk:
+            chunks.append(chunk)
+            chunk = encryptor.read(chunk_size)
+        return ''.join(chunks)
+
+    def _decrypt(self, encrypted, key=KEY, chunk_size=4096):
+        chunks = [encrypted[offset:offset + chunk_size]
+                  for offset in range(0, len(encrypted), chunk_size)]
+        return ''.join(encryption.decrypt(chunks, key))
+
+    def _frame_offset(self, index, block_size=1000):
+        frame_size = (encryption.FRAME_HEADER.size + block_size +
+                      encryption.TAG_SIZE)
+        return (len(encryption.MAGIC) + encryption.SALT_SIZE +
+                index * frame_size)
+
+    def test_round_trip(self):
+        encrypted = self._encrypt(self.data)
+        self.assertNotIn(self.data[:100], encrypted)
+        for chunk_size in [1, 100, len(encrypted)]:
+            self.assertEqual(self.data,
+                             self._decrypt(encrypted, chunk_size=chunk_size))
+
+    def test_round_trip_empty_stream(self):
+        self.assertEqual('', self._decrypt(self._encrypt('')))
+
+    def test_streams_use_different_keys(self):
+        self.assertNotEqual(self._encrypt(self.data),
+                            self._encrypt(self.data))
+
+    def test_wrong_key(self):
+        self.assertRaises(encryption.DecryptionError, self._decrypt,
+                          self._encrypt(self.data), key='wrong_key')
+
+    def test_tampered_frame(self):
+        encrypted = bytearray(self._encrypt(self.data))
+        encrypted[self._frame_offset(3) + 10] ^= 1
+        self.assertRaises(encryption.DecryptionError, self._decrypt,
+                          str(encrypted))
+
+    def test_reordered_frames(self):
+        encrypted = self._encrypt(self.data)
+        first, second, third = [self._frame_offset(index)
+                                for index in range(3)]
+        reordered = (encrypted[:first] + encrypted[second:third] +
+                     encrypted[first:second] + encrypted[third:])
+        self.assertRaises(encryption.DecryptionError, self._decrypt,
+                          reordered)
+
+    def test_truncated(self):
+        encrypted = self._encrypt(self.data)
+        # Dropping whole frames at the end is caught as well.
+        for end in [len(encrypted) - 1, self._frame_offset(5)]:
+            self.assertRaises(encryption.DecryptionError, self._decrypt,
+                              encrypted[:end])
+
+    def test_not_encrypted(self):
+        self.assertRaises(encryption.DecryptionError, self._decrypt,
+                          self.data)
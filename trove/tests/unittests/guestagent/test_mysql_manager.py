@@ -332,6 +332,29 @@ class GuestAgentManagerTest(testtools.TestCase):
             1, mock_replication.snapshot_for_replication.call_count)
         self.assertEqual(1, mock_replication.get_master_ref.call_count)
 
+    def test_get_replication_snapshot_streamed(self):
+        dbaas.MySqlAppStatus.get = MagicMock(return_value=MagicMock())
+        stream = {'host': '10.0.0.1', 'port': 4000, 'token': 'token'}
+
+        def snapshot_for_replication(context, app, location, snapshot_info):
+            snapshot_info['stream'] = stream
+            return snapshot_info['id'], 123456789
+        mock_replication = MagicMock()
+        mock_replication.snapshot_for_replication = MagicMock(
+            side_effect=snapshot_for_replication)
+        self.mock_rs_class.return_value = mock_replication
+        self.mock_gfvs_class.return_value = {'used': 1.0, 'total': 2.0}
+
+        replication_snapshot = self.manager.get_replication_snapshot(
+            self.context, {'id': 'my_snapshot_id', 'direct_stream': True})
+        self.assertEqual(stream, replication_snapshot['dataset']['stream'])
+
+    def test_cancel_replication_snapshot(self):
+        self.manager.cancel_replication_snapshot(self.context,
+                                                 'my_snapshot_id')
+        self.mock_rs_class.return_value.cancel_snapshot.assert_called_with(
+            'my_snapshot_id')
+
     def test_attach_replication_slave_valid(self):
         mock_status = MagicMock()
         dbaas.MySqlAppStatus.get = MagicMock(return_value=mock_status)
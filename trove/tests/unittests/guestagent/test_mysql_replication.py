@@ -0,0 +1,68 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+
+import eventlet
+from mock import patch
+
+from trove.common.context import TroveContext
+from trove.guestagent.strategies.replication import mysql_base
+from trove.guestagent.strategies.replication import mysql_binlog
+from trove.tests.unittests import trove_testtools
+
+
+class MysqlReplicationStreamTest(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(MysqlReplicationStreamTest, self).setUp()
+        self.context = TroveContext()
+        self.replication = mysql_binlog.MysqlBinlogReplication(self.context)
+        patcher = patch.object(mysql_base.netutils, 'get_my_ipv4',
+                               return_value='127.0.0.1')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(mysql_base, 'get_storage_strategy')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(mysql_base.AGENT, 'get_manifest',
+                               return_value='snapshot.xbstream.gz.enc')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch.object(mysql_base.AGENT, 'execute_backup')
+    def test_cancel_snapshot(self, mock_execute_backup):
+        stream = self.replication._serve_snapshot(self.context,
+                                                  {'id': 'snapshot-id'})
+        # Waiting for the replica.
+        eventlet.sleep(0)
+        self.replication.cancel_snapshot('snapshot-id')
+        eventlet.sleep(0)
+        self.assertNotIn('snapshot-id', mysql_base.SNAPSHOT_STREAMS)
+        self.assertRaises(socket.error, eventlet.connect,
+                          (stream['host'], stream['port']))
+        self.assertFalse(mock_execute_backup.called)
+
+    @patch.object(mysql_base.AGENT, 'execute_backup')
+    def test_cancel_snapshot_not_started(self, mock_execute_backup):
+        stream = self.replication._serve_snapshot(self.context,
+                                                  {'id': 'snapshot-id'})
+        self.replication.cancel_snapshot('snapshot-id')
+        eventlet.sleep(0)
+        self.assertRaises(socket.error, eventlet.connect,
+                          (stream['host'], stream['port']))
+        self.assertFalse(mock_execute_backup.called)
+
+    def test_cancel_unknown_snapshot(self):
+        self.replication.cancel_snapshot('snapshot-id')
@@ -0,0 +1,41 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from mock import patch
+
+from trove.guestagent.common import progress
+from trove.tests.unittests import trove_testtools
+
+
+class BackupProgressTest(trove_testtools.TestCase):
+
+    @patch.object(progress.time, 'time', side_effect=[100.0, 102.0, 104.0])
+    def test_snapshot(self, mock_time):
+        backup_progress = progress.BackupProgress()
+        backup_progress.read(4 * 1024 * 1024)
+        backup_progress.saved(2 * 1024 * 1024)
+        snapshot = backup_progress.snapshot()
+        self.assertEqual({'bytes_read': 4 * 1024 * 1024,
+                          'bytes_saved': 2 * 1024 * 1024,
+                          'segments': 1,
+                          'elapsed': 2.0,
+                          'read_rate': 2.0,
+                          'save_rate': 1.0,
+                          'current_read_rate': 2.0,
+                          'current_save_rate': 1.0}, snapshot)
+        # Nothing moved since the last snapshot.
+        snapshot = backup_progress.snapshot()
+        self.assertEqual(1.0, snapshot['read_rate'])
+        self.assertEqual(0.0, snapshot['current_read_rate'])
+        self.assertEqual(0.0, snapshot['current_save_rate'])
@@ -0,0 +1,73 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import io
+
+import mock
+
+from trove.guestagent.datastore.experimental.redis import client
+from trove.tests.unittests import trove_testtools
+
+
+class RedisClientTest(trove_testtools.TestCase):
+
+    def _client(self, replies):
+        redis = client.RedisClient(password='secret')
+        socket = mock.Mock()
+        socket.makefile.return_value = io.BytesIO(replies)
+        patcher = mock.patch.object(client.socket, 'create_connection',
+                                    return_value=socket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return redis, socket
+
+    def test_pack_command(self):
+        self.assertEqual('*2\r\n$4\r\nAUTH\r\n$6\r\nsecret\r\n',
+                         client.RedisClient.pack_command('AUTH', 'secret'))
+
+    def test_execute_authenticates(self):
+        redis, socket = self._client('+OK\r\n:1433160000\r\n')
+        with redis:
+            self.assertEqual(1433160000, redis.execute('LASTSAVE'))
+        self.assertEqual(
+            [mock.call(client.RedisClient.pack_command('AUTH', 'secret')),
+             mock.call(client.RedisClient.pack_command('LASTSAVE'))],
+            socket.sendall.call_args_list)
+        socket.close.assert_called_once_with()
+
+    def test_replies(self):
+        redis, socket = self._client(
+            '+OK\r\n$5\r\nhello\r\n$-1\r\n*2\r\n:1\r\n$1\r\na\r\n')
+        redis.connect()
+        self.assertEqual('hello', redis.read_reply())
+        self.assertIsNone(redis.read_reply())
+        self.assertEqual([1, 'a'], redis.read_reply())
+
+    def test_error_reply(self):
+        redis, socket = self._client(
+            '+OK\r\n-ERR Background save already in progress\r\n')
+        self.assertRaisesRegexp(client.RedisError, 'already in progress',
+                                redis.execute, 'BGSAVE')
+
+    def test_connection_lost(self):
+        redis, socket = self._client('+OK\r\n$5\r\nhel')
+        self.assertRaises(client.RedisError, redis.execute, 'GET', 'key')
+
+    def test_info(self):
+        info = ('# Persistence\r\nloading:0\r\n'
+                'rdb_last_bgsave_status:ok\r\n')
+        redis, socket = self._client('+OK\r\n$%d\r\n%s\r\n' %
+                                     (len(info), info))
+        self.assertEqual({'loading': '0', 'rdb_last_bgsave_status': 'ok'},
+                         redis.info('persistence'))
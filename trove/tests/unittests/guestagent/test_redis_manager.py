@@ -13,6 +13,7 @@
 #    under the License.
 
 from mock import MagicMock
+from mock import patch
 import testtools
 
 from trove.common.context import TroveContext
@@ -73,6 +74,9 @@ class RedisGuestAgentManagerTest(testtools.TestCase):
     def test_prepare_redis_not_installed(self):
         self._prepare_dynamic(is_redis_installed=False)
 
+    def test_prepare_redis_from_backup(self):
+        self._prepare_dynamic(backup_info={'id': 'backup_id_123abc'})
+
     def _prepare_dynamic(self, device_path='/dev/vdb', is_redis_installed=True,
                          backup_info=None, is_root_enabled=False,
                          mount_point='var/lib/redis'):
@@ -107,6 +111,17 @@ class RedisGuestAgentManagerTest(testtools.TestCase):
         operating_system.chown.assert_any_call(
             mount_point, 'redis', 'redis', as_root=True)
         redis_service.RedisApp.restart.assert_any_call()
+        if backup_info:
+            backup.restore.assert_any_call(self.context, backup_info,
+                                           mount_point)
+        else:
+            self.assertFalse(backup.restore.called)
+
+    def test_create_backup(self):
+        backup_info = {'id': 'backup_id_123abc'}
+        with patch.object(backup, 'backup') as backup_mock:
+            self.manager.create_backup(self.context, backup_info)
+        backup_mock.assert_called_once_with(self.context, backup_info)
 
     def test_restart(self):
         mock_status = MagicMock()
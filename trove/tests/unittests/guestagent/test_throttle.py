@@ -0,0 +1,124 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from trove.common import cfg
+from trove.guestagent.common import throttle
+from trove.tests.unittests import trove_testtools
+
+CONF = cfg.CONF
+
+
+class ThrottleTest(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(ThrottleTest, self).setUp()
+        patcher = mock.patch.object(throttle.eventlet, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(throttle.tpool, 'execute',
+                                    side_effect=lambda probe: probe())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _override(self, name, value):
+        CONF.set_override(name, value)
+        self.addCleanup(CONF.clear_override, name)
+
+    def test_from_config(self):
+        self._override('backup_max_rate', 2048)
+        self._override('backup_ionice_class', 'idle')
+        throttle_ = throttle.Throttle.from_config()
+        self.assertEqual(2048 * 1024, throttle_.max_rate)
+        self.assertEqual('idle', throttle_.ionice_class)
+        self.assertEqual(0, throttle_.nice)
+        self.assertFalse(throttle_.adaptive)
+
+    def test_from_config_overrides(self):
+        self._override('backup_ionice_class', 'idle')
+        throttle_ = throttle.Throttle.from_config(
+            {'max_rate': 512, 'ionice_class': 'none', 'nice': 30,
+             'adaptive': True, 'unknown': 1})
+        self.assertEqual(512 * 1024, throttle_.max_rate)
+        self.assertIsNone(throttle_.ionice_class)
+        self.assertEqual(19, throttle_.nice)
+        self.assertTrue(throttle_.adaptive)
+
+    @mock.patch.object(throttle.time, 'time', return_value=100.0)
+    def test_consume(self, mock_time):
+        throttle_ = throttle.Throttle(max_rate=1000)
+        throttle_.consume(800)
+        self.assertFalse(self.sleep.called)
+        throttle_.consume(700)
+        self.sleep.assert_called_once_with(0.5)
+        mock_time.return_value = 101.0
+        throttle_.consume(400)
+        self.assertEqual(1900, throttle_.consumed)
+        self.assertEqual(1, self.sleep.call_count)
+
+    def test_consume_unlimited(self):
+        throttle_ = throttle.Throttle()
+        throttle_.consume(10 ** 9)
+        self.assertEqual(10 ** 9, throttle_.consumed)
+        self.assertFalse(self.sleep.called)
+
+    def test_command(self):
+        self.assertEqual('cat file',
+                         throttle.Throttle().command('cat file'))
+        self.assertEqual("ionice -c 3 sh -c 'cat file | gzip'",
+                         throttle.Throttle(ionice_class='idle').command(
+                             'cat file | gzip'))
+        self.assertEqual("ionice -c 2 -n 7 nice -n 10 sh -c 'cat file'",
+                         throttle.Throttle(ionice_class='best-effort',
+                                           nice=10).command('cat file'))
+
+    def _adapt(self, throttle_, latencies, consumed=0):
+        def wait(interval):
+            # The stream is read while the throttle waits.
+            throttle_.consumed += consumed
+            return not latencies
+
+        def probe():
+            latency = latencies.pop(0)
+            if isinstance(latency, Exception):
+                raise latency
+            return latency
+        finished = mock.Mock()
+        finished.wait.side_effect = wait
+        throttle_.adapt(probe, finished, interval=1, threshold=0.1,
+                        min_rate=1)
+
+    def test_adapt_slows_down(self):
+        throttle_ = throttle.Throttle(max_rate=8192)
+        self._adapt(throttle_, [0.5, 0.5, 0.5, 0.5])
+        self.assertEqual(1024, throttle_.rate)
+
+    def test_adapt_speeds_up_to_max_rate(self):
+        throttle_ = throttle.Throttle(max_rate=8192)
+        throttle_.set_rate(2048)
+        self._adapt(throttle_, [0.01, 0.01, 0.01, 0.01])
+        self.assertEqual(8192, throttle_.rate)
+
+    def test_adapt_unlimited(self):
+        throttle_ = throttle.Throttle()
+        self._adapt(throttle_, [0.5], consumed=10000)
+        self.assertEqual(5000, throttle_.rate)
+        self._adapt(throttle_, [0.01, None, 0.01], consumed=1000)
+        self.assertEqual(0, throttle_.rate)
+
+    def test_adapt_probe_error(self):
+        throttle_ = throttle.Throttle(max_rate=8192)
+        self._adapt(throttle_, [Exception(), 0.5])
+        self.assertEqual(4096, throttle_.rate)
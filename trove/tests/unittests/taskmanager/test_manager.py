@@ -14,15 +14,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+
 from mock import Mock, patch, PropertyMock
 
 from trove.backup.models import Backup
+from trove.common import cfg
 from trove.common.context import TroveContext
 from trove.instance.tasks import InstanceTasks
+from trove import rpc
 from trove.taskmanager.manager import Manager
 from trove.taskmanager import models
 from trove.taskmanager import service
 from trove.common.exception import TroveError, ReplicationSlaveAttachError
+from trove.common.exception import UnprocessableEntity
 from proboscis.asserts import assert_equal
 from trove.tests.unittests import trove_testtools
 
@@ -44,6 +49,9 @@ class TestManager(trove_testtools.TestCase):
         self.mock_master = Mock()
         type(self.mock_master).slaves = PropertyMock(
             return_value=[self.mock_slave1, self.mock_slave2])
+        self.notifier_patch = patch.object(rpc, 'get_notifier')
+        self.mock_get_notifier = self.notifier_patch.start()
+        self.addCleanup(self.notifier_patch.stop)
 
     def tearDown(self):
         super(TestManager, self).tearDown()
@@ -108,6 +116,34 @@ class TestManager(trove_testtools.TestCase):
                                                   self.mock_slave2]),
                                                 InstanceTasks.NONE)
 
+    @patch.object(Manager, '_set_task_status')
+    def test_promote_to_replica_source_timings(self, mock_set_task_status):
+        with patch.object(models.BuiltInstanceTasks, 'load',
+                          side_effect=[self.mock_slave1,
+                                       self.mock_old_master,
+                                       self.mock_slave2]):
+            self.manager.promote_to_replica_source(
+                self.context, 'some-inst-id')
+
+        notifier = self.mock_get_notifier.return_value
+        event_type, payload = notifier.info.call_args[0][1:]
+        self.assertEqual('trove.instance.promote_to_replica_source.timings',
+                         event_type)
+        self.assertEqual('some-inst-id', payload['instance_id'])
+        self.assertEqual(['make_read_only', 'detach_public_ips',
+                          'wait_for_txn', 'detach_replica',
+                          'enable_as_master', 'attach_replica',
+                          'attach_public_ips', 'migrate_replicas',
+                          'demote_replication_master'],
+                         list(payload['phases']))
+        self.assertAlmostEqual(payload['total'],
+                               sum(payload['phases'].values()), places=6)
+        # The timings are kept on the instance record.
+        timings = json.loads(self.mock_slave1.db_info.task_timings)
+        self.assertEqual('promote_to_replica_source', timings['operation'])
+        self.assertEqual(dict(payload['phases']), timings['phases'])
+        self.mock_slave1.db_info.save.assert_called_with()
+
     @patch.object(Manager, '_set_task_status')
     @patch.object(Manager, '_most_current_replica')
     def test_eject_replica_source(self, mock_most_current_replica,
@@ -184,6 +220,32 @@ class TestManager(trove_testtools.TestCase):
                                     self.manager.eject_replica_source,
                                     self.context, 'some-inst-id')
 
+    def test_migrate_replicas(self):
+        new_master = Mock(id='new-master')
+        replicas = [Mock(id='replica-%d' % i) for i in range(3)]
+        replicas[1].attach_replica = Mock(side_effect=TroveError)
+        result = self.manager._migrate_replicas(
+            'test', replicas + [new_master], self.mock_old_master,
+            new_master, latest_txn_id='txn-id')
+        self.assertEqual(['replica-1'], result)
+        for replica in replicas:
+            replica.wait_for_txn.assert_called_with('txn-id')
+            replica.detach_replica.assert_called_with(self.mock_old_master,
+                                                      for_failover=True)
+        replicas[2].attach_replica.assert_called_with(new_master)
+        self.assertFalse(new_master.detach_replica.called)
+
+    def test_error_migrate_replicas(self):
+        new_master = Mock(id='new-master')
+        replicas = [Mock(id='replica-%d' % i) for i in range(3)]
+        replicas[0].detach_replica = Mock(side_effect=RuntimeError('Error'))
+        self.assertRaisesRegexp(RuntimeError, 'Error',
+                                self.manager._migrate_replicas, 'test',
+                                replicas, self.mock_old_master, new_master)
+        for replica in replicas[1:]:
+            replica.attach_replica.assert_called_with(new_master)
+            self.assertFalse(replica.wait_for_txn.called)
+
     @patch.object(Backup, 'delete')
     def test_create_replication_slave(self, mock_backup_delete):
         mock_tasks = Mock()
@@ -201,9 +263,88 @@ class TestManager(trove_testtools.TestCase):
                                          'some-master-id', None)
         mock_tasks.get_replication_master_snapshot.assert_called_with(
             self.context, 'some-master-id', mock_flavor, 'temp-backup-id',
-            replica_number=1)
+            replica_number=1, direct_stream=False)
         mock_backup_delete.assert_called_with(self.context, 'test-id')
 
+    @patch.object(Backup, 'delete')
+    def test_create_replication_slave_direct_stream(self, mock_backup_delete):
+        cfg.CONF.set_override('replication_direct_stream', True)
+        self.addCleanup(cfg.CONF.clear_override, 'replication_direct_stream')
+        mock_tasks = Mock()
+        mock_tasks.get_replication_master_snapshot = Mock(
+            return_value={'dataset': {'snapshot_id': 'test-id'}})
+        mock_flavor = Mock()
+        with patch.object(models.FreshInstanceTasks, 'load',
+                          return_value=mock_tasks):
+            self.manager.create_instance(self.context, ['id1'], Mock(),
+                                         mock_flavor, Mock(), None, None,
+                                         'mysql', 'mysql-server', 2,
+                                         None, None, 'some_password', None,
+                                         Mock(), 'some-master-id', None)
+        mock_tasks.get_replication_master_snapshot.assert_called_with(
+            self.context, 'some-master-id', mock_flavor, None,
+            replica_number=1, direct_stream=True)
+        mock_backup_delete.assert_called_with(self.context, 'test-id')
+
+    @patch.object(Backup, 'get_by_id',
+                  return_value=Mock(is_running=False))
+    @patch.object(Backup, 'fail_unstarted')
+    @patch.object(Backup, 'delete',
+                  side_effect=UnprocessableEntity('running'))
+    @patch.object(models.BuiltInstanceTasks, 'load')
+    def test_create_replication_slave_direct_stream_fails(
+            self, mock_master_load, mock_backup_delete, mock_fail_unstarted,
+            mock_get_by_id):
+        # The replica fails to build before it connects to the source.
+        mock_tasks = Mock()
+        mock_tasks.get_replication_master_snapshot = Mock(
+            return_value={'dataset': {'snapshot_id': 'test-id',
+                                      'stream': {'port': 1234}}})
+        mock_tasks.create_instance = Mock(side_effect=TroveError('nova'))
+        with patch.object(models.FreshInstanceTasks, 'load',
+                          return_value=mock_tasks):
+            self.assertRaisesRegexp(
+                TroveError, 'nova', self.manager.create_instance,
+                self.context, ['id1'], Mock(), Mock(), Mock(), None, None,
+                'mysql', 'mysql-server', 2, None, None, 'some_password',
+                None, Mock(), 'some-master-id', None)
+        mock_master_load.assert_called_with(self.context, 'some-master-id')
+        master = mock_master_load.return_value
+        master.cancel_replication_snapshot.assert_called_with('test-id')
+        mock_fail_unstarted.assert_called_with('test-id')
+        mock_backup_delete.assert_called_with(self.context, 'test-id')
+
+    @patch.object(Backup, 'delete')
+    def test_create_multiple_replication_slaves(self, mock_backup_delete):
+        mock_snapshot = {'dataset': {'snapshot_id': 'test-id'}}
+        mock_tasks = {}
+        for replica_id in ['id1', 'id2', 'id3']:
+            mock_tasks[replica_id] = Mock()
+            mock_tasks[replica_id].get_replication_master_snapshot = Mock(
+                return_value=mock_snapshot)
+        mock_tasks['id2'].create_instance = Mock(side_effect=TroveError)
+        mock_flavor = Mock()
+        with patch.object(models.FreshInstanceTasks, 'load',
+                          side_effect=lambda ctx, id: mock_tasks[id]):
+            self.manager.create_instance(self.context, ['id1', 'id2', 'id3'],
+                                         Mock(), mock_flavor, Mock(), None,
+                                         None, 'mysql', 'mysql-server', 2,
+                                         'temp-backup-id', None,
+                                         ['pass1', 'pass2', 'pass3'], None,
+                                         Mock(), 'some-master-id', None)
+        mock_tasks['id1'].get_replication_master_snapshot.assert_called_with(
+            self.context, 'some-master-id', mock_flavor, 'temp-backup-id',
+            replica_number=1, direct_stream=False)
+        mock_tasks['id3'].get_replication_master_snapshot.assert_called_with(
+            self.context, 'some-master-id', mock_flavor, 'test-id',
+            replica_number=3)
+        mock_tasks['id1'].wait_for_instance.assert_called_with(36000,
+                                                                mock_flavor)
+        mock_tasks['id3'].wait_for_instance.assert_called_with(36000,
+                                                                mock_flavor)
+        self.assertFalse(mock_tasks['id2'].wait_for_instance.called)
+        mock_backup_delete.assert_called_once_with(self.context, 'test-id')
+
     @patch.object(models.FreshInstanceTasks, 'load')
     @patch.object(Backup, 'delete')
     def test_exception_create_replication_slave(self, mock_delete, mock_load):
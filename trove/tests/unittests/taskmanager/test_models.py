@@ -12,13 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import datetime
+import json
 import os
 from tempfile import NamedTemporaryFile
 import uuid
 
 from cinderclient import exceptions as cinder_exceptions
 import cinderclient.v2.client as cinderclient
-from mock import Mock, MagicMock, patch
+from mock import call, Mock, MagicMock, patch
 from novaclient import exceptions as nova_exceptions
 import novaclient.v2.flavors
 import novaclient.v2.servers
@@ -29,6 +30,7 @@ from testtools.matchers import Equals, Is
 import trove.backup.models
 from trove.backup import models as backup_models
 from trove.backup import state
+from trove.common import chunk_index
 import trove.common.context
 from trove.common.exception import GuestError
 from trove.common.exception import MalformedSecurityGroupRuleError
@@ -49,6 +51,7 @@ from trove.instance.models import InstanceStatus
 from trove.instance.tasks import InstanceTasks
 from trove import rpc
 from trove.taskmanager import models as taskmanager_models
+from trove.taskmanager import server_watcher
 from trove.tests.unittests import trove_testtools
 from trove.tests.unittests.util import util
 
@@ -739,8 +742,9 @@ class BuiltInstanceTasksTest(trove_testtools.TestCase):
                             Is(InstanceTasks.NONE))
             self.assertThat(self.db_instance.flavor_id, Is('6'))
 
-    @patch.object(utils, 'poll_until')
-    def test_reboot(self, mock_poll):
+    @patch.object(server_watcher.ServerStateWatcher, 'wait_for_status')
+    def test_reboot(self, mock_wait):
+        orig_server = self.instance_task.server
         self.instance_task.datastore_status_matches = Mock(return_value=True)
         self.instance_task._refresh_datastore_status = Mock()
         self.instance_task.server.reboot = Mock()
@@ -748,11 +752,12 @@ class BuiltInstanceTasksTest(trove_testtools.TestCase):
         self.instance_task.reboot()
         self.instance_task._guest.stop_db.assert_any_call()
         self.instance_task._refresh_datastore_status.assert_any_call()
-        self.instance_task.server.reboot.assert_any_call()
+        orig_server.reboot.assert_any_call()
+        self.assertIs(mock_wait.return_value, self.instance_task.server)
         self.instance_task.set_datastore_status_to_paused.assert_any_call()
 
-    @patch.object(utils, 'poll_until')
-    def test_reboot_datastore_not_ready(self, mock_poll):
+    @patch.object(server_watcher.ServerStateWatcher, 'wait_for_status')
+    def test_reboot_datastore_not_ready(self, mock_wait):
         self.instance_task.datastore_status_matches = Mock(return_value=False)
         self.instance_task._refresh_datastore_status = Mock()
         self.instance_task.server.reboot = Mock()
@@ -868,7 +873,8 @@ class BackupTasksTest(trove_testtools.TestCase):
         self.bm_backup_patches = patch.multiple(
             backup_models.Backup,
             delete=MagicMock(return_value=None),
-            get_by_id=MagicMock(return_value=self.backup))
+            get_by_id=MagicMock(return_value=self.backup),
+            chain=MagicMock(side_effect=lambda backup: [backup]))
         self.bm_backup_mocks = self.bm_backup_patches.start()
         self.addCleanup(self.bm_backup_patches.stop)
         self.bm_DBBackup_patch = patch.object(
@@ -892,6 +898,10 @@ class BackupTasksTest(trove_testtools.TestCase):
             return_value=self.container_content)
         self.swift_client.delete_object = MagicMock(return_value=None)
         self.swift_client.delete_container = MagicMock(return_value=None)
+        self.sleep_patch = patch.object(taskmanager_models.greenthread,
+                                        'sleep')
+        self.sleep_mock = self.sleep_patch.start()
+        self.addCleanup(self.sleep_patch.stop)
 
     def tearDown(self):
         super(BackupTasksTest, self).tearDown()
@@ -930,6 +940,267 @@ class BackupTasksTest(trove_testtools.TestCase):
                 self.backup.state,
                 "backup should be in DELETE_FAILED status")
 
+    def _segmented_backup(self, pages):
+        self.swift_client.head_object = MagicMock(
+            return_value={'x-object-manifest': 'segments/12e48_'})
+        self.swift_client.get_container = MagicMock(
+            side_effect=[(None, page) for page in pages + [[]]])
+
+    def test_delete_segmented_backup(self):
+        self._segmented_backup([[{'name': '12e48_00000000'},
+                                 {'name': '12e48_00000001'}],
+                                [{'name': '12e48_00000002'}]])
+        taskmanager_models.BackupTasks.delete_backup('dummy context',
+                                                     self.backup.id)
+        self.assertEqual(
+            [call('segments', prefix='12e48_', marker=None),
+             call('segments', prefix='12e48_', marker='12e48_00000001'),
+             call('segments', prefix='12e48_', marker='12e48_00000002')],
+            self.swift_client.get_container.call_args_list)
+        container = taskmanager_models.CONF.backup_swift_container
+        self.assertEqual([call('segments', '12e48_00000000'),
+                          call('segments', '12e48_00000001'),
+                          call('segments', '12e48_00000002'),
+                          call(container, '12e48.xbstream.gz')],
+                         self.swift_client.delete_object.call_args_list)
+        self.backup.delete.assert_any_call()
+
+    def test_delete_segmented_backup_retries(self):
+        self._segmented_backup([[{'name': '12e48_00000000'},
+                                 {'name': '12e48_00000001'}]])
+        self.swift_client.delete_object = MagicMock(
+            side_effect=[ClientException('foo', http_status=503),
+                         ClientException('foo', http_status=404),
+                         None, None])
+        taskmanager_models.BackupTasks.delete_backup('dummy context',
+                                                     self.backup.id)
+        container = taskmanager_models.CONF.backup_swift_container
+        self.assertEqual([call('segments', '12e48_00000000'),
+                          call('segments', '12e48_00000001'),
+                          call('segments', '12e48_00000000'),
+                          call(container, '12e48.xbstream.gz')],
+                         self.swift_client.delete_object.call_args_list)
+        self.sleep_mock.assert_called_once_with(1)
+        self.backup.delete.assert_any_call()
+
+    def test_delete_segmented_backup_retries_exhausted(self):
+        self._segmented_backup([[{'name': '12e48_00000000'}]])
+        self.swift_client.delete_object = MagicMock(
+            side_effect=ClientException('foo', http_status=503))
+        self.assertRaises(TroveError,
+                          taskmanager_models.BackupTasks.delete_backup,
+                          'dummy context', self.backup.id)
+        # The manifest is kept while segments are left.
+        self.assertEqual(
+            [call('segments', '12e48_00000000')] *
+            (taskmanager_models.CONF.backup_delete_retries + 1),
+            self.swift_client.delete_object.call_args_list)
+        self.assertEqual(state.BackupState.DELETE_FAILED, self.backup.state)
+
+    def _chain(self, child_states=(state.BackupState.DELETE_PENDING,
+                                   state.BackupState.DELETE_PENDING)):
+        chain = [self.backup]
+        for name, child_state in zip(('12e49', '12e50'), child_states):
+            child = backup_models.DBBackup()
+            child.id = name
+            child.location = 'http://xxx/z_CLOUD/%s.xbstream.gz' % name
+            child.state = child_state
+            child.delete = MagicMock(return_value=None)
+            chain.append(child)
+        backup_models.Backup.chain.side_effect = lambda backup: chain
+        self.swift_client.head_object = MagicMock(return_value={})
+        return chain
+
+    @patch.object(backup_models, 'SWIFT_CHECK_CACHE')
+    def test_delete_backup_chain(self, mock_cache):
+        chain = self._chain()
+        taskmanager_models.BackupTasks.delete_backup('dummy context',
+                                                     self.backup.id)
+        self.assertEqual(sorted(call(backup.location) for backup in chain),
+                         sorted(mock_cache.invalidate.call_args_list))
+        container = taskmanager_models.CONF.backup_swift_container
+        self.assertEqual(
+            sorted([call(container, '12e48.xbstream.gz'),
+                    call(container, '12e49.xbstream.gz'),
+                    call(container, '12e50.xbstream.gz')]),
+            sorted(self.swift_client.delete_object.call_args_list))
+        for backup in chain:
+            backup.delete.assert_called_once_with()
+        self.assertEqual({'deleted': 3, 'total': 3},
+                         json.loads(self.backup.progress))
+
+    def test_delete_backup_chain_new_child(self):
+        # Started after the chain was marked for deletion.
+        chain = self._chain(child_states=(state.BackupState.DELETE_PENDING,
+                                          state.BackupState.NEW))
+        taskmanager_models.BackupTasks.delete_backup('dummy context',
+                                                     self.backup.id)
+        container = taskmanager_models.CONF.backup_swift_container
+        self.assertEqual(
+            sorted([call(container, '12e48.xbstream.gz'),
+                    call(container, '12e49.xbstream.gz')]),
+            sorted(self.swift_client.delete_object.call_args_list))
+        chain[1].delete.assert_called_once_with()
+        self.assertFalse(chain[2].delete.called)
+        self.assertEqual({'deleted': 2, 'total': 2},
+                         json.loads(self.backup.progress))
+
+    def test_delete_backup_unexpected_error(self):
+        self.backup.state = state.BackupState.DELETE_PENDING
+        backup_models.Backup.chain.side_effect = TroveError('db error')
+        self.assertRaises(TroveError,
+                          taskmanager_models.BackupTasks.delete_backup,
+                          'dummy context', self.backup.id)
+        # The deletion can be requested again.
+        self.assertEqual(state.BackupState.DELETE_FAILED, self.backup.state)
+        self.bm_DBBackup_mock.assert_called_with()
+
+    def test_delete_backup_chain_failure(self):
+        chain = self._chain()
+        container = taskmanager_models.CONF.backup_swift_container
+
+        def _delete_object(cont, name):
+            if name == '12e49.xbstream.gz':
+                raise ClientException('foo', http_status=503)
+        self.swift_client.delete_object.side_effect = _delete_object
+        self.assertRaises(TroveError,
+                          taskmanager_models.BackupTasks.delete_backup,
+                          'dummy context', self.backup.id)
+        self.swift_client.delete_object.assert_any_call(container,
+                                                        '12e50.xbstream.gz')
+        chain[2].delete.assert_called_once_with()
+        self.assertFalse(chain[1].delete.called)
+        self.assertFalse(self.backup.delete.called)
+        self.assertEqual(state.BackupState.DELETE_FAILED, chain[1].state)
+        self.assertEqual(state.BackupState.DELETE_FAILED, self.backup.state)
+        self.assertEqual({'deleted': 2, 'total': 3},
+                         json.loads(self.backup.progress))
+
+    def _chunk_index_container(self, fossils=(), references=None):
+        indexes = {
+            'other.sql': chunk_index.dumps([{'name': 'chunks/a'},
+                                            {'name': 'chunks/b'},
+                                            {'name': 'chunks/e'}]),
+        }
+        listing = [
+            {'name': 'chunks/a'}, {'name': 'chunks/b'}, {'name': 'chunks/c'},
+            {'name': 'other.sql', 'hash': 'other-etag',
+             'content_type': chunk_index.CONTENT_TYPE},
+            {'name': 'plain.xbstream.gz',
+             'content_type': 'application/octet-stream'},
+        ]
+        for name, last_modified in fossils:
+            listing.append({'name': name,
+                            'last_modified': last_modified.isoformat()})
+
+        def get_object(container, name):
+            if name == chunk_index.REFERENCES:
+                if references is None:
+                    raise ClientException('missing', http_status=404)
+                return None, chunk_index.dumps_references(references)
+            return None, indexes[name]
+
+        self.swift_client.head_object = MagicMock(
+            return_value={'content-type': chunk_index.CONTENT_TYPE})
+        self.swift_client.get_container = MagicMock(
+            return_value=(None, listing))
+        self.swift_client.get_object = MagicMock(side_effect=get_object)
+
+    def _copy_call(self, source, destination):
+        container = taskmanager_models.CONF.backup_swift_container
+        return call(container, destination, None,
+                    headers={'X-Copy-From': '/%s/%s' % (container, source)})
+
+    def test_delete_deduplicated_backup(self):
+        self._chunk_index_container()
+        with patch.object(backup_models.Backup, 'running_for_tenant',
+                          return_value=None):
+            taskmanager_models.BackupTasks.delete_backup(
+                MagicMock(tenant='tenant'), self.backup.id)
+        # The chunks the other backup refers to are kept, the others are
+        # set aside.
+        container = taskmanager_models.CONF.backup_swift_container
+        self.assertEqual([call(container, '12e48.xbstream.gz'),
+                          call(container, 'chunks/c')],
+                         self.swift_client.delete_object.call_args_list)
+        self.assertIn(self._copy_call('chunks/c', 'fossils/c'),
+                      self.swift_client.put_object.call_args_list)
+        self.swift_client.put_object.assert_any_call(
+            container, chunk_index.REFERENCES,
+            chunk_index.dumps_references({
+                'other.sql': {'hash': 'other-etag',
+                              'chunks': ['chunks/a', 'chunks/b',
+                                         'chunks/e']}}),
+            content_type='application/json')
+        self.backup.delete.assert_any_call()
+
+    def test_delete_deduplicated_backup_recorded_references(self):
+        self._chunk_index_container(references={
+            'other.sql': {'hash': 'other-etag', 'chunks': ['chunks/a']},
+            'deleted.sql': {'hash': 'deleted-etag', 'chunks': ['chunks/b']},
+        })
+        with patch.object(backup_models.Backup, 'running_for_tenant',
+                          return_value=None):
+            taskmanager_models.BackupTasks.delete_backup(
+                MagicMock(tenant='tenant'), self.backup.id)
+        # The unchanged index is not read again, the deleted one is dropped
+        # from the record.
+        container = taskmanager_models.CONF.backup_swift_container
+        self.swift_client.get_object.assert_called_once_with(
+            container, chunk_index.REFERENCES)
+        self.assertEqual([call(container, '12e48.xbstream.gz'),
+                          call(container, 'chunks/b'),
+                          call(container, 'chunks/c')],
+                         self.swift_client.delete_object.call_args_list)
+        self.swift_client.put_object.assert_any_call(
+            container, chunk_index.REFERENCES,
+            chunk_index.dumps_references({
+                'other.sql': {'hash': 'other-etag', 'chunks': ['chunks/a']}}),
+            content_type='application/json')
+
+    def test_delete_deduplicated_backup_fossils(self):
+        now = timeutils.utcnow()
+        self._chunk_index_container(fossils=[
+            ('fossils/d', now - datetime.timedelta(days=2)),
+            ('fossils/e', now - datetime.timedelta(days=2)),
+            ('fossils/f', now - datetime.timedelta(hours=12)),
+        ])
+        running = MagicMock(created=now - datetime.timedelta(days=1))
+        with patch.object(backup_models.Backup, 'running_for_tenant',
+                          return_value=running):
+            taskmanager_models.BackupTasks.delete_backup(
+                MagicMock(tenant='tenant'), self.backup.id)
+        # Only the chunks set aside before the running backup started are
+        # deleted; the one an index refers to is put back first.
+        container = taskmanager_models.CONF.backup_swift_container
+        self.assertEqual([call(container, '12e48.xbstream.gz'),
+                          call(container, 'fossils/d'),
+                          call(container, 'fossils/e'),
+                          call(container, 'chunks/c')],
+                         self.swift_client.delete_object.call_args_list)
+        copies = [args for args in self.swift_client.put_object.call_args_list
+                  if 'headers' in args[1]]
+        self.assertEqual([self._copy_call('fossils/e', 'chunks/e'),
+                          self._copy_call('chunks/c', 'fossils/c')], copies)
+
+    def test_delete_deduplicated_backup_copy_fails(self):
+        self._chunk_index_container()
+
+        def put_object(container, name, contents, **kwargs):
+            if name == 'fossils/c':
+                raise ClientException('copy failed')
+
+        self.swift_client.put_object.side_effect = put_object
+        with patch.object(backup_models.Backup, 'running_for_tenant',
+                          return_value=None):
+            taskmanager_models.BackupTasks.delete_backup(
+                MagicMock(tenant='tenant'), self.backup.id)
+        # A chunk is not deleted unless it was set aside.
+        self.swift_client.delete_object.assert_called_once_with(
+            taskmanager_models.CONF.backup_swift_container,
+            '12e48.xbstream.gz')
+        self.backup.delete.assert_any_call()
+
     def test_parse_manifest(self):
         manifest = 'container/prefix'
         cont, prefix = taskmanager_models.BackupTasks._parse_manifest(manifest)
@@ -0,0 +1,114 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from mock import MagicMock
+from novaclient import exceptions as nova_exceptions
+
+from trove.common.context import TroveContext
+from trove.common.exception import PollTimeOut
+from trove.taskmanager import server_watcher
+from trove.tests.unittests import trove_testtools
+
+
+class FakeServer(object):
+    def __init__(self, id, status):
+        self.id = id
+        self.status = status
+
+
+class ServerStateWatcherTest(trove_testtools.TestCase):
+
+    def setUp(self):
+        super(ServerStateWatcherTest, self).setUp()
+        self.context = TroveContext(tenant='tenant-1')
+        self.nova_client = MagicMock()
+        self.watcher = server_watcher.ServerStateWatcher(interval=0.01)
+
+    def _is_active(self, server):
+        return server.status == 'ACTIVE'
+
+    def test_wait_for_status_already_matching(self):
+        server = FakeServer('server-1', 'ACTIVE')
+        self.nova_client.servers.get.return_value = server
+        result = self.watcher.wait_for_status(
+            self.context, self.nova_client, 'server-1', self._is_active)
+        self.assertIs(server, result)
+        self.nova_client.servers.get.assert_called_once_with('server-1')
+        self.assertFalse(self.nova_client.servers.list.called)
+
+    def test_wait_for_status_uses_changes_since(self):
+        self.nova_client.servers.get.return_value = FakeServer(
+            'server-1', 'REBOOT')
+        active = FakeServer('server-1', 'ACTIVE')
+        self.nova_client.servers.list.return_value = [
+            FakeServer('other-server', 'ACTIVE'), active]
+        result = self.watcher.wait_for_status(
+            self.context, self.nova_client, 'server-1', self._is_active)
+        self.assertIs(active, result)
+        self.assertEqual(1, self.nova_client.servers.get.call_count)
+        search_opts = self.nova_client.servers.list.call_args[1][
+            'search_opts']
+        self.assertIn('changes-since', search_opts)
+
+    def test_waiters_share_poll(self):
+        self.nova_client.servers.get.side_effect = (
+            lambda id: FakeServer(id, 'BUILD'))
+        self.nova_client.servers.list.return_value = [
+            FakeServer('server-1', 'ACTIVE'),
+            FakeServer('server-2', 'ACTIVE')]
+        pool = eventlet.GreenPool()
+        for server_id in ['server-1', 'server-2']:
+            pool.spawn(self.watcher.wait_for_status, self.context,
+                       self.nova_client, server_id, self._is_active)
+        pool.waitall()
+        self.assertEqual(2, self.nova_client.servers.get.call_count)
+        self.assertEqual(1, self.nova_client.servers.list.call_count)
+
+    def test_wait_for_status_server_deleted(self):
+        self.nova_client.servers.get.side_effect = nova_exceptions.NotFound(
+            404)
+        self.assertRaises(nova_exceptions.NotFound,
+                          self.watcher.wait_for_status, self.context,
+                          self.nova_client, 'server-1', self._is_active)
+
+    def test_wait_for_status_condition_raises(self):
+        self.nova_client.servers.get.return_value = FakeServer(
+            'server-1', 'ERROR')
+
+        def condition(server):
+            raise ValueError(server.status)
+
+        self.assertRaises(ValueError, self.watcher.wait_for_status,
+                          self.context, self.nova_client, 'server-1',
+                          condition)
+
+    def test_wait_for_status_time_out(self):
+        self.nova_client.servers.get.return_value = FakeServer(
+            'server-1', 'REBOOT')
+        self.nova_client.servers.list.return_value = []
+        self.assertRaises(PollTimeOut, self.watcher.wait_for_status,
+                          self.context, self.nova_client, 'server-1',
+                          self._is_active, time_out=0.05)
+        self.assertEqual({}, self.watcher._tenants)
+
+    def test_wait_for_delete(self):
+        seen = []
+        self.nova_client.servers.get.return_value = FakeServer(
+            'server-1', 'ACTIVE')
+        self.nova_client.servers.list.return_value = [
+            FakeServer('server-1', server_watcher.DELETED_STATUS)]
+        self.watcher.wait_for_delete(self.context, self.nova_client,
+                                     'server-1', on_update=seen.append)
+        self.assertEqual(['ACTIVE'], [server.status for server in seen])
@@ -168,6 +168,70 @@ class VerticaClusterTasksTest(trove_testtools.TestCase):
             mock_update_status.assert_called()
             mock_reset_task.assert_called()
 
+    def _mock_member_guests(self):
+        guests = {}
+        for instance_id in ["1", "2", "3"]:
+            guest = Mock(id=instance_id)
+            guest.get_public_keys.side_effect = (
+                lambda user, instance_id=instance_id:
+                '%s-key-%s' % (user, instance_id))
+            guests[instance_id] = guest
+        return guests
+
+    @patch.object(ClusterTasks, 'reset_task')
+    @patch.object(ClusterTasks, 'get_ip', return_value="10.0.0.2")
+    @patch.object(ClusterTasks, '_all_instances_ready')
+    @patch.object(Instance, 'load')
+    @patch.object(DBInstance, 'find_all')
+    @patch.object(datastore_models.Datastore, 'load')
+    @patch.object(datastore_models.DatastoreVersion, 'load_by_uuid')
+    def test_create_cluster_shares_keys(self, mock_dv, mock_ds,
+                                        mock_find_all, mock_load, mock_ready,
+                                        mock_ip, mock_reset_task):
+        db_instances = [self.dbinst1, self.dbinst2, self.dbinst3]
+        mock_find_all.return_value.all.return_value = db_instances
+        mock_load.side_effect = lambda context, id: Mock(id=id)
+        guests = self._mock_member_guests()
+        with patch.object(ClusterTasks, 'get_guest',
+                          side_effect=lambda instance: guests[instance.id]):
+            self.clustertasks.create_cluster(Mock(), self.cluster_id)
+        for guest in guests.values():
+            guest.authorize_public_keys.assert_any_call(
+                'root', ['root-key-1', 'root-key-2', 'root-key-3'])
+            guest.authorize_public_keys.assert_any_call(
+                'dbadmin', ['dbadmin-key-1', 'dbadmin-key-2',
+                            'dbadmin-key-3'])
+            guest.cluster_complete.assert_called_once_with()
+        guests["1"].install_cluster.assert_called_once_with(
+            ["10.0.0.2"] * 3)
+        mock_reset_task.assert_called_with()
+
+    @patch.object(ClusterTasks, 'update_statuses_on_failure')
+    @patch.object(ClusterTasks, 'reset_task')
+    @patch.object(ClusterTasks, 'get_ip', return_value="10.0.0.2")
+    @patch.object(ClusterTasks, '_all_instances_ready')
+    @patch.object(Instance, 'load')
+    @patch.object(DBInstance, 'find_all')
+    @patch.object(datastore_models.Datastore, 'load')
+    @patch.object(datastore_models.DatastoreVersion, 'load_by_uuid')
+    def test_create_cluster_member_fail(self, mock_dv, mock_ds,
+                                        mock_find_all, mock_load, mock_ready,
+                                        mock_ip, mock_reset_task,
+                                        mock_update_status):
+        db_instances = [self.dbinst1, self.dbinst2, self.dbinst3]
+        mock_find_all.return_value.all.return_value = db_instances
+        mock_load.side_effect = lambda context, id: Mock(id=id)
+        guests = self._mock_member_guests()
+        guests["2"].authorize_public_keys.side_effect = GuestError("Error")
+        with patch.object(ClusterTasks, 'get_guest',
+                          side_effect=lambda instance: guests[instance.id]):
+            self.clustertasks.create_cluster(Mock(), self.cluster_id)
+        # The other members are still called, but the build stops there.
+        self.assertTrue(guests["1"].authorize_public_keys.called)
+        self.assertTrue(guests["3"].authorize_public_keys.called)
+        self.assertFalse(guests["1"].install_cluster.called)
+        mock_update_status.assert_called_with(self.cluster_id)
+
 
 class VerticaTaskManagerAPITest(trove_testtools.TestCase):
     @patch.object(rpc, 'get_client', Mock(return_value=Mock()))